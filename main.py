@@ -1,16 +1,24 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 import os
 import logging
 from typing import List, Optional
 import tempfile
-import shutil
 import time
 import json
+import uuid
 
-from src.models import SearchQuery, SearchResponse, VideoTranscript
+from src.models import SearchQuery, SearchResponse, VideoTranscript, BatchSearchQuery, BatchSearchResponse, MigrationRequest
 from src.search_engine import VideoSearchEngine
+from src.search_batcher import SearchBatcher
+from src.persistence import IndexSnapshotter, snapshot_signature
+from src.migration import ModelMigration
+from src.index_wal import WriteAheadLog
+from src.job_queue import JobQueue
+from src.content_cache import ContentCache, save_and_hash
+from src.transcription_worker import TranscriptionWorkerPool
 from src.transcription_service import TranscriptionService
 
 load_dotenv()
@@ -30,14 +38,143 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize search engine
-search_engine = VideoSearchEngine()
+# EMBEDDING_BACKEND=onnx serves the model through ONNX Runtime (optionally INT8-quantized)
+embedding_params = {
+    "backend": os.getenv("EMBEDDING_BACKEND", "torch"),
+    "onnx_dir": os.getenv("ONNX_MODEL_DIR", "data/onnx"),
+    "quantize": os.getenv("EMBEDDING_QUANTIZE", "false").lower() == "true",
+    "num_threads": int(os.getenv("EMBEDDING_THREADS", 0)) or None,
+    "token_budget": int(os.getenv("EMBEDDING_TOKEN_BUDGET", 8192)),
+    "max_batch_size": int(os.getenv("EMBEDDING_MAX_BATCH", 256)),
+}
 
-# Initialize transcription service
-transcription_service = TranscriptionService(model_size="base")
+# Initialize search engine. INDEX_TYPE selects the FAISS backend
+# (flat, hnsw, ivf_flat, ivf_pq); the remaining knobs only apply to ANN indexes.
+# INDEX_STORAGE compresses the stored vectors; exact float32 copies are then kept
+# in a memory-mapped file for re-ranking (INDEX_REFINE_FACTOR) and recall checks.
+# Without EMBEDDING_MODEL the model of the latest snapshot is used, so an index a
+# migration cut over to is loaded on restart.
+index_data_dir = os.getenv("INDEX_DATA_DIR", "data/index")
+index_compressed = os.getenv("INDEX_STORAGE", "float32") != "float32" or os.getenv("INDEX_TYPE", "flat") == "ivf_pq"
+search_engine = VideoSearchEngine(
+    model_name=os.getenv("EMBEDDING_MODEL") or (snapshot_signature(index_data_dir) or {}).get("model_name", "all-MiniLM-L6-v2"),
+    index_type=os.getenv("INDEX_TYPE", "flat"),
+    metric=os.getenv("INDEX_METRIC", "cosine"),
+    index_params={
+        "nlist": int(os.getenv("INDEX_NLIST", 256)),
+        "pq_m": int(os.getenv("INDEX_PQ_M", 48)),
+        "hnsw_m": int(os.getenv("INDEX_HNSW_M", 32)),
+        "nprobe": int(os.getenv("INDEX_NPROBE", 8)),
+        "ef_search": int(os.getenv("INDEX_EF_SEARCH", 64)),
+        "storage": os.getenv("INDEX_STORAGE", "float32"),
+        "refine_factor": int(os.getenv("INDEX_REFINE_FACTOR", 0)),
+        "refine_path": os.path.join(index_data_dir, "vectors.f32")
+        if index_compressed and os.getenv("INDEX_EXACT_VECTORS", "true").lower() == "true" else None,
+    },
+    cache_params={
+        "max_entries": int(os.getenv("QUERY_CACHE_ENTRIES", 10000)),
+        "max_bytes": int(float(os.getenv("QUERY_CACHE_MB", 64)) * 1024 * 1024),
+        "ttl_seconds": float(os.getenv("QUERY_CACHE_TTL_SECONDS", 3600)),
+    },
+    embedding_params=embedding_params,
+    # Chunk embeddings persist across restarts and re-indexing, keyed by model and text
+    embedding_cache_params={
+        "directory": os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache"),
+        "max_entries": int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200000)),
+        "dtype": os.getenv("EMBEDDING_CACHE_DTYPE", "float16"),
+    } if os.getenv("EMBEDDING_CACHE", "true").lower() == "true" else None,
+    # BM25 index for mode=lexical / mode=hybrid searches, rebuilt from chunk text on startup
+    lexical_params={
+        "k1": float(os.getenv("BM25_K1", 1.2)),
+        "b": float(os.getenv("BM25_B", 0.75)),
+    } if os.getenv("LEXICAL_INDEX", "true").lower() == "true" else None,
+    # Cross-encoder second stage for searches with rerank=true
+    rerank_params={
+        "model_name": os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+        "candidates": int(os.getenv("RERANK_CANDIDATES", 50)),
+        "budget_ms": float(os.getenv("RERANK_BUDGET_MS", 100)),
+        "batch_size": int(os.getenv("RERANK_BATCH_SIZE", 16)),
+    } if os.getenv("RERANK", "false").lower() == "true" else None,
+    # Whisper segment embeddings for pointing a hit's timestamp at the matching sentence
+    segment_cache_params={
+        "directory": os.path.join(os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache"), "segments"),
+        "max_entries": int(os.getenv("SEGMENT_CACHE_MAX_ENTRIES", 1000000)),
+        "dtype": os.getenv("EMBEDDING_CACHE_DTYPE", "float16"),
+    } if os.getenv("SEGMENT_REFINEMENT", "true").lower() == "true" else None
+)
+
+# Persist the index to disk and restore it on startup, so restarts don't need a re-embed.
+# Every mutation is also logged (with its embeddings) and replayed on top of the last snapshot.
+snapshotter = IndexSnapshotter(
+    search_engine,
+    data_dir=index_data_dir,
+    interval_seconds=float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", 30)),
+    mmap=os.getenv("INDEX_MMAP", "false").lower() in ("1", "true", "yes"),
+    wal=WriteAheadLog(
+        os.path.join(index_data_dir, "index.wal"),
+        fsync=os.getenv("WAL_FSYNC", "true").lower() in ("1", "true", "yes")
+    ),
+    compact_bytes=int(float(os.getenv("WAL_COMPACT_MB", 64)) * 1024 * 1024)
+)
+snapshotter.load_latest()
+
+# Coalesce concurrent /search requests into micro-batches run off the event loop
+search_batcher = SearchBatcher(
+    search_engine,
+    window_ms=float(os.getenv("SEARCH_BATCH_WINDOW_MS", 3)),
+    max_batch_size=int(os.getenv("SEARCH_MAX_BATCH_SIZE", 32))
+)
+
+# Uploaded videos are transcribed by a pool of worker processes (one Whisper model each)
+# fed from a durable SQLite job queue; finished transcripts are indexed here.
+upload_dir = os.getenv("UPLOAD_DIR", "data/uploads")
+os.makedirs(upload_dir, exist_ok=True)
+job_queue = JobQueue(
+    os.getenv("JOB_DB_PATH", "data/jobs.db"),
+    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", 3)),
+    lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", 60))
+)
+# Uploads are hashed while saved; identical re-uploads reuse the cached transcript and embeddings
+content_cache = ContentCache(os.getenv("CONTENT_CACHE_DIR", "data/content_cache")) \
+    if os.getenv("UPLOAD_DEDUP", "true").lower() == "true" else None
+transcription_pool = TranscriptionWorkerPool(
+    job_queue,
+    search_engine,
+    num_workers=int(os.getenv("TRANSCRIPTION_WORKERS", 1)),
+    model_size=os.getenv("WHISPER_MODEL_SIZE", "base"),
+    # Long videos are transcribed window by window and become searchable as windows finish
+    streaming={
+        'window_seconds': float(os.getenv("TRANSCRIPTION_WINDOW_SECONDS", 60)),
+        'overlap_seconds': float(os.getenv("TRANSCRIPTION_OVERLAP_SECONDS", 2)),
+        'decode_workers': int(os.getenv("TRANSCRIPTION_DECODE_WORKERS", 1))
+    } if os.getenv("TRANSCRIPTION_STREAMING", "true").lower() == "true" else None,
+    vad=os.getenv("TRANSCRIPTION_VAD", "true").lower() == "true",
+    content_cache=content_cache,
+    # How transcripts are cut into chunks (see src/chunking.py and scripts/benchmark_chunking.py)
+    chunking={
+        'strategy': os.getenv("CHUNK_STRATEGY", "duration"),
+        'chunk_duration': float(os.getenv("CHUNK_DURATION_SECONDS", 30)),
+        'target_tokens': int(os.getenv("CHUNK_TARGET_TOKENS", 200)),
+        'max_tokens': int(os.getenv("CHUNK_MAX_TOKENS", 256)),
+        'overlap': float(os.getenv("CHUNK_OVERLAP", 0)),
+    }
+)
 
-# Store for tracking video processing status
-processing_status = {}
+# Model migration (POST /admin/migration) building a shadow index for another embedding model
+migration: Optional[ModelMigration] = None
+
+@app.on_event("startup")
+async def start_snapshotter():
+    snapshotter.start()
+    transcription_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_batcher():
+    if migration is not None:
+        migration.cancel()
+    transcription_pool.stop()
+    await search_batcher.close()
+    snapshotter.stop(final_snapshot=True)
 
 @app.get("/")
 def read_root():
@@ -45,14 +182,18 @@ def read_root():
         "message": "Video Semantic Search API",
         "endpoints": {
             "/search": "POST - Search for relevant video timestamps",
+            "/search/batch": "POST - Run many searches in one batched call",
             "/index": "POST - Index video transcripts",
             "/stats": "GET - Get indexing statistics",
             "/health": "GET - Health check",
             "/api/videos/upload": "POST - Upload and transcribe video",
             "/api/videos": "GET - List all indexed videos",
-            "/api/videos/{video_id}": "GET - Get video details and chunks",
+            "/api/videos/{video_id}": "GET - Get video details and chunks, DELETE - Remove video from index",
             "/api/videos/{video_id}/status": "GET - Check video processing status",
-            "/api/videos/{video_id}/transcript": "GET - Get full video transcript"
+            "/api/videos/{video_id}/cancel": "POST - Cancel a queued or running transcription",
+            "/api/videos/{video_id}/transcript": "GET - Get full video transcript",
+            "/admin/migration": "POST - Start building an index for another embedding model, GET - Progress and shadow comparison, DELETE - Abandon it",
+            "/admin/migration/cutover": "POST - Switch searches to the migrated index"
         }
     }
 
@@ -61,59 +202,114 @@ def health_check():
     return {"status": "healthy", "service": "video-search"}
 
 @app.get("/stats")
-def get_stats():
-    """Get statistics about indexed videos and chunks."""
-    return search_engine.get_stats()
+def get_stats(measure_recall: bool = False):
+    """
+    Get statistics about indexed videos and chunks.
+
+    With measure_recall=true, recall@10 of the (compressed) index is measured
+    against exact search first; it is reported under index.recall.
+    """
+    if measure_recall:
+        search_engine.measure_recall()
+    stats = search_engine.get_stats()
+    stats['search_batching'] = search_batcher.get_metrics()
+    stats['persistence'] = snapshotter.get_stats()
+    stats['transcription'] = transcription_pool.get_stats()
+    if content_cache is not None:
+        stats['content_cache'] = content_cache.get_stats()
+    if migration is not None:
+        stats['migration'] = migration.get_status()
+    return stats
 
 @app.post("/search", response_model=SearchResponse)
 async def search_videos(query: SearchQuery):
     """
-    Search for relevant video timestamps based on semantic similarity.
+    Search for relevant video timestamps by semantic similarity, keywords (BM25) or both.
     """
+    if query.mode != "dense" and search_engine.lexical is None:
+        raise HTTPException(status_code=400, detail="Lexical search is disabled (LEXICAL_INDEX=false)")
+    if query.rerank and search_engine.reranker is None:
+        raise HTTPException(status_code=400, detail="Re-ranking is disabled (RERANK=false)")
     try:
         if not query.query.strip():
             raise HTTPException(status_code=400, detail="Query cannot be empty")
         
-        results = search_engine.search(query)
+        results = await search_batcher.submit(query)
         return results
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # Out-of-range options, rejected by the engine (see VideoSearchEngine.validate_query)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_videos_batch(batch: BatchSearchQuery):
+    """
+    Run several searches at once: one embedding pass and one FAISS call per parameter group.
+    """
+    if not batch.queries:
+        raise HTTPException(status_code=400, detail="At least one query is required")
+    if any(not query.query.strip() for query in batch.queries):
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    if search_engine.lexical is None and any(query.mode != "dense" for query in batch.queries):
+        raise HTTPException(status_code=400, detail="Lexical search is disabled (LEXICAL_INDEX=false)")
+    if search_engine.reranker is None and any(query.rerank for query in batch.queries):
+        raise HTTPException(status_code=400, detail="Re-ranking is disabled (RERANK=false)")
+
+    try:
+        start_time = time.time()
+        responses = await run_in_threadpool(search_engine.search_many, batch.queries)
+        return BatchSearchResponse(
+            responses=responses,
+            processing_time_ms=(time.time() - start_time) * 1000
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch search error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Batch search failed: {str(e)}")
+
 @app.post("/index")
 async def index_videos(videos: List[VideoTranscript]):
     """
     Index video transcripts for searching.
     """
     try:
-        search_engine.index_videos(videos)
+        await run_in_threadpool(search_engine.index_videos, videos)
         return {
             "status": "success",
             "indexed_videos": len(videos),
-            "total_videos": len(search_engine.videos)
+            "total_videos": search_engine.metadata.num_videos
         }
     except Exception as e:
         logger.error(f"Indexing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Indexing failed: {str(e)}")
 
 @app.delete("/index")
-async def clear_index():
+def clear_index():
     """Clear all indexed data."""
     search_engine.clear_index()
     return {"status": "success", "message": "Index cleared"}
 
 @app.post("/api/videos/upload")
 async def upload_video(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    title: Optional[str] = None
+    title: Optional[str] = None,
+    priority: int = 0
 ):
     """
     Upload a video file for transcription and indexing.
     Supported formats: mp4, avi, mov, mkv, webm, flv, wmv, m4v
+    Jobs with a higher priority are transcribed first.
+    A file identical to an earlier upload is not processed again: it is
+    answered with the video already indexed (or being processed), or
+    re-indexed from the content cache if that video was deleted.
     """
     # Validate file type
-    supported_formats = transcription_service.get_supported_formats()
+    supported_formats = TranscriptionService.get_supported_formats()
     file_ext = os.path.splitext(file.filename)[1].lower()
     
     if file_ext not in supported_formats:
@@ -134,114 +330,133 @@ async def upload_video(
             detail=f"File too large. Maximum size: 500MB"
         )
     
-    # Save uploaded file temporarily
+    # Save uploaded file until its job finishes (kept across restarts so queued jobs survive),
+    # hashing it on the way
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
-            shutil.copyfileobj(file.file, tmp_file)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext, dir=upload_dir) as tmp_file:
+            content_hash, _ = await run_in_threadpool(save_and_hash, file.file, tmp_file)
             temp_path = tmp_file.name
     except Exception as e:
         logger.error(f"Failed to save uploaded file: {e}")
         raise HTTPException(status_code=500, detail="Failed to save uploaded file")
     
-    # Generate video ID and title
-    video_id = f"video_{int(time.time())}_{file.filename.replace(' ', '_')}"
+    # Generate video ID and title; the suffix keeps same-named uploads within a second apart (it is the job's key)
+    video_id = f"video_{int(time.time())}_{uuid.uuid4().hex[:8]}_{file.filename.replace(' ', '_')}"
     video_title = title or file.filename
-    
-    # Initialize status
-    processing_status[video_id] = {
-        "status": "processing",
-        "progress": 0,
-        "message": "Video uploaded. Starting transcription..."
-    }
-    
-    # Process in background
-    background_tasks.add_task(
-        process_video_upload,
-        video_id=video_id,
-        video_path=temp_path,
-        video_title=video_title
-    )
+
+    # Queue for a transcription worker
+    payload = {"video_path": temp_path, "title": video_title, "content_hash": content_hash}
+    try:
+        if content_cache is not None:
+            duplicate = await run_in_threadpool(_reuse_upload, content_hash, video_id, video_title)
+            if duplicate is None:
+                # Checked and queued in one transaction, so identical uploads racing each other get one job
+                job, created = await run_in_threadpool(job_queue.enqueue_unless_active, video_id, payload, priority=priority)
+                duplicate = None if created else _active_duplicate(job, video_id)
+            if duplicate is not None:
+                os.remove(temp_path)
+                duplicate["file_size_mb"] = round(file_size / (1024 * 1024), 2)
+                return duplicate
+            content_cache.record('miss')
+        else:
+            await run_in_threadpool(job_queue.enqueue, video_id, payload, priority=priority)
+    except Exception as e:
+        logger.error(f"Failed to queue upload {video_id}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise HTTPException(status_code=500, detail="Failed to queue uploaded video")
     
     return {
         "video_id": video_id,
-        "status": "processing",
-        "message": "Video uploaded successfully. Transcription in progress.",
+        "status": "queued",
+        "message": "Video uploaded successfully. Queued for transcription.",
         "title": video_title,
         "file_size_mb": round(file_size / (1024 * 1024), 2)
     }
 
-async def process_video_upload(video_id: str, video_path: str, video_title: str):
-    """Background task to process uploaded video."""
-    try:
-        # Update status
-        processing_status[video_id]["progress"] = 10
-        processing_status[video_id]["message"] = "Extracting audio from video..."
-        
-        # Transcribe video
-        logger.info(f"Starting transcription for video {video_id}")
-        chunks = transcription_service.transcribe_video(video_path)
-        
-        # Update status
-        processing_status[video_id]["progress"] = 80
-        processing_status[video_id]["message"] = "Indexing transcript chunks..."
-        
-        # Calculate total duration from chunks
-        total_duration = chunks[-1]["end_time"] if chunks else 0
-        
-        # Create transcript data in expected format
-        transcript_data = VideoTranscript(
-            video_id=video_id,
-            title=video_title,
-            duration=total_duration,
-            chunks=chunks
-        )
-        
-        # Index in search engine
-        search_engine.index_videos([transcript_data])
-        
-        # Update final status
-        processing_status[video_id] = {
+def _reuse_upload(content_hash: str, video_id: str, video_title: str) -> Optional[dict]:
+    """
+    Answer an upload from earlier processing of the same file, if there was any.
+
+    Returns:
+        Upload response, or None if the content has to be queued (or already is)
+    """
+    cached = content_cache.get(content_hash)
+    if cached is not None and cached["video_id"] in search_engine.metadata:
+        content_cache.record('alias')
+        logger.info(f"Upload {video_id} is identical to indexed video {cached['video_id']}")
+        return {
+            "video_id": cached["video_id"],
             "status": "completed",
-            "progress": 100,
-            "message": "Video processed successfully",
-            "chunks_created": len(chunks),
-            "duration": total_duration
+            "message": "Identical video already indexed.",
+            "title": search_engine.get_video_summary(cached["video_id"]).title,
+            "duplicate_of": cached["video_id"]
         }
-        
-        logger.info(f"Successfully processed video {video_id}: {len(chunks)} chunks created")
-        
-    except Exception as e:
-        logger.error(f"Failed to process video {video_id}: {str(e)}")
-        processing_status[video_id] = {
-            "status": "failed",
-            "progress": 0,
-            "message": f"Processing failed: {str(e)}"
+
+    if cached is not None:
+        active = job_queue.find_active(content_hash)
+        if active is not None:
+            return _active_duplicate(active, video_id)
+
+        # Processed before but deleted since: index the cached transcript without ffmpeg, Whisper or re-embedding
+        video = VideoTranscript(video_id=video_id, title=video_title, duration=cached["duration"], chunks=cached["chunks"])
+        embeddings = content_cache.load_embeddings(content_hash, search_engine.embedding_manager.model_id)
+        search_engine.index_video(video, embeddings)
+        content_cache.set_video(content_hash, video_id)
+        content_cache.record('hit')
+        logger.info(f"Indexed upload {video_id} from the content cache")
+        return {
+            "video_id": video_id,
+            "status": "completed",
+            "message": "Video indexed from cached transcript.",
+            "title": video_title,
+            "chunks_created": len(video.chunks),
+            "cached": True
         }
-    finally:
-        # Clean up temporary file
-        if os.path.exists(video_path):
-            try:
-                os.remove(video_path)
-                logger.info(f"Cleaned up temporary file: {video_path}")
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary file: {e}")
+    return None
+
+def _active_duplicate(active: dict, video_id: str) -> dict:
+    """Upload response pointing at the unfinished job for the same file."""
+    content_cache.record('alias')
+    logger.info(f"Upload {video_id} is identical to video {active['job_id']} being processed")
+    return {
+        "video_id": active["job_id"],
+        "status": "queued" if active["state"] == "queued" else "processing",
+        "message": "Identical video already being processed.",
+        "title": active["payload"]["title"],
+        "duplicate_of": active["job_id"]
+    }
 
 @app.get("/api/videos/{video_id}/status")
-async def check_video_status(video_id: str):
+def check_video_status(video_id: str):
     """Check the processing status of an uploaded video."""
-    # Check if video is being processed
-    if video_id in processing_status:
-        return processing_status[video_id]
+    # Uploaded videos are tracked by their transcription job
+    job = job_queue.get(video_id)
+    if job is not None:
+        status = {
+            "status": "processing" if job["state"] in ("running", "transcribed", "indexing") else job["state"],
+            "state": job["state"],
+            "progress": job["progress"],
+            "message": job["message"],
+            "priority": job["priority"],
+            "attempts": job["attempts"],
+            "max_attempts": job["max_attempts"]
+        }
+        if job["state"] == "completed" and job["result"]:
+            status.update(job["result"])
+        if job["state"] == "failed":
+            status["error"] = job["error"]
+        return status
     
-    # Check if video exists in search engine
-    if video_id in search_engine.videos:
-        video = search_engine.videos[video_id]
+    # Check if video exists in search engine (e.g. loaded from transcripts)
+    video = search_engine.get_video_summary(video_id)
+    if video is not None:
         return {
             "status": "completed",
             "progress": 100,
             "message": "Video indexed and ready for search",
             "indexed": True,
-            "chunk_count": len(video.chunks),
+            "chunk_count": video.chunk_count,
             "duration": video.duration,
             "title": video.title
         }
@@ -253,32 +468,48 @@ async def check_video_status(video_id: str):
         "message": "Video not found"
     }
 
+@app.post("/api/videos/{video_id}/cancel")
+def cancel_video_processing(video_id: str):
+    """Cancel a video's transcription job. Running jobs stop after their current transcription pass."""
+    job = job_queue.get(video_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["state"] in ("completed", "failed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Job already {job['state']}")
+    
+    state = job_queue.cancel(video_id)
+    if state == "cancelled" and os.path.exists(job["payload"]["video_path"]):
+        os.remove(job["payload"]["video_path"])
+    return {"video_id": video_id, "status": state, "cancel_requested": True}
+
 @app.get("/api/videos")
-async def list_videos():
+def list_videos():
     """Get a list of all indexed videos."""
     videos = []
-    for video_id, video in search_engine.videos.items():
+    for video in search_engine.list_videos():
         videos.append({
-            "video_id": video_id,
+            "video_id": video.video_id,
             "title": video.title,
             "duration": video.duration,
-            "chunk_count": len(video.chunks),
-            "created_at": video.created_at
+            "chunk_count": video.chunk_count,
+            "created_at": video.created_at,
+            "tags": video.tags
         })
     return {"videos": videos, "total_count": len(videos)}
 
 @app.get("/api/videos/{video_id}")
-async def get_video_details(video_id: str):
+def get_video_details(video_id: str):
     """Get detailed information about a specific video including all chunks."""
-    if video_id not in search_engine.videos:
+    video = search_engine.get_video(video_id)
+    if video is None:
         raise HTTPException(status_code=404, detail="Video not found")
     
-    video = search_engine.videos[video_id]
     return {
         "video_id": video.video_id,
         "title": video.title,
         "duration": video.duration,
         "created_at": video.created_at,
+        "tags": video.tags,
         "chunks": [
             {
                 "chunk_id": chunk.chunk_id,
@@ -290,13 +521,20 @@ async def get_video_details(video_id: str):
         ]
     }
 
+@app.delete("/api/videos/{video_id}")
+def delete_video(video_id: str):
+    """Remove a single video and its chunks from the index."""
+    if not search_engine.delete_video(video_id):
+        raise HTTPException(status_code=404, detail="Video not found")
+    return {"status": "success", "message": f"Video {video_id} deleted", "total_videos": search_engine.metadata.num_videos}
+
 @app.get("/api/videos/{video_id}/transcript")
-async def get_video_transcript(video_id: str):
+def get_video_transcript(video_id: str):
     """Get the full transcript of a video as plain text."""
-    if video_id not in search_engine.videos:
+    video = search_engine.get_video(video_id)
+    if video is None:
         raise HTTPException(status_code=404, detail="Video not found")
     
-    video = search_engine.videos[video_id]
     full_transcript = "\n".join([chunk.text for chunk in video.chunks])
     
     return {
@@ -306,6 +544,68 @@ async def get_video_transcript(video_id: str):
         "word_count": len(full_transcript.split())
     }
 
+def _start_migration(request: MigrationRequest) -> ModelMigration:
+    params = dict(embedding_params)
+    if request.backend is not None:
+        params["backend"] = request.backend
+    if request.quantize is not None:
+        params["quantize"] = request.quantize
+    new_migration = ModelMigration(
+        search_engine,
+        request.model,
+        embedding_params=params,
+        num_workers=request.workers,
+        shadow_sample_rate=request.shadow_sample_rate,
+        checkpoint_dir=os.getenv("REINDEX_CHECKPOINT_DIR", "data/reindex")
+    )
+    new_migration.start()
+    return new_migration
+
+@app.post("/admin/migration")
+async def start_migration(request: MigrationRequest):
+    """
+    Build an index for another embedding model in the background while searches keep using the current one.
+    New uploads and deletions are applied to both. Cut over with POST /admin/migration/cutover.
+    """
+    global migration
+    if migration is not None and migration.state in ("building", "catching_up", "ready"):
+        raise HTTPException(status_code=409, detail=f"A migration to {migration.model_name} is already {migration.state}")
+    if not 0.0 <= request.shadow_sample_rate <= 1.0:
+        raise HTTPException(status_code=400, detail="shadow_sample_rate must be between 0 and 1")
+    try:
+        migration = await run_in_threadpool(_start_migration, request)
+    except Exception as e:
+        logger.error(f"Failed to start migration: {e}")
+        raise HTTPException(status_code=400, detail=f"Failed to start migration: {str(e)}")
+    return migration.get_status()
+
+@app.get("/admin/migration")
+async def get_migration():
+    """Build progress of the current (or last) migration and how its shadow searches compare."""
+    if migration is None:
+        raise HTTPException(status_code=404, detail="No migration")
+    return migration.get_status()
+
+@app.post("/admin/migration/cutover")
+async def cutover_migration():
+    """Atomically switch searches and indexing to the migrated index, then snapshot it."""
+    if migration is None:
+        raise HTTPException(status_code=404, detail="No migration")
+    if migration.state != "ready":
+        raise HTTPException(status_code=409, detail=f"Migration is {migration.state}, not ready")
+    await run_in_threadpool(migration.cutover)
+    await run_in_threadpool(snapshotter.snapshot, True)
+    await run_in_threadpool(migration.remove_replaced_files)
+    return migration.get_status()
+
+@app.delete("/admin/migration")
+async def cancel_migration():
+    """Abandon a migration; the current index is untouched."""
+    if migration is None:
+        raise HTTPException(status_code=404, detail="No migration")
+    await run_in_threadpool(migration.cancel)
+    return migration.get_status()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
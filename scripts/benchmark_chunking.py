@@ -0,0 +1,161 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+from glob import glob
+
+import numpy as np
+
+from src.chunking import SENTENCE_SPLIT, chunk_segments
+from src.models import VideoTranscript, SearchQuery
+from src.search_engine import VideoSearchEngine
+
+# Strategies compared by default (name, SegmentChunker options)
+CONFIGS = [
+    ("duration 30s", {"strategy": "duration", "chunk_duration": 30}),
+    ("duration 30s +5s", {"strategy": "duration", "chunk_duration": 30, "overlap": 5}),
+    ("duration 15s", {"strategy": "duration", "chunk_duration": 15}),
+    ("tokens 128", {"strategy": "tokens", "target_tokens": 128}),
+    ("tokens 200 +32", {"strategy": "tokens", "target_tokens": 200, "overlap": 32}),
+    ("sentences 128", {"strategy": "sentences", "target_tokens": 128}),
+    ("sentences 200 +32", {"strategy": "sentences", "target_tokens": 200, "overlap": 32}),
+]
+
+
+def load_segments() -> list:
+    """
+    Whisper-like segments for each sample transcript.
+
+    The sample files only hold 30 s chunks, so each chunk is cut back into
+    sentences, long sentences are split in two (as Whisper often does) and
+    the chunk's time span is shared out by character count.
+    """
+    videos = []
+    for file_path in sorted(glob("data/transcripts/video_*.json")):
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        segments = []
+        for chunk in data['chunks']:
+            pieces = []
+            for sentence in SENTENCE_SPLIT.split(chunk['text'].strip()):
+                words = sentence.split()
+                pieces += [" ".join(words[:len(words) // 2]), " ".join(words[len(words) // 2:])] if len(words) > 12 else [sentence]
+            total = sum(len(piece) for piece in pieces)
+            start = chunk['start_time']
+            for piece in pieces:
+                end = start + (chunk['end_time'] - chunk['start_time']) * len(piece) / total
+                segments.append({'start': start, 'end': end, 'text': ' ' + piece})
+                start = end
+        videos.append((data, segments))
+    return videos
+
+
+def make_queries(videos: list, count: int, seed: int = 0) -> list:
+    """
+    Sentence-level queries with the time the sentence is spoken.
+
+    Each query is a sentence with a third of its words dropped, so exact
+    wording does not decide the match.
+    """
+    rng = np.random.default_rng(seed)
+    candidates = [
+        (data['video_id'], segment)
+        for data, segments in videos
+        for segment in segments
+        if len(segment['text'].split()) >= 6
+    ]
+    queries = []
+    for position in rng.choice(len(candidates), size=min(count, len(candidates)), replace=False):
+        video_id, segment = candidates[position]
+        words = segment['text'].split()
+        keep = np.sort(rng.choice(len(words), size=max(3, 2 * len(words) // 3), replace=False))
+        queries.append((" ".join(words[i] for i in keep), video_id, segment['start'], segment['end']))
+    return queries
+
+
+def evaluate(engine: VideoSearchEngine, queries: list, k: int) -> dict:
+    """Recall@1 / @k, MRR and timestamp error of the first hit in the right video."""
+    hits_at_1 = hits_at_k = 0
+    reciprocal_ranks = []
+    errors = []
+    latencies = []
+    for text, video_id, start, end in queries:
+        search_start = time.perf_counter()
+        results = engine.search(SearchQuery(query=text, top_k=k)).results
+        latencies.append((time.perf_counter() - search_start) * 1000)
+        # A hit is a chunk of the right video whose time span covers the sentence midpoint
+        midpoint = (start + end) / 2
+        rank = next(
+            (i for i, r in enumerate(results) if r.video_id == video_id and (r.chunk_start_time or r.timestamp) <= midpoint < r.end_time),
+            None
+        )
+        if rank is not None:
+            hits_at_1 += rank == 0
+            hits_at_k += 1
+            reciprocal_ranks.append(1 / (rank + 1))
+            errors.append(abs(results[rank].timestamp - start))
+        else:
+            reciprocal_ranks.append(0.0)
+    return {
+        'recall_at_1': hits_at_1 / len(queries),
+        'recall_at_k': hits_at_k / len(queries),
+        'mrr': float(np.mean(reciprocal_ranks)),
+        'timestamp_error_s': float(np.median(errors)) if errors else None,
+        'search_ms': float(np.median(latencies))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunking strategies: index size, embedding cost and retrieval quality")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument("--queries", type=int, default=200, help="Sentence-level test queries")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    videos = load_segments()
+    queries = make_queries(videos, args.queries)
+    print(f"{len(videos)} videos, {sum(len(segments) for _, segments in videos)} segments, {len(queries)} queries, k={args.k}\n")
+
+    engine = VideoSearchEngine(model_name=args.model)
+    manager = engine.embedding_manager
+    backend = manager.backend
+    # Model window; token_lengths truncates to it, so a length equal to it means the text was cut
+    max_length = getattr(backend, 'max_seq_length', None) or backend.model.max_seq_length
+    token_counter = lambda text: int(backend.token_lengths([text])[0])
+
+    print(f"{'strategy':<20} {'chunks':>6} {'index KB':>9} {'tokens':>7} {'max tok':>7} {'trunc':>5} "
+          f"{'embed s':>8} {'R@1':>6} {'R@k':>6} {'MRR':>6} {'ts err s':>8}")
+    for name, options in CONFIGS:
+        transcripts = [
+            VideoTranscript(
+                video_id=data['video_id'],
+                title=data['title'],
+                duration=data['duration'],
+                chunks=chunk_segments(segments, token_counter=token_counter, **options)
+            )
+            for data, segments in videos
+        ]
+        texts = [chunk.text for video in transcripts for chunk in video.chunks]
+        lengths = backend.token_lengths(texts)
+
+        engine.clear_index()
+        embed_start = time.time()
+        embeddings = manager.encode_bulk(texts)
+        embed_seconds = time.time() - embed_start
+        offset = 0
+        for video in transcripts:
+            engine.index_video(video, embeddings[offset:offset + len(video.chunks)])
+            offset += len(video.chunks)
+
+        report = evaluate(engine, queries, args.k)
+        error = f"{report['timestamp_error_s']:.1f}" if report['timestamp_error_s'] is not None else "-"
+        print(f"{name:<20} {len(texts):>6} {embeddings.nbytes / 1024:>9.1f} {int(lengths.sum()):>7} {int(lengths.max()):>7} "
+              f"{int((lengths >= max_length).sum()):>5} {embed_seconds:>8.2f} {report['recall_at_1']:>6.3f} "
+              f"{report['recall_at_k']:>6.3f} {report['mrr']:>6.3f} {error:>8}")
+
+
+if __name__ == "__main__":
+    main()
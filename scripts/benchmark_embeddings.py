@@ -0,0 +1,120 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+from glob import glob
+
+import numpy as np
+
+from src.embedding_manager import EmbeddingManager
+
+# Queries typical of our traffic (see scripts/test_search_only.py)
+TEST_QUERIES = [
+    "How do I train a neural network?",
+    "What is supervised learning?",
+    "How to create a list in Python?",
+    "What are React hooks?",
+    "Explain binary search trees",
+    "How does AWS Lambda work?",
+    "What is Flutter hot reload?",
+    "How to join tables in SQL?",
+    "What is multi-factor authentication?",
+    "What is continuous integration?"
+]
+
+
+def load_video_texts() -> list:
+    """Chunk texts of each sample video."""
+    videos = []
+    for file_path in sorted(glob("data/transcripts/video_*.json")):
+        with open(file_path, 'r') as f:
+            videos.append([chunk['text'] for chunk in json.load(f)['chunks']])
+    return videos
+
+
+def throughput(manager: EmbeddingManager, texts: list, batch_size: int, repeats: int) -> float:
+    """Texts embedded per second at a batch size (after one warm-up pass)."""
+    manager.encode(texts[:batch_size], batch_size=batch_size)
+    start_time = time.time()
+    for _ in range(repeats):
+        manager.encode(texts, batch_size=batch_size)
+    return repeats * len(texts) / (time.time() - start_time)
+
+
+def indexing_throughput(manager: EmbeddingManager, videos: list, repeats: int) -> tuple:
+    """Chunks/s embedding video by video with batch_size=32 vs all at once with encode_bulk."""
+    total = sum(len(texts) for texts in videos)
+    manager.encode(videos[0][:32])
+    start_time = time.time()
+    for _ in range(repeats):
+        for texts in videos:
+            manager.encode(texts, batch_size=32)
+    per_video = repeats * total / (time.time() - start_time)
+
+    pooled = [text for texts in videos for text in texts]
+    start_time = time.time()
+    for _ in range(repeats):
+        manager.encode_bulk(pooled)
+    bulk = repeats * total / (time.time() - start_time)
+    return per_video, bulk
+
+
+def parity(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """Cosine similarity between matching rows of two embedding matrices."""
+    a = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    b = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = (a * b).sum(axis=1)
+    return {'min': float(cosine.min()), 'mean': float(cosine.mean())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare torch and ONNX Runtime embedding backends: parity and throughput")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--onnx-dir", default="data/onnx")
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--bulk-batch-size", type=int, default=64, help="Batch size for the indexing benchmark")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Fail if any fp32 ONNX embedding is less similar to torch than this")
+    parser.add_argument("--min-cosine-int8", type=float, default=0.95, help="Same check for the INT8 model")
+    parser.add_argument("--token-budget", type=int, default=8192, help="Padded tokens per encode_bulk batch")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8", help="Comma-separated backends to run (torch is always the parity reference)")
+    args = parser.parse_args()
+
+    videos = load_video_texts()
+    chunks = [text for texts in videos for text in texts]
+    print(f"{len(chunks)} sample chunks in {len(videos)} videos, {len(TEST_QUERIES)} queries\n")
+
+    options = {'torch': {}, 'onnx': {'backend': 'onnx'}, 'onnx-int8': {'backend': 'onnx', 'quantize': True}}
+    managers = {'torch': EmbeddingManager(args.model, normalize=True, token_budget=args.token_budget)}
+    for name in args.backends.split(','):
+        if name not in managers:
+            managers[name] = EmbeddingManager(args.model, normalize=True, onnx_dir=args.onnx_dir, num_threads=args.threads,
+                                              token_budget=args.token_budget, **options[name])
+
+    reference = managers['torch'].encode(chunks + TEST_QUERIES)
+    failed = False
+    print(f"{'backend':<10} {'min cos':>8} {'mean cos':>9} {'query/s (b=1)':>14} {f'chunks/s (b={args.bulk_batch_size})':>16} "
+          f"{'index/s per video':>18} {'index/s bulk':>13}")
+    for name, manager in managers.items():
+        similarity = parity(reference, manager.encode(chunks + TEST_QUERIES))
+        threshold = args.min_cosine_int8 if name == 'onnx-int8' else args.min_cosine
+        failed |= similarity['min'] < threshold
+        # Token-budget batching must not change the vectors either
+        failed |= parity(reference[:len(chunks)], manager.encode_bulk(chunks))['min'] < threshold
+        query_rate = throughput(manager, TEST_QUERIES, 1, args.repeats)
+        bulk_rate = throughput(manager, chunks, args.bulk_batch_size, args.repeats)
+        per_video_rate, pooled_rate = indexing_throughput(manager, videos, args.repeats)
+        print(f"{name:<10} {similarity['min']:>8.4f} {similarity['mean']:>9.4f} {query_rate:>14.1f} {bulk_rate:>16.1f} "
+              f"{per_video_rate:>18.1f} {pooled_rate:>13.1f}")
+
+    if failed:
+        print("\nParity check FAILED: an ONNX backend diverges from torch beyond the threshold")
+        sys.exit(1)
+    print("\nParity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import tempfile
+import time
+from glob import glob
+
+import numpy as np
+
+from src.embedding_manager import EmbeddingManager
+from src.vector_store import VectorStore
+
+# Queries typical of our traffic (see scripts/test_search_only.py)
+TEST_QUERIES = [
+    "How do I train a neural network?",
+    "What is supervised learning?",
+    "How to create a list in Python?",
+    "What are React hooks?",
+    "Explain binary search trees",
+    "How does AWS Lambda work?",
+    "What is Flutter hot reload?",
+    "How to join tables in SQL?",
+    "What is multi-factor authentication?",
+    "What is continuous integration?",
+    "Explain Docker containers",
+    "What is machine learning?",
+    "How to use git branches?",
+    "What is a REST API?",
+    "Explain cloud computing basics"
+]
+
+
+def load_corpus_embeddings(embedding_manager: EmbeddingManager, target_size: int) -> np.ndarray:
+    """Embed the sample transcripts, then pad with jittered copies up to target_size vectors."""
+    texts = []
+    for file_path in sorted(glob("data/transcripts/video_*.json")):
+        with open(file_path, 'r') as f:
+            texts.extend(chunk['text'] for chunk in json.load(f)['chunks'])
+
+    embeddings = embedding_manager.encode(texts).astype('float32')
+    if target_size <= len(embeddings):
+        return embeddings
+
+    # Synthetic scale-up: perturbed copies keep the real data's cluster structure
+    rng = np.random.default_rng(0)
+    picks = rng.integers(0, len(embeddings), size=target_size - len(embeddings))
+    noise = rng.normal(scale=0.05, size=(len(picks), embeddings.shape[1])).astype('float32')
+    padded = embeddings[picks] + noise
+    padded /= np.linalg.norm(padded, axis=1, keepdims=True)
+    return np.vstack([embeddings, padded])
+
+
+def build_store(dim: int, vectors: np.ndarray, index_type: str, **params) -> VectorStore:
+    store = VectorStore(dim, index_type=index_type, metric='cosine', train_size=min(len(vectors), 39 * params.get('nlist', 256)), **params)
+    start_time = time.time()
+    store.add_embeddings(vectors)
+    print(f"Built {index_type} {params} in {time.time() - start_time:.2f}s (trained: {store.is_trained})")
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recall@k vs latency for each VectorStore backend")
+    parser.add_argument("--size", type=int, default=100000, help="Corpus size (sample data is padded synthetically)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--pq-m", type=int, default=48)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--refine-factor", type=int, default=4, help="Candidates re-scored exactly per result (compressed storage)")
+    args = parser.parse_args()
+
+    embedding_manager = EmbeddingManager(normalize=True)
+    dim = embedding_manager.get_embedding_dimension()
+    vectors = load_corpus_embeddings(embedding_manager, args.size)
+    queries = embedding_manager.encode(TEST_QUERIES).astype('float32')
+    print(f"Corpus: {len(vectors)} vectors, {len(queries)} queries, k={args.k}\n")
+
+    baseline = build_store(dim, vectors, 'flat')
+    candidates = [
+        (build_store(dim, vectors, 'hnsw', hnsw_m=args.hnsw_m), 'ef_search', [16, 32, 64, 128, 256]),
+        (build_store(dim, vectors, 'ivf_flat', nlist=args.nlist), 'nprobe', [1, 4, 8, 16, 32, 64]),
+        (build_store(dim, vectors, 'ivf_pq', nlist=args.nlist, pq_m=args.pq_m), 'nprobe', [1, 4, 8, 16, 32, 64]),
+    ]
+
+    print(f"\n{'index':<10} {'knob':<10} {'value':>6} {'recall@k':>9} {'ms/query':>9} {'flat ms':>8}")
+    for store, knob, values in candidates:
+        for value in values:
+            report = store.recall_at_k(baseline, queries, k=args.k, **{knob: value})
+            print(f"{store.index_type:<10} {knob:<10} {value:>6} {report['recall_at_k']:>9.3f} "
+                  f"{report['latency_ms']:>9.3f} {report['baseline_latency_ms']:>8.3f}")
+
+    # Storage types on the exact flat index, alone and with exact re-ranking from the float32 file
+    print(f"\n{'storage':<10} {'refine':>6} {'B/vector':>9} {'index MB':>9} {'recall@k':>9} {'ms/query':>9}")
+    with tempfile.TemporaryDirectory() as refine_dir:
+        for storage in ('float32', 'float16', 'int8', 'pq'):
+            for refine_factor in ((0,) if storage == 'float32' else (0, args.refine_factor)):
+                store = build_store(
+                    dim, vectors, 'flat', storage=storage, pq_m=args.pq_m, refine_factor=refine_factor,
+                    refine_path=os.path.join(refine_dir, f"{storage}-{refine_factor}.f32") if refine_factor else None
+                )
+                memory = store.get_config()['memory']
+                report = store.recall_at_k(baseline, queries, k=args.k)
+                print(f"{storage:<10} {refine_factor:>6} {memory['bytes_per_vector']:>9} {memory['index_bytes'] / 2 ** 20:>9.1f} "
+                      f"{report['recall_at_k']:>9.3f} {report['latency_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
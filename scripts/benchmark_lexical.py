@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+from glob import glob
+
+import numpy as np
+
+from src.lexical_index import LexicalIndex, tokenize
+
+# Keyword-style queries (names and terms the lexical mode is meant for)
+TEST_QUERIES = [
+    "neural network backpropagation",
+    "supervised learning labels",
+    "Python list comprehension",
+    "React useEffect hooks",
+    "binary search tree",
+    "AWS Lambda function",
+    "Flutter hot reload",
+    "SQL join tables",
+    "multi-factor authentication",
+    "continuous integration pipeline",
+    "Docker container image",
+    "machine learning model",
+    "git branch merge",
+    "REST API endpoint",
+    "cloud computing"
+]
+
+
+def load_corpus_texts(target_size: int) -> list:
+    """Sample transcript chunks, padded up to target_size with chunks of shuffled real sentences."""
+    texts = []
+    for file_path in sorted(glob("data/transcripts/video_*.json")):
+        with open(file_path, 'r') as f:
+            texts.extend(chunk['text'] for chunk in json.load(f)['chunks'])
+    if target_size <= len(texts):
+        return texts[:target_size]
+
+    # Synthetic scale-up keeps the real vocabulary and term frequency skew
+    rng = np.random.default_rng(0)
+    sentences = [sentence.strip() for text in texts for sentence in text.split('.') if sentence.strip()]
+    for _ in range(target_size - len(texts)):
+        picks = rng.integers(0, len(sentences), size=rng.integers(3, 8))
+        texts.append('. '.join(sentences[p] for p in picks) + '.')
+    return texts
+
+
+def time_queries(index: LexicalIndex, queries: list, k: int, prune: bool, repeats: int = 5) -> tuple:
+    """Median ms per query over repeats, and the last run's results."""
+    results = [index.search(query, k, prune=prune) for query in queries]  # warm up the frozen postings
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        results = [index.search(query, k, prune=prune) for query in queries]
+        timings.append((time.perf_counter() - start_time) * 1000 / len(queries))
+    return float(np.median(timings)), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure BM25 search latency with and without block-max pruning")
+    parser.add_argument("--size", type=int, default=1000000, help="Corpus size in chunks (sample data is padded synthetically)")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    texts = load_corpus_texts(args.size)
+    index = LexicalIndex()
+    start_time = time.time()
+    for offset in range(0, len(texts), 10000):
+        batch = texts[offset:offset + 10000]
+        index.add(np.arange(offset, offset + len(batch), dtype='int64'), batch)
+    print(f"Indexed {len(texts)} chunks in {time.time() - start_time:.2f}s: {index.get_stats()}\n")
+
+    queries = [query for query in TEST_QUERIES if tokenize(query)]
+    exhaustive_ms, exhaustive = time_queries(index, queries, args.k, prune=False)
+    pruned_ms, pruned = time_queries(index, queries, args.k, prune=True)
+    identical = sum(np.array_equal(a[1], b[1]) for a, b in zip(pruned, exhaustive))
+
+    print(f"{'search':<12} {'ms/query':>9}")
+    print(f"{'exhaustive':<12} {exhaustive_ms:>9.3f}")
+    print(f"{'block-max':<12} {pruned_ms:>9.3f}")
+    print(f"\nSame top-{args.k} as exhaustive scoring for {identical}/{len(queries)} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import logging
+
+from dotenv import load_dotenv
+
+from src.search_engine import VideoSearchEngine
+from src.persistence import IndexSnapshotter, load_videos
+from src.reindex import ReindexPool
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-embed every indexed video with a (new) embedding model across several processes "
+                    "and write the result as a fresh index directory"
+    )
+    parser.add_argument("--source-dir", default=os.getenv("INDEX_DATA_DIR", "data/index"),
+                        help="Index directory to read transcripts from (snapshot + write-ahead log)")
+    parser.add_argument("--output-dir", required=True, help="Empty directory for the re-embedded index")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument("--backend", default=os.getenv("EMBEDDING_BACKEND", "torch"), choices=["torch", "onnx"])
+    parser.add_argument("--onnx-dir", default=os.getenv("ONNX_MODEL_DIR", "data/onnx"))
+    parser.add_argument("--quantize", action="store_true", default=os.getenv("EMBEDDING_QUANTIZE", "false").lower() == "true")
+    parser.add_argument("--workers", type=int, default=2, help="Embedding processes, each loading the model")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="Inference threads per process (default: CPUs / workers)")
+    parser.add_argument("--shard-size", type=int, default=1024, help="Chunks per work item")
+    parser.add_argument("--checkpoint-dir", default="data/reindex", help="Progress kept here; re-run the same command to resume")
+    args = parser.parse_args()
+
+    if os.path.abspath(args.output_dir) == os.path.abspath(args.source_dir):
+        parser.error("--output-dir must differ from --source-dir")
+    if os.path.isdir(args.output_dir) and os.listdir(args.output_dir):
+        parser.error(f"Output directory {args.output_dir} is not empty")
+
+    videos = load_videos(args.source_dir, wal_path=os.path.join(args.source_dir, "index.wal"))
+    print(f"{len(videos)} videos, {sum(len(video.chunks) for video in videos)} chunks in {args.source_dir}")
+
+    # Same index settings as the server (main.py), so the output loads without a rebuild
+    embedding_params = {
+        "backend": args.backend,
+        "onnx_dir": args.onnx_dir,
+        "quantize": args.quantize,
+        "token_budget": int(os.getenv("EMBEDDING_TOKEN_BUDGET", 8192)),
+        "max_batch_size": int(os.getenv("EMBEDDING_MAX_BATCH", 256)),
+    }
+    engine = VideoSearchEngine(
+        model_name=args.model,
+        index_type=os.getenv("INDEX_TYPE", "flat"),
+        metric=os.getenv("INDEX_METRIC", "cosine"),
+        index_params={
+            "nlist": int(os.getenv("INDEX_NLIST", 256)),
+            "pq_m": int(os.getenv("INDEX_PQ_M", 48)),
+            "hnsw_m": int(os.getenv("INDEX_HNSW_M", 32)),
+            "nprobe": int(os.getenv("INDEX_NPROBE", 8)),
+            "ef_search": int(os.getenv("INDEX_EF_SEARCH", 64)),
+            "storage": os.getenv("INDEX_STORAGE", "float32"),
+            "refine_factor": int(os.getenv("INDEX_REFINE_FACTOR", 0)),
+            # Exact vectors for re-ranking, next to the snapshot they belong to
+            "refine_path": os.path.join(args.output_dir, "vectors.f32")
+            if (os.getenv("INDEX_STORAGE", "float32") != "float32" or os.getenv("INDEX_TYPE", "flat") == "ivf_pq")
+            and os.getenv("INDEX_EXACT_VECTORS", "true").lower() == "true" else None,
+        },
+        embedding_params=embedding_params
+    )
+    pool = ReindexPool(
+        engine.embedding_manager,
+        embedding_params=embedding_params,
+        num_workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        shard_size=args.shard_size,
+        checkpoint_dir=args.checkpoint_dir
+    )
+    progress = pool.run(videos, on_video=lambda video, embeddings: engine.index_video(video, embeddings))
+
+    IndexSnapshotter(engine, data_dir=args.output_dir).snapshot(force=True)
+    pool.remove_checkpoint()
+    print(f"\nRe-indexed {progress['total_videos']} videos ({progress['total_chunks']} chunks) "
+          f"with {args.model} in {progress.get('elapsed_seconds', 0)}s into {args.output_dir}")
+    print(f"Serve it with INDEX_DATA_DIR={args.output_dir} EMBEDDING_MODEL={args.model}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('duration', 'tokens', 'sentences')
+# Sentence ends inside a Whisper segment
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+WORD_OR_PUNCT = re.compile(r"\w+|[^\w\s]")
+# WordPiece splits English words into ~1.3 tokens on average
+TOKENS_PER_WORD = 1.3
+# [CLS] and [SEP], counted against max_tokens
+SPECIAL_TOKENS = 2
+
+# A piece of transcript placed in chunks as a whole: (start, end, text, tokens)
+Unit = Tuple[float, float, str, int]
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate WordPiece token count (no tokenizer needed, e.g. in transcription workers)."""
+    pieces = WORD_OR_PUNCT.findall(text)
+    words = sum(1 for piece in pieces if piece[0].isalnum() or piece[0] == '_')
+    return int(np.ceil(words * TOKENS_PER_WORD)) + len(pieces) - words
+
+
+class SegmentChunker:
+    def __init__(
+        self,
+        strategy: str = 'duration',
+        chunk_duration: float = 30.0,
+        target_tokens: int = 200,
+        max_tokens: int = 256,
+        overlap: float = 0.0,
+        token_counter: Optional[Callable[[str], int]] = None
+    ):
+        """
+        Group Whisper segments into chunks, one segment at a time.
+
+        Strategies:
+            duration: close a chunk when the next segment would stretch it past
+                chunk_duration seconds (the original 30 s chunking)
+            tokens: close a chunk when the next segment would take it past target_tokens
+            sentences: like tokens, but segments are first cut into sentences
+                (timestamps interpolated inside a segment) and a sentence is never
+                split across chunks, even if Whisper split it across segments
+
+        Every strategy also closes a chunk before it exceeds max_tokens (the
+        embedding model's window, special tokens included), and a single
+        segment or sentence longer than that is cut at word boundaries, so
+        nothing is silently truncated by the model.
+
+        With overlap, each new chunk starts with the trailing segments (or
+        sentences) of the previous one: up to overlap seconds for the duration
+        strategy, up to overlap tokens for the others.
+
+        Args:
+            strategy: 'duration', 'tokens' or 'sentences'
+            chunk_duration: Target chunk length in seconds (duration strategy)
+            target_tokens: Target chunk length in tokens (tokens / sentences strategies)
+            max_tokens: Hard limit on chunk tokens
+            overlap: Context repeated from the previous chunk (seconds or tokens)
+            token_counter: Exact token count of a text; defaults to estimate_tokens
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown chunking strategy '{strategy}' (expected one of {', '.join(STRATEGIES)})")
+        self.strategy = strategy
+        self.chunk_duration = chunk_duration
+        self.max_tokens = max_tokens
+        self.target_tokens = min(target_tokens, max_tokens)
+        self.overlap = overlap
+        self.count_tokens = token_counter or estimate_tokens
+        self._units: List[Unit] = []
+        self._tokens = 0
+        self._start = 0.0
+        self._end = 0.0
+        # Sentence strategy: start of a sentence still running at the end of the last segment
+        self._partial: Optional[Tuple[float, float, str]] = None
+        self._next_id = 0
+
+    @property
+    def _budget(self) -> int:
+        return self.max_tokens - SPECIAL_TOKENS
+
+    def _make_chunk(self, end_time: float) -> Optional[Dict]:
+        units = [unit for unit in self._units if unit[2]]
+        if not units:  # Only add non-empty chunks
+            return None
+        texts = [unit[2] for unit in units]
+        # Keep where each segment starts so search can point inside the chunk
+        offsets = np.cumsum([0] + [len(text) + 1 for text in texts[:-1]])
+        chunk = {
+            "chunk_id": f"chunk_{self._next_id}",
+            "text": " ".join(texts),
+            "start_time": round(self._start, 2),
+            "end_time": round(end_time, 2),
+            "segment_starts": [round(unit[0], 2) for unit in units],
+            "segment_offsets": offsets.tolist()
+        }
+        self._next_id += 1
+        return chunk
+
+    def _fits(self, unit: Unit, start: Optional[float] = None) -> bool:
+        """Whether unit can join the open chunk (starting at start, default the chunk's start)."""
+        tokens = self._tokens + unit[3]
+        if tokens > self._budget:
+            return False
+        if self.strategy == 'duration':
+            return unit[1] - (self._start if start is None else start) <= self.chunk_duration
+        return tokens <= self.target_tokens
+
+    def _carry(self) -> List[Unit]:
+        """Trailing units of the closed chunk to repeat at the start of the next one."""
+        if self.overlap <= 0:
+            return []
+        carried: List[Unit] = []
+        tokens = 0
+        # Never the whole chunk, or chunks would repeat forever
+        for unit in reversed(self._units[1:]):
+            if self.strategy == 'duration':
+                if self._units[-1][1] - unit[0] > self.overlap:
+                    break
+            elif tokens + unit[3] > self.overlap:
+                break
+            carried.insert(0, unit)
+            tokens += unit[3]
+        return carried
+
+    def _push(self, unit: Unit) -> Optional[Dict]:
+        """Add a unit; returns the chunk it closed, if any."""
+        chunk = None
+        if self._units and not self._fits(unit):
+            chunk = self._make_chunk(unit[0])
+            self._units = self._carry()
+            self._tokens = sum(u[3] for u in self._units)
+            # Drop carried context the new unit does not leave room for
+            while self._units and not self._fits(unit, start=self._units[0][0]):
+                self._tokens -= self._units.pop(0)[3]
+            self._start = self._units[0][0] if self._units else unit[0]
+        self._units.append(unit)
+        self._tokens += unit[3]
+        self._end = unit[1]
+        return chunk
+
+    def _split(self, start: float, end: float, text: str) -> List[Unit]:
+        """Cut text into units within the token budget, at word boundaries, interpolating times."""
+        tokens = self.count_tokens(text)
+        if tokens <= self._budget:
+            return [(start, end, text, tokens)]
+        words = text.split()
+        units = []
+        first = 0
+        while first < len(words):
+            last = first + 1
+            while last < len(words) and self.count_tokens(" ".join(words[first:last + 1])) <= self._budget:
+                last += 1
+            piece = " ".join(words[first:last])
+            units.append((
+                start + (end - start) * first / len(words),
+                start + (end - start) * last / len(words),
+                piece,
+                self.count_tokens(piece)
+            ))
+            first = last
+        return units
+
+    def _sentences(self, segment: Dict) -> List[Tuple[float, float, str]]:
+        """Complete sentences ending in this segment; an unfinished last one is held back."""
+        text = segment['text'].strip()
+        pieces = [piece for piece in SENTENCE_SPLIT.split(text) if piece]
+        duration = segment['end'] - segment['start']
+        sentences = []
+        position = 0
+        for piece in pieces:
+            offset = text.index(piece, position)
+            position = offset + len(piece)
+            start = segment['start'] + duration * offset / max(len(text), 1)
+            end = segment['start'] + duration * position / max(len(text), 1)
+            if self._partial is not None:
+                start, piece = self._partial[0], f"{self._partial[2]} {piece}"
+                self._partial = None
+            sentences.append((start, end, piece))
+        if sentences and not sentences[-1][2].endswith(('.', '!', '?')):
+            self._partial = sentences.pop()
+        return sentences
+
+    def add(self, segment: Dict) -> List[Dict]:
+        """Add the next segment; returns the chunks it closed."""
+        if self.strategy == 'sentences':
+            pieces = self._sentences(segment)
+        else:
+            pieces = [(segment['start'], segment['end'], segment['text'].strip())]
+        chunks = []
+        for piece in pieces:
+            for unit in self._split(*piece):
+                chunk = self._push(unit)
+                if chunk:
+                    chunks.append(chunk)
+        self._end = max(self._end, segment['end'])
+        return chunks
+
+    def finish(self) -> List[Dict]:
+        """Close the last chunk(s) with the remaining text."""
+        chunks = []
+        if self._partial is not None:
+            partial, self._partial = self._partial, None
+            for unit in self._split(*partial):
+                chunk = self._push(unit)
+                if chunk:
+                    chunks.append(chunk)
+        final = self._make_chunk(self._end) if self._units else None
+        self._units = []
+        self._tokens = 0
+        return chunks + [final] if final else chunks
+
+
+def chunk_segments(segments: List[Dict], **options) -> List[Dict]:
+    """Chunk a whole transcript's segments (see SegmentChunker for the options)."""
+    chunker = SegmentChunker(**options)
+    chunks = [chunk for segment in segments for chunk in chunker.add(segment)]
+    return chunks + chunker.finish()
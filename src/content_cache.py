@@ -0,0 +1,174 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import time
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENTRY_FILE = 'entry.json'
+EMBEDDINGS_FILE = 'embeddings.npy'
+# Read size for hashing uploads while they are saved
+COPY_BLOCK_BYTES = 1024 * 1024
+
+
+def save_and_hash(source: BinaryIO, destination: BinaryIO) -> Tuple[str, int]:
+    """
+    Copy a file object and compute its SHA-256 in the same pass.
+
+    Returns:
+        (hex digest, bytes copied)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        block = source.read(COPY_BLOCK_BYTES)
+        if not block:
+            break
+        digest.update(block)
+        destination.write(block)
+        size += len(block)
+    return digest.hexdigest(), size
+
+
+def audio_fingerprint(energy_db: np.ndarray) -> Optional[str]:
+    """
+    Coarse fingerprint of a recording from its per-second energy envelope (dBFS).
+
+    Energies are quantized to 3 dB steps, so the fingerprint identifies the
+    same audio track independently of the container it was uploaded in.
+    """
+    if not len(energy_db):
+        return None
+    envelope = np.clip(np.round(np.asarray(energy_db) / 3.0), -127, 0).astype('int8')
+    return f"{len(envelope)}s:{hashlib.sha256(envelope.tobytes()).hexdigest()[:32]}"
+
+
+class ContentCache:
+    def __init__(self, directory: str):
+        """
+        Content-addressed cache of upload results, keyed by the SHA-256 of the uploaded file.
+
+        Each entry keeps what processing the file produced: the audio
+        fingerprint, Whisper segments, transcript chunks and (when known) the
+        chunk embeddings with the model that made them, plus the video_id the
+        content was last indexed under. Entries are written to a temporary
+        directory and renamed into place, so readers never see half an entry.
+
+        Args:
+            directory: Cache root; entries live in <root>/<hash[:2]>/<hash>/
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Lookup outcomes since startup: hits reuse a cached transcript,
+        # aliases point at a video already indexed or being processed
+        self.hits = 0
+        self.aliases = 0
+        self.misses = 0
+
+    def _entry_dir(self, content_hash: str) -> str:
+        return os.path.join(self.directory, content_hash[:2], content_hash)
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Cached entry for a content hash (without embeddings), or None."""
+        path = os.path.join(self._entry_dir(content_hash), ENTRY_FILE)
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable content cache entry {content_hash}: {e}")
+            return None
+
+    def load_embeddings(self, content_hash: str, model_name: str) -> Optional[np.ndarray]:
+        """
+        Cached chunk embeddings, if they were made by model_name.
+
+        Returns:
+            (n_chunks, dim) float32 array, or None if missing or from another model
+        """
+        entry = self.get(content_hash)
+        if entry is None or entry.get('embedding_model') != model_name:
+            return None
+        path = os.path.join(self._entry_dir(content_hash), EMBEDDINGS_FILE)
+        if not os.path.exists(path):
+            return None
+        embeddings = np.load(path)
+        return embeddings if len(embeddings) == len(entry['chunks']) else None
+
+    def put(
+        self,
+        content_hash: str,
+        entry: Dict[str, Any],
+        embeddings: Optional[np.ndarray] = None,
+        model_name: Optional[str] = None
+    ):
+        """
+        Store (or replace) the entry for a content hash.
+
+        Args:
+            content_hash: SHA-256 of the uploaded file
+            entry: JSON-serializable entry (video_id, title, duration, chunks, segments, audio_fingerprint)
+            embeddings: Chunk embeddings in chunk order, if available
+            model_name: Embedding model that produced them
+        """
+        entry = dict(entry, content_hash=content_hash, cached_at=time.time(),
+                     embedding_model=model_name if embeddings is not None else None)
+        final_dir = self._entry_dir(content_hash)
+        tmp_dir = f"{final_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        with open(os.path.join(tmp_dir, ENTRY_FILE), 'w') as f:
+            json.dump(entry, f)
+        if embeddings is not None:
+            np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), np.asarray(embeddings, dtype='float32'))
+        with self._lock:
+            if os.path.exists(final_dir):
+                shutil.rmtree(final_dir)
+            os.rename(tmp_dir, final_dir)
+        logger.info(f"Cached results of upload {content_hash[:12]} (video {entry.get('video_id')})")
+
+    def set_video(self, content_hash: str, video_id: str):
+        """Record the video_id a cached entry is now indexed under."""
+        entry = self.get(content_hash)
+        if entry is None:
+            return
+        entry['video_id'] = video_id
+        path = os.path.join(self._entry_dir(content_hash), ENTRY_FILE)
+        with self._lock:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(entry, f)
+            os.replace(path + '.tmp', path)
+
+    def record(self, outcome: str):
+        """Count a lookup outcome ('hit', 'alias' or 'miss')."""
+        with self._lock:
+            if outcome == 'hit':
+                self.hits += 1
+            elif outcome == 'alias':
+                self.aliases += 1
+            else:
+                self.misses += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        entries = 0
+        size = 0
+        for root, dirs, files in os.walk(self.directory):
+            if ENTRY_FILE in files:
+                entries += 1
+            size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        lookups = self.hits + self.aliases + self.misses
+        return {
+            'directory': self.directory,
+            'entries': entries,
+            'disk_bytes': size,
+            'hits': self.hits,
+            'aliases': self.aliases,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.aliases) / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+from typing import Any, Dict, List, Tuple
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+VECTORS_FILE = 'vectors.npy'
+KEYS_FILE = 'keys.npy'
+LAST_USED_FILE = 'last_used.npy'
+# Bytes of the BLAKE2b text digest used as the cache key
+KEY_BYTES = 16
+
+
+class PersistentEmbeddingCache:
+    def __init__(
+        self,
+        directory: str,
+        model_name: str,
+        dimension: int,
+        normalize: bool,
+        max_entries: int = 200000,
+        dtype: str = 'float16',
+        initial_capacity: int = 1024
+    ):
+        """
+        On-disk cache of text embeddings for one model, shared across restarts.
+
+        Vectors live in a memory-mapped (capacity, dimension) matrix next to a
+        matching matrix of text digests and a last-used counter per slot; the
+        digest -> slot index is rebuilt from them on open. The files double in
+        size as entries are added up to max_entries, after which the least
+        recently used tenth is evicted to make room. Each model (and
+        normalization setting) gets its own subdirectory.
+
+        Args:
+            directory: Cache root
+            model_name: Embedding model the vectors come from
+            dimension: Embedding dimension
+            normalize: Whether the model's embeddings are L2-normalized
+            max_entries: Most embeddings kept
+            dtype: Storage type, 'float16' (half the disk and page cache) or 'float32' (exact)
+            initial_capacity: Slots allocated when the cache is created
+        """
+        if dtype not in ('float16', 'float32'):
+            raise ValueError(f"Unsupported embedding cache dtype: {dtype}")
+        self.model_name = model_name
+        self.dimension = dimension
+        self.normalize = normalize
+        self.max_entries = max_entries
+        self.dtype = dtype
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name) + ('-normalized' if normalize else '')
+        self.directory = os.path.join(directory, slug)
+        self._lock = threading.Lock()
+        self._tick = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if not self._open():
+            self._create(min(initial_capacity, max_entries))
+
+    def _meta(self) -> Dict[str, Any]:
+        return {
+            'format_version': CACHE_FORMAT_VERSION,
+            'model_name': self.model_name,
+            'dimension': self.dimension,
+            'normalize': self.normalize,
+            'dtype': self.dtype
+        }
+
+    def _open(self) -> bool:
+        """Open an existing cache; returns False if there is none or it does not match this model."""
+        try:
+            with open(os.path.join(self.directory, META_FILE)) as f:
+                if json.load(f) != self._meta():
+                    logger.warning(f"Embedding cache at {self.directory} was built with other settings; starting over")
+                    return False
+            self._vectors = np.load(os.path.join(self.directory, VECTORS_FILE), mmap_mode='r+')
+            self._keys = np.load(os.path.join(self.directory, KEYS_FILE), mmap_mode='r+')
+            self._last_used = np.load(os.path.join(self.directory, LAST_USED_FILE), mmap_mode='r+')
+        except (OSError, ValueError):
+            return False
+        if not (len(self._vectors) == len(self._keys) == len(self._last_used)):
+            logger.warning(f"Embedding cache at {self.directory} is inconsistent; starting over")
+            return False
+
+        used = np.flatnonzero(self._last_used)
+        self._index = {self._keys[slot].tobytes(): int(slot) for slot in used}
+        self._free = np.flatnonzero(self._last_used == 0)[::-1].tolist()
+        self._tick = int(self._last_used.max()) if len(self._last_used) else 0
+        logger.info(f"Opened embedding cache at {self.directory} with {len(self._index)} entries")
+        return True
+
+    def _allocate(self, directory: str, capacity: int) -> Tuple[np.memmap, np.memmap, np.memmap]:
+        open_memmap = np.lib.format.open_memmap
+        return (
+            open_memmap(os.path.join(directory, VECTORS_FILE), mode='w+', dtype=self.dtype, shape=(capacity, self.dimension)),
+            open_memmap(os.path.join(directory, KEYS_FILE), mode='w+', dtype='uint8', shape=(capacity, KEY_BYTES)),
+            open_memmap(os.path.join(directory, LAST_USED_FILE), mode='w+', dtype='int64', shape=(capacity,))
+        )
+
+    def _create(self, capacity: int):
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+        self._vectors, self._keys, self._last_used = self._allocate(self.directory, capacity)
+        with open(os.path.join(self.directory, META_FILE), 'w') as f:
+            json.dump(self._meta(), f)
+        self._index: Dict[bytes, int] = {}
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+
+    def _grow(self, capacity: int):
+        """Reallocate the memory-mapped files with more slots, keeping every entry in place."""
+        tmp_dir = self.directory + '.grow'
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        vectors, keys, last_used = self._allocate(tmp_dir, capacity)
+        size = len(self._vectors)
+        vectors[:size] = self._vectors
+        keys[:size] = self._keys
+        last_used[:size] = self._last_used
+        for array in (vectors, keys, last_used):
+            array.flush()
+        del self._vectors, self._keys, self._last_used
+        for name in (VECTORS_FILE, KEYS_FILE, LAST_USED_FILE):
+            os.replace(os.path.join(tmp_dir, name), os.path.join(self.directory, name))
+        shutil.rmtree(tmp_dir)
+        self._vectors, self._keys, self._last_used = vectors, keys, last_used
+        self._free = list(range(capacity - 1, size - 1, -1)) + self._free
+
+    def _evict(self, count: int):
+        """Free the count least recently used slots."""
+        used = np.flatnonzero(self._last_used)
+        count = min(count, len(used))
+        if not count:
+            return
+        victims = used[np.argpartition(self._last_used[used], count - 1)[:count]]
+        for slot in victims:
+            del self._index[self._keys[slot].tobytes()]
+        self._last_used[victims] = 0
+        self._free.extend(int(slot) for slot in victims)
+        self.evictions += count
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        """Digest of whitespace-normalized text."""
+        return hashlib.blake2b(" ".join(text.split()).encode('utf-8'), digest_size=KEY_BYTES).digest()
+
+    def get_many(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Look up embeddings for texts.
+
+        Returns:
+            (embeddings, found): float32 (n, dimension) array with zero rows for
+            misses, and a boolean mask of the texts that were cached
+        """
+        embeddings = np.zeros((len(texts), self.dimension), dtype='float32')
+        found = np.zeros(len(texts), dtype=bool)
+        with self._lock:
+            self._tick += 1
+            slots = [self._index.get(self._key(text), -1) for text in texts]
+            positions = [i for i, slot in enumerate(slots) if slot >= 0]
+            if positions:
+                hit_slots = np.array([slots[i] for i in positions])
+                embeddings[positions] = self._vectors[hit_slots]
+                self._last_used[hit_slots] = self._tick
+                found[positions] = True
+            self.hits += len(positions)
+            self.misses += len(texts) - len(positions)
+        return embeddings, found
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        """Store embeddings for texts (already cached texts are refreshed)."""
+        with self._lock:
+            self._tick += 1
+            keys = {}
+            for text, embedding in zip(texts, embeddings):
+                keys[self._key(text)] = embedding
+            new = [key for key in keys if key not in self._index]
+            if len(self._index) + len(new) > self.max_entries:
+                self._evict(max(len(self._index) + len(new) - self.max_entries, self.max_entries // 10))
+            if len(new) > len(self._free) and len(self._vectors) < self.max_entries:
+                capacity = len(self._vectors)
+                while capacity - len(self._vectors) + len(self._free) < len(new):
+                    capacity *= 2
+                self._grow(min(capacity, self.max_entries))
+
+            for key, embedding in keys.items():
+                slot = self._index.get(key)
+                if slot is None:
+                    if not self._free:
+                        break  # More new texts in one call than max_entries
+                    slot = self._free.pop()
+                    self._index[key] = slot
+                    self._keys[slot] = np.frombuffer(key, dtype='uint8')
+                self._vectors[slot] = embedding
+                self._last_used[slot] = self._tick
+
+    def flush(self):
+        """Write dirty pages of the memory-mapped files to disk."""
+        with self._lock:
+            for array in (self._vectors, self._keys, self._last_used):
+                array.flush()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'directory': self.directory,
+            'dtype': self.dtype,
+            'entries': len(self._index),
+            'capacity': len(self._vectors),
+            'max_entries': self.max_entries,
+            'disk_bytes': int(self._vectors.nbytes + self._keys.nbytes + self._last_used.nbytes),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -1,47 +1,290 @@
-from sentence_transformers import SentenceTransformer
+import os
+import re
+import json
 import numpy as np
-from typing import List, Union
+from typing import List, Optional, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
+BACKENDS = ('torch', 'onnx')
+# Files of an exported ONNX model directory (tokenizer files are saved alongside)
+ONNX_MODEL_FILE = 'model.onnx'
+ONNX_QUANTIZED_FILE = 'model_int8.onnx'
+ONNX_CONFIG_FILE = 'embedding_config.json'
+
+
+class _TorchBackend:
+    def __init__(self, model_name: str, num_threads: Optional[int] = None):
+        from sentence_transformers import SentenceTransformer
+
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: int, normalize: bool) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=len(texts) > 100,
+            convert_to_numpy=True,
+            normalize_embeddings=normalize
+        )
+
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        encoded = self.model.tokenizer(texts, truncation=True, max_length=self.model.max_seq_length)
+        return np.array([len(ids) for ids in encoded['input_ids']])
+
+
+class _OnnxBackend:
+    def __init__(self, model_name: str, export_dir: str, quantize: bool = False, num_threads: Optional[int] = None):
+        """
+        Sentence-transformer inference through ONNX Runtime on CPU.
+
+        The transformer is exported once (and optionally INT8-quantized) into
+        export_dir; later starts load only the tokenizer and the ONNX session,
+        so PyTorch is not needed to serve. Pooling and normalization follow the
+        sentence-transformer's own modules, so embeddings match the torch backend.
+
+        Args:
+            model_name: sentence-transformers model to export
+            export_dir: Directory for the exported model, shared across restarts
+            quantize: Run the INT8 dynamically quantized model
+            num_threads: ONNX Runtime intra-op threads (None lets it decide)
+        """
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError("The onnx embedding backend needs onnxruntime and transformers (pip install onnxruntime)") from e
+
+        self.directory = os.path.join(export_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        if not os.path.exists(os.path.join(self.directory, ONNX_CONFIG_FILE)):
+            self._export(model_name)
+        model_file = ONNX_MODEL_FILE
+        if quantize:
+            model_file = ONNX_QUANTIZED_FILE
+            if not os.path.exists(os.path.join(self.directory, model_file)):
+                self._quantize()
+
+        with open(os.path.join(self.directory, ONNX_CONFIG_FILE)) as f:
+            config = json.load(f)
+        self.dimension = config['dimension']
+        self.pooling = config['pooling']
+        self.normalize_layer = config['normalize_layer']
+        self.max_seq_length = config['max_seq_length']
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(self.directory, model_file), options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(self.directory)
+        logger.info(f"Loaded ONNX model {model_file} from {self.directory}")
+
+    def _export(self, model_name: str):
+        """Export the sentence-transformer's transformer module to ONNX with dynamic batch and sequence axes."""
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Exporting {model_name} to ONNX in {self.directory}...")
+        model = SentenceTransformer(model_name, device='cpu')
+        modules = [type(module).__name__ for module in model]
+        transformer, pooling = model[0], model[1]
+        pooling_mode = pooling.get_pooling_mode_str()
+        if pooling_mode not in ('mean', 'cls'):
+            raise ValueError(f"Unsupported pooling mode for the onnx backend: {pooling_mode}")
+
+        os.makedirs(self.directory, exist_ok=True)
+        tokenizer = transformer.tokenizer
+        tokenizer.save_pretrained(self.directory)
+        sample = tokenizer(["export sample"], return_tensors='pt')
+        input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+        dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+        class HiddenStates(torch.nn.Module):
+            """Exposes only the token embeddings, with positional inputs, for tracing."""
+            def __init__(self, auto_model):
+                super().__init__()
+                self.auto_model = auto_model
+
+            def forward(self, *inputs):
+                return self.auto_model(**dict(zip(input_names, inputs)))[0]
+
+        with torch.no_grad():
+            torch.onnx.export(
+                HiddenStates(transformer.auto_model).eval(),
+                tuple(sample[name] for name in input_names),
+                os.path.join(self.directory, ONNX_MODEL_FILE),
+                input_names=input_names,
+                output_names=['last_hidden_state'],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                do_constant_folding=True
+            )
+        with open(os.path.join(self.directory, ONNX_CONFIG_FILE), 'w') as f:
+            json.dump({
+                'model_name': model_name,
+                'dimension': model.get_sentence_embedding_dimension(),
+                'pooling': pooling_mode,
+                'normalize_layer': 'Normalize' in modules,
+                'max_seq_length': model.max_seq_length
+            }, f)
+        logger.info(f"Exported {model_name} to ONNX")
+
+    def _quantize(self):
+        """Write an INT8 dynamically quantized copy of the exported model (weights int8, activations quantized at runtime)."""
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info("Quantizing ONNX model to INT8...")
+        quantize_dynamic(
+            os.path.join(self.directory, ONNX_MODEL_FILE),
+            os.path.join(self.directory, ONNX_QUANTIZED_FILE),
+            weight_type=QuantType.QInt8
+        )
+
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_seq_length)
+        return np.array([len(ids) for ids in encoded['input_ids']])
+
+    def encode(self, texts: List[str], batch_size: int, normalize: bool) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            feed = {name: encoded[name].astype('int64') for name in self.input_names}
+            hidden = self.session.run(['last_hidden_state'], feed)[0]
+            if self.pooling == 'cls':
+                pooled = hidden[:, 0]
+            else:
+                # Mean over real tokens only (padding masked out)
+                mask = encoded['attention_mask'][..., None].astype('float32')
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled.astype('float32'))
+        embeddings = np.vstack(batches) if batches else np.zeros((0, self.dimension), dtype='float32')
+        if normalize or self.normalize_layer:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
 
 class EmbeddingManager:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
+    def __init__(
+        self,
+        model_name: str = 'all-MiniLM-L6-v2',
+        normalize: bool = False,
+        backend: str = 'torch',
+        onnx_dir: str = 'data/onnx',
+        quantize: bool = False,
+        num_threads: Optional[int] = None,
+        token_budget: int = 8192,
+        max_batch_size: int = 256
+    ):
         """
         Initialize the embedding manager with a sentence transformer model.
-        
+
         Args:
             model_name: Name of the sentence transformer model to use
+            normalize: L2-normalize embeddings so inner product equals cosine similarity
+            backend: 'torch' (sentence-transformers) or 'onnx' (ONNX Runtime, CPU)
+            onnx_dir: Where the onnx backend keeps exported models
+            quantize: Use the INT8 dynamically quantized model (onnx backend only)
+            num_threads: Inference threads (None = runtime default)
+            token_budget: Padded tokens per batch in encode_bulk
+            max_batch_size: Most texts per batch in encode_bulk
         """
-        logger.info(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        self.embedding_dim = self.model.get_sentence_embedding_dimension()
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported embedding backend: {backend}")
+        logger.info(f"Loading embedding model: {model_name} ({backend}{' int8' if quantize and backend == 'onnx' else ''})")
+        self.model_name = model_name
+        self.normalize = normalize
+        self.backend_name = backend
+        self.quantize = quantize and backend == 'onnx'
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        if backend == 'onnx':
+            self.backend = _OnnxBackend(model_name, onnx_dir, quantize=quantize, num_threads=num_threads)
+        else:
+            self.backend = _TorchBackend(model_name, num_threads=num_threads)
+        self.embedding_dim = self.backend.dimension
+        # Identifies the vectors this manager produces; fp32 ONNX matches torch, INT8 does not
+        self.model_id = f"{model_name}+int8" if self.quantize else model_name
         logger.info(f"Model loaded. Embedding dimension: {self.embedding_dim}")
-    
+
     def encode(self, texts: Union[str, List[str]], batch_size: int = 32) -> np.ndarray:
         """
         Encode text(s) into embeddings.
-        
+
         Args:
             texts: Single text or list of texts to encode
             batch_size: Batch size for encoding multiple texts
-            
+
         Returns:
             Numpy array of embeddings
         """
         if isinstance(texts, str):
             texts = [texts]
-        
-        embeddings = self.model.encode(
-            texts,
-            batch_size=batch_size,
-            show_progress_bar=len(texts) > 100,
-            convert_to_numpy=True
-        )
-        
+
+        embeddings = self.backend.encode(texts, batch_size, self.normalize)
+
         return embeddings
-    
+
+    def encode_bulk(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode many texts in batches sized by a token budget rather than a fixed count.
+
+        Texts are sorted by token length so each batch pads to a similar
+        length, and a batch grows until (texts x longest text) would exceed
+        token_budget. Short texts therefore run in large batches and long ones
+        in small batches. Duplicate texts are encoded once. Rows come back in
+        the input order.
+
+        Args:
+            texts: Texts to encode
+
+        Returns:
+            Numpy array of embeddings, one row per input text
+        """
+        unique = list(dict.fromkeys(texts))
+        embeddings = np.zeros((len(unique), self.embedding_dim), dtype='float32')
+        if not unique:
+            return embeddings
+        lengths = self.backend.token_lengths(unique)
+        order = np.argsort(lengths, kind='stable')
+
+        batches = []
+        batch: List[int] = []
+        for position in order:
+            # Ascending order: the text being added is the batch's longest
+            if batch and ((len(batch) + 1) * lengths[position] > self.token_budget or len(batch) >= self.max_batch_size):
+                batches.append(batch)
+                batch = []
+            batch.append(int(position))
+        batches.append(batch)
+
+        padded = 0
+        for batch in batches:
+            embeddings[batch] = self.backend.encode([unique[i] for i in batch], len(batch), self.normalize)
+            padded += len(batch) * int(lengths[batch[-1]])
+        logger.info(f"Encoded {len(unique)} texts in {len(batches)} batches "
+                    f"({int(lengths.sum())} tokens, {padded} with padding)")
+
+        if len(unique) == len(texts):
+            return embeddings
+        positions = {text: i for i, text in enumerate(unique)}
+        return embeddings[[positions[text] for text in texts]]
+
     def get_embedding_dimension(self) -> int:
         """Get the dimension of the embeddings."""
-        return self.embedding_dim
\ No newline at end of file
+        return self.embedding_dim
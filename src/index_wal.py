@@ -0,0 +1,194 @@
+import os
+import json
+import struct
+import threading
+import zlib
+from typing import Any, Dict, Iterator, Optional, Tuple
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Record layout (little endian):
+#   u32 body_length | u32 crc32(body) | body
+# body:
+#   u64 seq | u32 json_length | json | u32 rows | u32 dim | float32[rows * dim]
+RECORD_HEADER = struct.Struct('<II')
+BODY_HEADER = struct.Struct('<QI')
+MATRIX_HEADER = struct.Struct('<II')
+
+
+def _scan_file(path: str) -> Iterator[Tuple[int, str, Dict[str, Any], Optional[np.ndarray], int]]:
+    """Yield (seq, op, payload, embeddings, end_offset) for every intact record of a log file."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        offset = 0
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            length, crc = RECORD_HEADER.unpack(header)
+            body = f.read(length)
+            if len(body) < length or zlib.crc32(body) != crc:
+                return
+            offset += RECORD_HEADER.size + length
+            yield (*WriteAheadLog._decode(body), offset)
+
+
+def fsync_dir(path: str):
+    """fsync a directory so the entries created or renamed in it survive a power loss."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_log(path: str, after_seq: int = 0) -> Iterator[Tuple[int, str, Dict[str, Any], Optional[np.ndarray]]]:
+    """
+    Read the records of a log another process may be appending to.
+
+    Unlike opening a WriteAheadLog, this never truncates a torn tail
+    (it may be a record still being written) and never writes.
+    """
+    for seq, op, payload, embeddings, _ in _scan_file(path):
+        if seq > after_seq:
+            yield seq, op, payload, embeddings
+
+
+class WriteAheadLog:
+    def __init__(self, path: str, fsync: bool = True):
+        """
+        Append-only log of index mutations, stored with their embeddings.
+
+        Every index/append/delete/clear is appended before it is applied, so after a
+        crash the last checkpoint plus this log rebuilds the index without
+        re-running the embedding model. A torn record at the tail (crash mid
+        append) is detected by its checksum and cut off on open.
+
+        Args:
+            path: Log file location
+            fsync: fsync after every append (durable against power loss, slower)
+        """
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        self.last_seq = 0
+        valid_bytes = 0
+        for seq, _, _, _, end_offset in self._scan():
+            self.last_seq = seq
+            valid_bytes = end_offset
+        if os.path.exists(path) and os.path.getsize(path) > valid_bytes:
+            logger.warning(f"Truncating torn tail of {path} at byte {valid_bytes}")
+            with open(path, 'r+b') as f:
+                f.truncate(valid_bytes)
+
+        self._file = open(path, 'ab')
+        logger.info(f"Opened write-ahead log {path} (last seq {self.last_seq})")
+
+    def _scan(self) -> Iterator[Tuple[int, str, Dict[str, Any], Optional[np.ndarray], int]]:
+        """Yield (seq, op, payload, embeddings, end_offset) for every intact record."""
+        return _scan_file(self.path)
+
+    @staticmethod
+    def _encode(seq: int, op: str, payload: Dict[str, Any], embeddings: Optional[np.ndarray]) -> bytes:
+        document = json.dumps({'op': op, 'payload': payload}).encode('utf-8')
+        if embeddings is None:
+            matrix = np.zeros((0, 0), dtype='float32')
+        else:
+            matrix = np.ascontiguousarray(embeddings, dtype='float32')
+        return b''.join([
+            BODY_HEADER.pack(seq, len(document)),
+            document,
+            MATRIX_HEADER.pack(*matrix.shape),
+            matrix.tobytes()
+        ])
+
+    @staticmethod
+    def _decode(body: bytes) -> Tuple[int, str, Dict[str, Any], Optional[np.ndarray]]:
+        seq, document_length = BODY_HEADER.unpack_from(body, 0)
+        offset = BODY_HEADER.size
+        document = json.loads(body[offset:offset + document_length])
+        offset += document_length
+        rows, dim = MATRIX_HEADER.unpack_from(body, offset)
+        offset += MATRIX_HEADER.size
+        embeddings = None
+        if rows:
+            embeddings = np.frombuffer(body, dtype='float32', count=rows * dim, offset=offset).reshape(rows, dim)
+        return seq, document['op'], document['payload'], embeddings
+
+    def append(self, op: str, payload: Dict[str, Any], embeddings: Optional[np.ndarray] = None) -> int:
+        """
+        Durably append an operation.
+
+        Args:
+            op: Operation name ('index', 'append', 'delete', 'clear', or 'model' after a model migration)
+            payload: JSON-serializable operation arguments
+            embeddings: Vectors produced for the operation, if any
+
+        Returns:
+            Sequence number assigned to the record
+        """
+        with self._lock:
+            seq = self.last_seq + 1
+            body = self._encode(seq, op, payload, embeddings)
+            self._file.write(RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.last_seq = seq
+            return seq
+
+    def replay(self, after_seq: int = 0) -> Iterator[Tuple[int, str, Dict[str, Any], Optional[np.ndarray]]]:
+        """Yield (seq, op, payload, embeddings) for records newer than after_seq."""
+        for seq, op, payload, embeddings, _ in self._scan():
+            if seq > after_seq:
+                yield seq, op, payload, embeddings
+
+    def advance_to(self, seq: int):
+        """Make sure new records are numbered after seq (e.g. a checkpoint from an emptied log)."""
+        with self._lock:
+            self.last_seq = max(self.last_seq, seq)
+
+    def truncate(self, upto_seq: int):
+        """
+        Drop records already folded into a checkpoint (seq <= upto_seq).
+
+        Newer records are copied to a fresh file that atomically replaces the log.
+        """
+        with self._lock:
+            tmp_path = self.path + '.compact'
+            with open(self.path, 'rb') as source, open(tmp_path, 'wb') as target:
+                offset = 0
+                for seq, _, _, _, end_offset in self._scan():
+                    if seq > upto_seq:
+                        source.seek(offset)
+                        target.write(source.read(end_offset - offset))
+                    offset = end_offset
+                target.flush()
+                os.fsync(target.fileno())
+
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            # The compacted log replaces the old one only once the rename itself is durable
+            fsync_dir(os.path.dirname(os.path.abspath(self.path)))
+            self._file = open(self.path, 'ab')
+        logger.info(f"Compacted write-ahead log up to seq {upto_seq} ({self.size_bytes()} bytes remain)")
+
+    def size_bytes(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'last_seq': self.last_seq,
+            'size_bytes': self.size_bytes(),
+            'fsync': self.fsync
+        }
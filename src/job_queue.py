@@ -0,0 +1,496 @@
+import os
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle:
+#   queued -> running (worker transcribing) -> transcribed -> indexing -> completed
+# A failed attempt goes back to queued after a backoff until max_attempts is
+# reached, then to failed. Queued or transcribed jobs can be cancelled outright;
+# running / indexing jobs are flagged and stop at their next checkpoint.
+# Streaming workers also publish chunk batches while running; the indexer
+# tracks how far it got per job with indexed_attempt / indexed_seq.
+JOB_STATES = ('queued', 'running', 'transcribed', 'indexing', 'completed', 'failed', 'cancelled')
+TERMINAL_STATES = ('completed', 'failed', 'cancelled')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    available_at REAL NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    indexed_attempt INTEGER NOT NULL DEFAULT 0,
+    indexed_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, priority DESC, created_at);
+CREATE TABLE IF NOT EXISTS job_chunks (
+    job_id TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    chunks TEXT NOT NULL,
+    duration REAL NOT NULL,
+    PRIMARY KEY (job_id, attempt, seq)
+);
+"""
+
+# Columns added after the first release, with their definitions, for databases created before them
+MIGRATIONS = {
+    'indexed_attempt': "INTEGER NOT NULL DEFAULT 0",
+    'indexed_seq': "INTEGER NOT NULL DEFAULT 0"
+}
+
+
+class JobQueue:
+    def __init__(
+        self,
+        db_path: str,
+        max_attempts: int = 3,
+        lease_seconds: float = 60.0,
+        retry_backoff_seconds: float = 5.0
+    ):
+        """
+        Durable job queue stored in SQLite, shared by the API and worker processes.
+
+        Every operation runs in its own short transaction on a fresh
+        connection, so any number of processes can claim and update jobs
+        concurrently: writes take the lock up front (IMMEDIATE), while reads
+        use a deferred transaction that sees a consistent snapshot (WAL
+        journal) without waiting for writers. Claimed jobs hold a lease that the worker renews; jobs
+        whose lease runs out (worker crashed) are handed out again.
+
+        Args:
+            db_path: SQLite database file
+            max_attempts: Default number of tries before a job is marked failed
+            lease_seconds: How long a claim is valid without a heartbeat
+            retry_backoff_seconds: Delay before the first retry, doubled for each further retry
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_backoff_seconds = retry_backoff_seconds
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            # WAL lets status reads proceed while a worker holds the write lock
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self, write: bool = True) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def enqueue(
+        self,
+        job_id: str,
+        payload: Dict[str, Any],
+        priority: int = 0,
+        max_attempts: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Add a job.
+
+        Args:
+            job_id: Unique job ID (the video ID for transcription jobs)
+            payload: JSON-serializable job arguments
+            priority: Higher runs first; equal priorities run in submission order
+            max_attempts: Override the queue's default number of tries
+
+        Returns:
+            The stored job
+        """
+        with self._transaction() as conn:
+            job = self._insert(conn, job_id, payload, priority, max_attempts)
+        logger.info(f"Enqueued job {job_id} (priority {priority})")
+        return job
+
+    def enqueue_unless_active(
+        self,
+        job_id: str,
+        payload: Dict[str, Any],
+        priority: int = 0,
+        max_attempts: Optional[int] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Add a job unless an unfinished one has the same payload content_hash.
+
+        The lookup and the insert share one transaction, so two identical
+        uploads arriving together cannot both be queued.
+
+        Args:
+            job_id: Unique job ID (the video ID for transcription jobs)
+            payload: JSON-serializable job arguments, including content_hash
+            priority: Higher runs first; equal priorities run in submission order
+            max_attempts: Override the queue's default number of tries
+
+        Returns:
+            (job, created): the new job, or the active one with created False
+        """
+        with self._transaction() as conn:
+            active = self._find_active(conn, payload['content_hash'])
+            if active is not None:
+                return active, False
+            job = self._insert(conn, job_id, payload, priority, max_attempts)
+        logger.info(f"Enqueued job {job_id} (priority {priority})")
+        return job, True
+
+    def _insert(
+        self,
+        conn: sqlite3.Connection,
+        job_id: str,
+        payload: Dict[str, Any],
+        priority: int,
+        max_attempts: Optional[int]
+    ) -> Dict[str, Any]:
+        now = time.time()
+        conn.execute(
+            "INSERT INTO jobs (job_id, payload, priority, state, message, max_attempts, available_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, json.dumps(payload), priority, "Queued for transcription",
+             max_attempts or self.max_attempts, now, now, now)
+        )
+        return self._to_dict(conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+
+    def claim(
+        self,
+        worker_id: str,
+        state: str = 'queued',
+        next_state: str = 'running',
+        message: str = "Transcribing audio..."
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the highest-priority job waiting in a state.
+
+        Args:
+            worker_id: Name of the claiming worker, recorded on the job
+            state: State to take jobs from ('queued' for workers, 'transcribed' for the indexer)
+            next_state: State the claimed job moves to
+            message: Status message shown while the job is in next_state
+
+        Returns:
+            The claimed job, or None if nothing is ready
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE state = ? AND available_at <= ? AND cancel_requested = 0 "
+                "ORDER BY priority DESC, created_at LIMIT 1",
+                (state, now)
+            ).fetchone()
+            if row is None:
+                return None
+            # Only transcription attempts count towards max_attempts
+            conn.execute(
+                "UPDATE jobs SET state = ?, worker_id = ?, lease_expires_at = ?, message = ?, updated_at = ?, "
+                "attempts = attempts + ? WHERE job_id = ?",
+                (next_state, worker_id, now + self.lease_seconds, message, now,
+                 1 if next_state == 'running' else 0, row['job_id'])
+            )
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row['job_id'],)).fetchone())
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """
+        Extend the lease on a claimed job.
+
+        Returns:
+            False if the worker no longer owns the job or cancellation was requested
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+                "WHERE job_id = ? AND worker_id = ? AND state IN ('running', 'indexing')",
+                (now + self.lease_seconds, now, job_id, worker_id)
+            ).rowcount
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(updated) and row is not None and not row['cancel_requested']
+
+    def update_progress(self, job_id: str, progress: int, message: str):
+        """Record progress (0-100) and a status message."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = ?, updated_at = ? WHERE job_id = ?",
+                (progress, message, time.time(), job_id)
+            )
+
+    def mark_transcribed(self, job_id: str, result: Dict[str, Any]):
+        """Store a finished transcription and hand the job to the indexer."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'transcribed', progress = 80, message = ?, result = ?, worker_id = NULL, "
+                "lease_expires_at = NULL, updated_at = ? WHERE job_id = ? AND state = 'running'",
+                ("Indexing transcript chunks...", json.dumps(result), time.time(), job_id)
+            )
+
+    def complete(self, job_id: str, message: str, result: Optional[Dict[str, Any]] = None):
+        """Mark a job completed, replacing its stored result."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'completed', progress = 100, message = ?, result = ?, error = NULL, "
+                "lease_expires_at = NULL, updated_at = ? WHERE job_id = ?",
+                (message, json.dumps(result) if result is not None else None, time.time(), job_id)
+            )
+            conn.execute("DELETE FROM job_chunks WHERE job_id = ?", (job_id,))
+
+    def append_chunks(self, job_id: str, worker_id: str, chunks: List[Dict[str, Any]], duration: float) -> Optional[int]:
+        """
+        Publish a batch of transcript chunks from a running job for incremental indexing.
+
+        Args:
+            job_id: Running job
+            worker_id: Worker holding the job
+            chunks: New chunks, in transcript order
+            duration: Seconds of the video transcribed so far
+
+        Returns:
+            The batch's sequence number within the current attempt, or None if
+            the worker no longer holds the job
+        """
+        with self._transaction() as conn:
+            job = conn.execute(
+                "SELECT attempts FROM jobs WHERE job_id = ? AND worker_id = ? AND state = 'running'",
+                (job_id, worker_id)
+            ).fetchone()
+            if job is None:
+                return None
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_chunks WHERE job_id = ? AND attempt = ?",
+                (job_id, job['attempts'])
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO job_chunks (job_id, attempt, seq, chunks, duration) VALUES (?, ?, ?, ?, ?)",
+                (job_id, job['attempts'], seq, json.dumps(chunks), duration)
+            )
+        return seq
+
+    def pending_chunks(self) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Chunk batches of the current attempt of live jobs that have not been indexed yet.
+
+        Returns:
+            (job, batches) pairs; each batch has attempt, seq, chunks and duration
+        """
+        with self._transaction(write=False) as conn:
+            rows = conn.execute(
+                "SELECT c.job_id, c.attempt, c.seq, c.chunks, c.duration FROM job_chunks c JOIN jobs j ON j.job_id = c.job_id "
+                "WHERE j.state IN ('running', 'transcribed', 'indexing') AND c.attempt = j.attempts "
+                "AND (c.attempt > j.indexed_attempt OR c.seq > j.indexed_seq) "
+                "ORDER BY j.priority DESC, j.created_at, c.seq"
+            ).fetchall()
+            pending: Dict[str, Tuple[Dict[str, Any], List[Dict[str, Any]]]] = {}
+            for row in rows:
+                if row['job_id'] not in pending:
+                    job = self._to_dict(conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row['job_id'],)).fetchone())
+                    pending[row['job_id']] = (job, [])
+                pending[row['job_id']][1].append({
+                    'attempt': row['attempt'],
+                    'seq': row['seq'],
+                    'chunks': json.loads(row['chunks']),
+                    'duration': row['duration']
+                })
+        return list(pending.values())
+
+    def mark_chunks_indexed(self, job_id: str, attempt: int, seq: int):
+        """Record that a job's chunk batches up to (attempt, seq) are in the index; drop older attempts' batches."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET indexed_attempt = ?, indexed_seq = ? WHERE job_id = ?",
+                (attempt, seq, job_id)
+            )
+            conn.execute("DELETE FROM job_chunks WHERE job_id = ? AND attempt < ?", (job_id, attempt))
+
+    def partially_indexed(self) -> List[str]:
+        """IDs of failed or cancelled jobs whose streamed chunks are still in the index."""
+        with self._transaction(write=False) as conn:
+            rows = conn.execute(
+                "SELECT job_id FROM jobs WHERE state IN ('failed', 'cancelled') AND indexed_attempt > 0"
+            ).fetchall()
+        return [row['job_id'] for row in rows]
+
+    def clear_chunks(self, job_id: str):
+        """Forget a job's chunk batches and indexing progress (its chunks were removed from the index)."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET indexed_attempt = 0, indexed_seq = 0 WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM job_chunks WHERE job_id = ?", (job_id,))
+
+    def fail(self, job_id: str, error: str) -> str:
+        """
+        Record a failed attempt; retry with exponential backoff while attempts remain.
+
+        Returns:
+            The job's new state ('queued' or 'failed')
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            job = conn.execute("SELECT attempts, max_attempts, cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None:
+                return 'failed'
+            if job['cancel_requested']:
+                state, message, available_at = 'cancelled', "Cancelled", now
+            elif job['attempts'] < job['max_attempts']:
+                delay = self.retry_backoff_seconds * 2 ** (job['attempts'] - 1)
+                state, message, available_at = 'queued', f"Attempt {job['attempts']} failed; retrying in {delay:.0f}s", now + delay
+            else:
+                state, message, available_at = 'failed', f"Processing failed: {error}", now
+            conn.execute(
+                "UPDATE jobs SET state = ?, progress = 0, message = ?, error = ?, worker_id = NULL, "
+                "lease_expires_at = NULL, available_at = ?, updated_at = ? WHERE job_id = ?",
+                (state, message, error, available_at, now, job_id)
+            )
+        logger.warning(f"Job {job_id} attempt failed ({error}); now {state}")
+        return state
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a job.
+
+        Waiting jobs are cancelled immediately; running or indexing jobs are
+        flagged and cancelled by their worker at its next checkpoint.
+
+        Returns:
+            The job's state after the request, or None if the job does not exist
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            state = row['state']
+            if state in ('queued', 'transcribed'):
+                state = 'cancelled'
+                conn.execute(
+                    "UPDATE jobs SET state = 'cancelled', cancel_requested = 1, message = 'Cancelled', updated_at = ? WHERE job_id = ?",
+                    (now, job_id)
+                )
+            elif state in ('running', 'indexing'):
+                conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1, message = 'Cancelling...', updated_at = ? WHERE job_id = ?",
+                    (now, job_id)
+                )
+        logger.info(f"Cancellation requested for job {job_id} ({state})")
+        return state
+
+    def mark_cancelled(self, job_id: str):
+        """Acknowledge a cancellation request from the worker holding the job."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'cancelled', message = 'Cancelled', worker_id = NULL, "
+                "lease_expires_at = NULL, updated_at = ? WHERE job_id = ?",
+                (time.time(), job_id)
+            )
+
+    def release(self, job_id: str):
+        """Put a running job back in the queue without using up an attempt (worker shutting down)."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'queued', attempts = MAX(attempts - 1, 0), message = 'Queued for transcription', "
+                "worker_id = NULL, lease_expires_at = NULL, updated_at = ? WHERE job_id = ? AND state = 'running'",
+                (time.time(), job_id)
+            )
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        return job is None or job['cancel_requested']
+
+    def requeue_expired(self) -> int:
+        """
+        Hand back jobs whose worker stopped renewing its lease.
+
+        Running jobs return to the queue (or fail once out of attempts); jobs
+        being indexed return to 'transcribed' so their transcript is reused.
+
+        Returns:
+            Number of jobs released
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            expired = conn.execute(
+                "SELECT job_id, state, attempts, max_attempts, cancel_requested FROM jobs "
+                "WHERE state IN ('running', 'indexing') AND lease_expires_at < ?",
+                (now,)
+            ).fetchall()
+            for job in expired:
+                if job['cancel_requested']:
+                    state, message = 'cancelled', "Cancelled"
+                elif job['state'] == 'indexing':
+                    state, message = 'transcribed', "Indexing transcript chunks..."
+                elif job['attempts'] < job['max_attempts']:
+                    state, message = 'queued', "Worker stopped responding; re-queued"
+                else:
+                    state, message = 'failed', "Processing failed: worker stopped responding"
+                conn.execute(
+                    "UPDATE jobs SET state = ?, message = ?, worker_id = NULL, lease_expires_at = NULL, "
+                    "updated_at = ? WHERE job_id = ?",
+                    (state, message, now, job['job_id'])
+                )
+        if expired:
+            logger.warning(f"Released {len(expired)} jobs with expired leases")
+        return len(expired)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a job by ID."""
+        with self._transaction(write=False) as conn:
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+
+    def find_active(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """An unfinished job for an upload with this content hash (payload content_hash), if any."""
+        with self._transaction(write=False) as conn:
+            return self._find_active(conn, content_hash)
+
+    def _find_active(self, conn: sqlite3.Connection, content_hash: str) -> Optional[Dict[str, Any]]:
+        return self._to_dict(conn.execute(
+            "SELECT * FROM jobs WHERE json_extract(payload, '$.content_hash') = ? "
+            "AND state IN ('queued', 'running', 'transcribed', 'indexing') ORDER BY created_at LIMIT 1",
+            (content_hash,)
+        ).fetchone())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Number of jobs in each state."""
+        with self._transaction(write=False) as conn:
+            rows = conn.execute("SELECT state, COUNT(*) AS count FROM jobs GROUP BY state").fetchall()
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update({row['state']: row['count'] for row in rows})
+        return {'db_path': self.db_path, 'jobs': counts}
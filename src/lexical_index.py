@@ -0,0 +1,340 @@
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Lowercased runs of letters, digits and underscores: "useEffect" -> "useeffect",
+# "S3" -> "s3", "ERR_CONNECTION_REFUSED" stays one token
+TOKEN_PATTERN = re.compile(r"\w+")
+# Postings per block; each block keeps the bounds used to skip it
+BLOCK_SIZE = 128
+# Compact the postings once this fraction of them belongs to removed chunks
+COMPACT_DEAD_FRACTION = 0.25
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse ranked ID lists: each ID scores the sum of 1 / (rrf_k + rank) over the lists it appears in.
+
+    Args:
+        rankings: Chunk ID arrays, best first
+        k: Number of fused results
+        rrf_k: Damping constant (60 in the original RRF paper)
+
+    Returns:
+        (scores, chunk IDs) of the top k, best first
+    """
+    rankings = [np.asarray(ranking, dtype='int64') for ranking in rankings if len(ranking)]
+    if not rankings:
+        return np.zeros(0, dtype='float32'), np.zeros(0, dtype='int64')
+    ids = np.concatenate(rankings)
+    contributions = np.concatenate([1.0 / (rrf_k + 1 + np.arange(len(ranking))) for ranking in rankings])
+    unique, inverse = np.unique(ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions).astype('float32')
+    # Stable sort on -score keeps ties in ascending ID order
+    order = np.argsort(-scores, kind='stable')[:k]
+    return scores[order], unique[order]
+
+
+class _Postings:
+    """Chunk IDs (ascending) and term frequencies of one term, with per-block bounds."""
+    __slots__ = ('docs', 'tfs', 'pending_docs', 'pending_tfs', 'block_first', 'block_last', 'block_max_tf', 'block_min_len')
+
+    def __init__(self):
+        self.docs = np.zeros(0, dtype='int64')
+        self.tfs = np.zeros(0, dtype='float32')
+        self.pending_docs: List[int] = []
+        self.pending_tfs: List[int] = []
+        self.block_first = self.block_last = np.zeros(0, dtype='int64')
+        self.block_max_tf = self.block_min_len = np.zeros(0, dtype='float32')
+
+    def __len__(self) -> int:
+        return len(self.docs) + len(self.pending_docs)
+
+    def freeze(self, doc_len: np.ndarray):
+        """Move postings added since the last search into the arrays and recompute the block bounds."""
+        if not self.pending_docs:
+            return
+        self.docs = np.concatenate([self.docs, np.array(self.pending_docs, dtype='int64')])
+        self.tfs = np.concatenate([self.tfs, np.array(self.pending_tfs, dtype='float32')])
+        self.pending_docs, self.pending_tfs = [], []
+        self._compute_blocks(doc_len)
+
+    def keep(self, mask: np.ndarray, doc_len: np.ndarray):
+        """Drop postings whose mask entry is False."""
+        self.docs, self.tfs = self.docs[mask], self.tfs[mask]
+        self._compute_blocks(doc_len)
+
+    def _compute_blocks(self, doc_len: np.ndarray):
+        starts = np.arange(0, len(self.docs), BLOCK_SIZE)
+        self.block_first = self.docs[starts]
+        self.block_last = self.docs[np.minimum(starts + BLOCK_SIZE, len(self.docs)) - 1]
+        self.block_max_tf = np.maximum.reduceat(self.tfs, starts) if len(starts) else np.zeros(0, dtype='float32')
+        self.block_min_len = np.minimum.reduceat(doc_len[self.docs].astype('float32'), starts) if len(starts) else np.zeros(0, dtype='float32')
+
+
+class LexicalIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        In-memory BM25 inverted index over chunk texts, keyed by vector store chunk ID.
+
+        Each term's postings are NumPy arrays of ascending chunk IDs and term
+        frequencies, cut into blocks of BLOCK_SIZE that record their ID range,
+        highest frequency and shortest chunk. Those give an upper bound on
+        the BM25 score of any chunk in a block, which search uses to skip
+        blocks and candidates that cannot reach the top k (block-max MaxScore).
+        Removed chunks are masked out and compacted away once they make up
+        COMPACT_DEAD_FRACTION of the postings.
+
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization (0 = none, 1 = full)
+        """
+        self.k1 = k1
+        self.b = b
+        self.clear()
+
+    def clear(self):
+        """Drop every chunk."""
+        self._vocabulary: Dict[str, int] = {}
+        self._postings: List[_Postings] = []
+        self._df = np.zeros(0, dtype='int64')
+        # Per chunk ID: token count and whether the chunk is still indexed
+        self._doc_len = np.zeros(0, dtype='int32')
+        self._alive = np.zeros(0, dtype=bool)
+        self._num_docs = 0
+        self._total_len = 0
+        self._num_postings = 0
+        self._dead_postings = 0
+
+    def _ensure_capacity(self, max_id: int):
+        if max_id < len(self._alive):
+            return
+        capacity = max(1024, 2 * len(self._alive))
+        while capacity <= max_id:
+            capacity *= 2
+        self._doc_len = np.concatenate([self._doc_len, np.zeros(capacity - len(self._doc_len), dtype='int32')])
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+
+    def add(self, ids: np.ndarray, texts: List[str]):
+        """
+        Index chunk texts under their chunk IDs.
+
+        IDs must be larger than any indexed before (the vector store allocates
+        them that way), which keeps every posting list sorted by appending.
+        """
+        if not len(ids):
+            return
+        self._ensure_capacity(int(ids.max()))
+        new_terms = 0
+        for chunk_id, text in zip(ids.tolist(), texts):
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                term_id = self._vocabulary.get(term)
+                if term_id is None:
+                    term_id = self._vocabulary[term] = len(self._postings)
+                    self._postings.append(_Postings())
+                    new_terms += 1
+                postings = self._postings[term_id]
+                postings.pending_docs.append(chunk_id)
+                postings.pending_tfs.append(tf)
+            length = sum(counts.values())
+            self._doc_len[chunk_id] = length
+            self._alive[chunk_id] = True
+            self._total_len += length
+            self._num_postings += len(counts)
+        if new_terms:
+            self._df = np.concatenate([self._df, np.zeros(new_terms, dtype='int64')])
+        for text in texts:
+            for term in set(tokenize(text)):
+                self._df[self._vocabulary[term]] += 1
+        self._num_docs += len(ids)
+
+    def remove(self, ids: np.ndarray, texts: List[str]):
+        """Unindex chunks; texts are the chunks' texts (needed to update document frequencies)."""
+        for chunk_id, text in zip(np.asarray(ids).tolist(), texts):
+            if chunk_id >= len(self._alive) or not self._alive[chunk_id]:
+                continue
+            terms = set(tokenize(text))
+            for term in terms:
+                self._df[self._vocabulary[term]] -= 1
+            self._alive[chunk_id] = False
+            self._total_len -= int(self._doc_len[chunk_id])
+            self._num_docs -= 1
+            self._dead_postings += len(terms)
+        if self._dead_postings > COMPACT_DEAD_FRACTION * max(self._num_postings, 1):
+            self._compact()
+
+    def _compact(self):
+        for postings in self._postings:
+            postings.freeze(self._doc_len)
+            alive = self._alive[postings.docs]
+            if not alive.all():
+                postings.keep(alive, self._doc_len)
+        self._num_postings -= self._dead_postings
+        self._dead_postings = 0
+        logger.info(f"Compacted lexical index to {self._num_postings} postings")
+
+    def _block_bounds(self, postings: _Postings, idf: float, avg_len: float) -> np.ndarray:
+        """Upper bound of the BM25 contribution of each block (highest tf in the shortest chunk)."""
+        tf = postings.block_max_tf
+        norm = self.k1 * (1 - self.b + self.b * postings.block_min_len / avg_len)
+        return idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def _scores(self, tfs: np.ndarray, docs: np.ndarray, idf: float, avg_len: float) -> np.ndarray:
+        norm = self.k1 * (1 - self.b + self.b * self._doc_len[docs] / avg_len)
+        return (idf * tfs * (self.k1 + 1) / (tfs + norm)).astype('float32')
+
+    @staticmethod
+    def _lookup_bounds(postings: _Postings, bounds: np.ndarray, docs: np.ndarray) -> np.ndarray:
+        """Per doc, the bound of the block of postings whose ID range covers it (0 if none)."""
+        block = np.searchsorted(postings.block_last, docs)
+        inside = block < len(bounds)
+        inside[inside] = postings.block_first[block[inside]] <= docs[inside]
+        result = np.zeros(len(docs), dtype='float32')
+        result[inside] = bounds[block[inside]]
+        return result
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        subset: Optional[np.ndarray] = None,
+        min_score: Optional[float] = None,
+        prune: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k chunks by BM25 for a query.
+
+        Terms are visited from the highest score bound down. While the k-th
+        best score so far (theta) is below what a new chunk could still
+        collect, the current term's blocks that could lift a chunk past theta
+        are scored; blocks that cannot are skipped. Once theta exceeds that,
+        only existing candidates are scored on the remaining terms, and
+        candidates whose score plus the block bounds of the remaining terms
+        falls below theta are dropped.
+
+        Args:
+            query: Query text
+            k: Number of results
+            subset: Only return these chunk IDs
+            min_score: Drop results scoring below this
+            prune: False scores every posting of every query term (for benchmarking)
+
+        Returns:
+            (scores, chunk IDs), best first
+        """
+        empty = (np.zeros(0, dtype='float32'), np.zeros(0, dtype='int64'))
+        query_terms = Counter(term for term in tokenize(query) if term in self._vocabulary)
+        if not query_terms or self._num_docs == 0 or k <= 0:
+            return empty
+
+        allowed = self._alive
+        if subset is not None:
+            subset = np.asarray(subset, dtype='int64')
+            allowed = np.zeros_like(self._alive)
+            subset = subset[subset < len(allowed)]
+            allowed[subset] = self._alive[subset]
+
+        avg_len = self._total_len / self._num_docs
+        terms = []
+        for term, weight in query_terms.items():
+            term_id = self._vocabulary[term]
+            postings = self._postings[term_id]
+            postings.freeze(self._doc_len)
+            df = int(self._df[term_id])
+            if df <= 0 or not len(postings.docs):
+                continue
+            idf = weight * float(np.log(1 + (self._num_docs - df + 0.5) / (df + 0.5)))
+            bounds = self._block_bounds(postings, idf, avg_len)
+            terms.append((float(bounds.max()), idf, postings, bounds))
+        if not terms:
+            return empty
+        terms.sort(key=lambda term: -term[0])
+        # remaining[i]: most the terms after i can add to any chunk
+        remaining = np.concatenate([np.cumsum([term[0] for term in terms][::-1])[::-1][1:], [0.0]])
+
+        cand_docs = np.zeros(0, dtype='int64')
+        cand_scores = np.zeros(0, dtype='float32')
+        floor = min_score if min_score is not None else 0.0
+
+        def threshold() -> float:
+            if not prune or len(cand_scores) < k:
+                return floor
+            return max(floor, float(np.partition(cand_scores, len(cand_scores) - k)[len(cand_scores) - k]))
+
+        for position, (upper, idf, postings, bounds) in enumerate(terms):
+            rest = remaining[position]
+            theta = threshold()
+
+            # Existing candidates: exact lookup of this term's frequency
+            if len(cand_docs):
+                found = np.searchsorted(postings.docs, cand_docs)
+                found = np.minimum(found, len(postings.docs) - 1)
+                hit = postings.docs[found] == cand_docs
+                if hit.any():
+                    cand_scores[hit] += self._scores(postings.tfs[found[hit]], cand_docs[hit], idf, avg_len)
+
+            # New chunks: only from blocks that could still reach theta
+            if upper + rest >= theta:
+                live_blocks = np.flatnonzero(bounds + rest >= theta)
+                if len(live_blocks):
+                    index = (live_blocks[:, None] * BLOCK_SIZE + np.arange(BLOCK_SIZE)).ravel()
+                    index = index[index < len(postings.docs)]
+                    docs = postings.docs[index]
+                    keep = allowed[docs]
+                    if len(cand_docs):
+                        keep &= ~np.isin(docs, cand_docs, assume_unique=True)
+                    docs, index = docs[keep], index[keep]
+                    if len(docs):
+                        cand_docs = np.concatenate([cand_docs, docs])
+                        cand_scores = np.concatenate([cand_scores, self._scores(postings.tfs[index], docs, idf, avg_len)])
+
+            # Drop candidates that cannot reach theta even with every remaining term
+            theta = threshold()
+            if len(cand_docs) > k and theta > 0:
+                ceiling = cand_scores.copy()
+                for _, later_idf, later_postings, later_bounds in terms[position + 1:]:
+                    ceiling += self._lookup_bounds(later_postings, later_bounds, cand_docs)
+                keep = ceiling >= theta
+                cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+
+        if min_score is not None:
+            keep = cand_scores >= min_score
+            cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+        order = np.lexsort((cand_docs, -cand_scores))[:k]
+        return cand_scores[order], cand_docs[order]
+
+    def rebuild(self, ids: np.ndarray, texts: List[str]):
+        """Replace the contents with these chunks (e.g. after a snapshot restore)."""
+        self.clear()
+        order = np.argsort(ids, kind='stable')
+        self.add(np.asarray(ids, dtype='int64')[order], [texts[i] for i in order])
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the postings and per-chunk arrays."""
+        arrays = sum(
+            postings.docs.nbytes + postings.tfs.nbytes + 4 * postings.block_first.nbytes
+            + 16 * len(postings.pending_docs)
+            for postings in self._postings
+        )
+        return arrays + self._doc_len.nbytes + self._alive.nbytes + self._df.nbytes + 100 * len(self._vocabulary)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'chunks': self._num_docs,
+            'terms': len(self._vocabulary),
+            'postings': self._num_postings - self._dead_postings,
+            'removed_postings': self._dead_postings,
+            'avg_chunk_tokens': round(self._total_len / self._num_docs, 1) if self._num_docs else 0.0,
+            'k1': self.k1,
+            'b': self.b,
+            'memory_bytes': self.memory_bytes()
+        }
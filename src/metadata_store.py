@@ -0,0 +1,501 @@
+import os
+import json
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import numpy as np
+from .models import VideoTranscript, TranscriptChunk, VideoSummary, SearchFilter
+
+logger = logging.getLogger(__name__)
+
+# Per-chunk numeric columns. "video" is an ordinal into the video table.
+COLUMN_DTYPES = {
+    'id': 'int64',
+    'start_time': 'float64',
+    'end_time': 'float64',
+    'video': 'int32'
+}
+# Per-chunk variable-length values, stored as one byte arena plus int64 offsets each:
+# UTF-8 strings, and "segments" packed as SEGMENT_DTYPE records (empty if unknown)
+ARENA_COLUMNS = ('text', 'chunk_id', 'segments')
+# Whisper segment of a chunk: start time and character offset into the chunk text
+SEGMENT_DTYPE = np.dtype([('start', '<f4'), ('offset', '<i4')])
+# Per-video table, one entry per video ordinal. "runs" lists the [first_id, count]
+# ranges of consecutive chunk IDs a video occupies (one per add/append call).
+VIDEO_FIELDS = ('video_id', 'title', 'duration', 'created_at', 'tags', 'runs', 'chunk_count')
+
+VIDEOS_FILE = 'videos.json'
+
+
+def _gather_arena(arena: bytearray, offsets: np.ndarray, rows: np.ndarray) -> Tuple[bytes, np.ndarray]:
+    """Copy the byte ranges of the given rows into a new contiguous arena."""
+    starts = offsets[rows]
+    ends = offsets[rows + 1]
+    new_offsets = np.zeros(len(rows) + 1, dtype='int64')
+    np.cumsum(ends - starts, out=new_offsets[1:])
+    view = memoryview(arena)
+    try:
+        data = b''.join(view[start:end] for start, end in zip(starts.tolist(), ends.tolist()))
+    finally:
+        # A live export would stop the bytearray from growing
+        view.release()
+    return data, new_offsets
+
+
+def _encode_value(chunk: TranscriptChunk, column: str) -> bytes:
+    if column != 'segments':
+        return getattr(chunk, column).encode('utf-8')
+    if not chunk.segment_starts:
+        return b''
+    segments = np.zeros(len(chunk.segment_starts), dtype=SEGMENT_DTYPE)
+    segments['start'] = chunk.segment_starts
+    segments['offset'] = chunk.segment_offsets
+    return segments.tobytes()
+
+
+def _decode_value(value: bytearray, column: str):
+    if column != 'segments':
+        return value.decode('utf-8')
+    return np.frombuffer(value, dtype=SEGMENT_DTYPE)
+
+
+class ChunkMetadataStore:
+    def __init__(self, capacity: int = 1024):
+        """
+        Columnar metadata for indexed chunks, keyed by the vector store's chunk IDs.
+
+        Chunk rows live in NumPy columns (ID, start/end time, video ordinal)
+        and byte arenas (text, chunk_id, segments) with offsets, so there is no
+        Python object per chunk. Video titles are interned once in a title
+        table and referenced from a small per-video table. Rows are appended
+        in ID order, so an ID is found by binary search; removed rows are
+        compacted away once they outnumber the live ones.
+
+        Args:
+            capacity: Initial number of chunk rows to allocate
+        """
+        self._size = 0
+        self._dead = 0
+        self._columns: Dict[str, np.ndarray] = {}
+        self._offsets: Dict[str, np.ndarray] = {}
+        self._arenas: Dict[str, bytearray] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._capacity = 0
+        self._reset_tables()
+        self._allocate(capacity)
+
+    def _reset_tables(self):
+        self._arenas = {column: bytearray() for column in ARENA_COLUMNS}
+        # Video table indexed by ordinal; removed videos leave a None video_id until compaction
+        self._videos: Dict[str, list] = {field: [] for field in VIDEO_FIELDS}
+        self._video_ords: Dict[str, int] = {}
+        # Interned titles; the video table stores ordinals into this list
+        self._titles: List[str] = []
+        self._title_ords: Dict[str, int] = {}
+
+    def _allocate(self, capacity: int):
+        """Grow every column to hold capacity rows, keeping the rows in use."""
+        for column, dtype in COLUMN_DTYPES.items():
+            values = np.zeros(capacity, dtype=dtype)
+            if column in self._columns:
+                values[:self._size] = self._columns[column][:self._size]
+            self._columns[column] = values
+        for column in ARENA_COLUMNS:
+            offsets = np.zeros(capacity + 1, dtype='int64')
+            if column in self._offsets:
+                offsets[:self._size + 1] = self._offsets[column][:self._size + 1]
+            self._offsets[column] = offsets
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._alive = alive
+        self._capacity = capacity
+
+    def __len__(self) -> int:
+        """Number of live chunks."""
+        return self._size - self._dead
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self._video_ords
+
+    @property
+    def num_videos(self) -> int:
+        return len(self._video_ords)
+
+    def _intern_title(self, title: str) -> int:
+        ordinal = self._title_ords.get(title)
+        if ordinal is None:
+            ordinal = len(self._titles)
+            self._titles.append(title)
+            self._title_ords[title] = ordinal
+        return ordinal
+
+    def _rows(self, ids: np.ndarray) -> np.ndarray:
+        """Row positions of chunk IDs (IDs are stored sorted)."""
+        return np.searchsorted(self._columns['id'][:self._size], np.asarray(ids, dtype='int64'))
+
+    def _append_rows(self, chunks: List[TranscriptChunk], ids: np.ndarray, ordinal: int):
+        """Write chunk rows for a video ordinal at the end of the columns."""
+        ids = np.asarray(ids, dtype='int64')
+        if len(ids) != len(chunks):
+            raise ValueError("Number of IDs must match number of chunks")
+        if self._size and len(ids) and ids[0] <= self._columns['id'][self._size - 1]:
+            raise ValueError("Chunk IDs must be appended in increasing order")
+
+        count = len(ids)
+        if self._size + count > self._capacity:
+            self._allocate(max(self._size + count, 2 * self._capacity))
+
+        rows = slice(self._size, self._size + count)
+        self._columns['id'][rows] = ids
+        self._columns['start_time'][rows] = [chunk.start_time for chunk in chunks]
+        self._columns['end_time'][rows] = [chunk.end_time for chunk in chunks]
+        self._columns['video'][rows] = ordinal
+        self._alive[rows] = True
+        for column in ARENA_COLUMNS:
+            encoded = [_encode_value(chunk, column) for chunk in chunks]
+            arena = self._arenas[column]
+            offsets = self._offsets[column]
+            np.cumsum([len(value) for value in encoded], out=offsets[self._size + 1:self._size + count + 1])
+            offsets[self._size + 1:self._size + count + 1] += len(arena)
+            arena.extend(b''.join(encoded))
+        self._size += count
+
+        if count:
+            self._videos['runs'][ordinal].append([int(ids[0]), count])
+            self._videos['chunk_count'][ordinal] += count
+
+    def add_video(self, video: VideoTranscript, ids: np.ndarray):
+        """
+        Append a video's chunks under the IDs the vector store assigned them.
+
+        Args:
+            video: Video whose chunks were embedded (must not already be stored)
+            ids: Ascending chunk IDs, one per chunk, all greater than any stored ID
+        """
+        if video.video_id in self._video_ords:
+            raise ValueError(f"Video {video.video_id} is already stored")
+
+        ordinal = len(self._videos['video_id'])
+        self._videos['video_id'].append(video.video_id)
+        self._videos['title'].append(self._intern_title(video.title))
+        self._videos['duration'].append(video.duration)
+        self._videos['created_at'].append(video.created_at.isoformat() if video.created_at else None)
+        self._videos['tags'].append(list(video.tags))
+        self._videos['runs'].append([])
+        self._videos['chunk_count'].append(0)
+        self._video_ords[video.video_id] = ordinal
+        self._append_rows(video.chunks, ids, ordinal)
+
+    def append_chunks(self, video: VideoTranscript, ids: np.ndarray):
+        """
+        Add more chunks to a stored video (e.g. as a streaming transcription progresses).
+
+        The video's duration is raised to video.duration; other fields are kept.
+
+        Args:
+            video: Stored video carrying only the new chunks
+            ids: Ascending chunk IDs, one per new chunk, all greater than any stored ID
+        """
+        ordinal = self._video_ords.get(video.video_id)
+        if ordinal is None:
+            raise ValueError(f"Video {video.video_id} is not stored")
+        self._videos['duration'][ordinal] = max(self._videos['duration'][ordinal], video.duration)
+        self._append_rows(video.chunks, ids, ordinal)
+
+    def video_chunk_ids(self, video_id: str) -> np.ndarray:
+        """Chunk IDs held by a video (empty if it is not stored)."""
+        ordinal = self._video_ords.get(video_id)
+        if ordinal is None or not self._videos['chunk_count'][ordinal]:
+            return np.zeros(0, dtype='int64')
+        ids = self._columns['id']
+        runs = []
+        for first_id, count in self._videos['runs'][ordinal]:
+            row = int(self._rows([first_id])[0])
+            runs.append(ids[row:row + count])
+        return np.concatenate(runs)
+
+    def remove_video(self, video_id: str) -> np.ndarray:
+        """
+        Drop a video and its chunks.
+
+        Returns:
+            The chunk IDs that were removed (empty if the video was not stored)
+        """
+        ids = self.video_chunk_ids(video_id)
+        ordinal = self._video_ords.pop(video_id, None)
+        if ordinal is None:
+            return ids
+        self._videos['video_id'][ordinal] = None
+        if len(ids):
+            self._alive[self._rows(ids)] = False
+            self._dead += len(ids)
+        if self._dead > 1024 and self._dead > len(self):
+            self._load_state(self.export_state())
+            logger.info(f"Compacted chunk metadata to {len(self)} rows")
+        return ids
+
+    def gather(self, ids: np.ndarray) -> Dict[str, Any]:
+        """
+        Look up metadata for chunk IDs with vectorized column gathers.
+
+        Args:
+            ids: Chunk IDs (e.g. top-k search hits), all live
+
+        Returns:
+            Dict of columns in input order: video_id, video_title, chunk_id and
+            text as lists, segments as a list of SEGMENT_DTYPE arrays, start_time
+            and end_time as float64 arrays
+        """
+        rows = self._rows(ids)
+        ordinals = self._columns['video'][rows].tolist()
+        columns = {
+            'video_id': [self._videos['video_id'][o] for o in ordinals],
+            'video_title': [self._titles[self._videos['title'][o]] for o in ordinals],
+            'start_time': self._columns['start_time'][rows],
+            'end_time': self._columns['end_time'][rows]
+        }
+        for column in ARENA_COLUMNS:
+            arena = self._arenas[column]
+            offsets = self._offsets[column]
+            columns[column] = [
+                _decode_value(arena[start:end], column)
+                for start, end in zip(offsets[rows].tolist(), offsets[rows + 1].tolist())
+            ]
+        return columns
+
+    def spans(self, ids: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Video and time span of chunk IDs, without decoding any text.
+
+        Args:
+            ids: Chunk IDs, all live
+
+        Returns:
+            Dict of arrays in input order: video (ordinal, equal for chunks of
+            the same video), start_time and end_time
+        """
+        rows = self._rows(ids)
+        return {
+            'video': self._columns['video'][rows],
+            'start_time': self._columns['start_time'][rows],
+            'end_time': self._columns['end_time'][rows]
+        }
+
+    def match(self, search_filter: SearchFilter) -> np.ndarray:
+        """
+        Chunk IDs of live chunks passing a search filter.
+
+        Video-level conditions (IDs, title prefix, tags) are checked once per
+        video and broadcast to chunks through the video ordinal column; time
+        bounds are vectorized comparisons over the start/end columns.
+
+        Args:
+            search_filter: Conditions to apply; unset fields match everything
+
+        Returns:
+            Ascending chunk IDs
+        """
+        video_ids = set(search_filter.video_ids) if search_filter.video_ids is not None else None
+        prefix = search_filter.title_prefix
+        tags = set(search_filter.tags or [])
+        video_mask = np.fromiter(
+            (
+                video_id is not None
+                and (video_ids is None or video_id in video_ids)
+                and (prefix is None or self._titles[title].startswith(prefix))
+                and tags.issubset(video_tags)
+                for video_id, title, video_tags in zip(
+                    self._videos['video_id'], self._videos['title'], self._videos['tags']
+                )
+            ),
+            dtype=bool,
+            count=len(self._videos['video_id'])
+        )
+
+        size = self._size
+        mask = self._alive[:size].copy()
+        if len(video_mask):
+            mask &= video_mask[self._columns['video'][:size]]
+        if search_filter.start_time is not None:
+            mask &= self._columns['end_time'][:size] > search_filter.start_time
+        if search_filter.end_time is not None:
+            mask &= self._columns['start_time'][:size] < search_filter.end_time
+        return self._columns['id'][:size][mask]
+
+    def get_summary(self, video_id: str) -> Optional[VideoSummary]:
+        """Title, duration and chunk count of a stored video."""
+        ordinal = self._video_ords.get(video_id)
+        if ordinal is None:
+            return None
+        return VideoSummary(
+            video_id=video_id,
+            title=self._titles[self._videos['title'][ordinal]],
+            duration=self._videos['duration'][ordinal],
+            chunk_count=self._videos['chunk_count'][ordinal],
+            created_at=self._videos['created_at'][ordinal],
+            tags=self._videos['tags'][ordinal]
+        )
+
+    def list_videos(self) -> List[VideoSummary]:
+        """Summaries of all stored videos, in indexing order."""
+        return [self.get_summary(video_id) for video_id in self._video_ords]
+
+    def get_video(self, video_id: str) -> Optional[VideoTranscript]:
+        """Rebuild a stored video's full transcript from the columns."""
+        summary = self.get_summary(video_id)
+        if summary is None:
+            return None
+        columns = self.gather(self.video_chunk_ids(video_id))
+        chunks = [
+            TranscriptChunk(
+                text=text,
+                start_time=start,
+                end_time=end,
+                chunk_id=chunk_id,
+                segment_starts=segments['start'].astype('float64').round(2).tolist() if len(segments) else None,
+                segment_offsets=segments['offset'].tolist() if len(segments) else None
+            )
+            for text, start, end, chunk_id, segments in zip(
+                columns['text'], columns['start_time'].tolist(), columns['end_time'].tolist(),
+                columns['chunk_id'], columns['segments']
+            )
+        ]
+        return VideoTranscript(
+            video_id=video_id,
+            title=summary.title,
+            duration=summary.duration,
+            chunks=chunks,
+            created_at=summary.created_at,
+            tags=summary.tags
+        )
+
+    def clear(self):
+        """Drop every chunk and video."""
+        self._size = 0
+        self._dead = 0
+        self._reset_tables()
+        self._alive[:] = False
+
+    def export_state(self) -> Dict[str, Any]:
+        """
+        Copy the live rows into compact columns (removed rows and videos dropped).
+
+        This is memcpy-bound apart from the arenas, which are copied one
+        row range at a time only when rows have been removed.
+        """
+        rows = np.flatnonzero(self._alive[:self._size])
+        live_ords = [o for o, video_id in enumerate(self._videos['video_id']) if video_id is not None]
+        video_map = np.full(len(self._videos['video_id']), -1, dtype='int32')
+        video_map[live_ords] = np.arange(len(live_ords), dtype='int32')
+
+        columns = {column: self._columns[column][rows] for column in COLUMN_DTYPES}
+        columns['video'] = video_map[columns['video']]
+        arenas = {}
+        for column in ARENA_COLUMNS:
+            if self._dead:
+                arenas[column] = _gather_arena(self._arenas[column], self._offsets[column], rows)
+            else:
+                arenas[column] = (bytes(self._arenas[column]), self._offsets[column][:self._size + 1].copy())
+
+        videos = {field: [self._videos[field][o] for o in live_ords] for field in VIDEO_FIELDS}
+        # Runs keep growing in place as chunks are appended; copy them
+        videos['runs'] = [[list(run) for run in runs] for runs in videos['runs']]
+        titles = []
+        title_map = {}
+        for position, ordinal in enumerate(videos['title']):
+            if ordinal not in title_map:
+                title_map[ordinal] = len(titles)
+                titles.append(self._titles[ordinal])
+            videos['title'][position] = title_map[ordinal]
+
+        return {'columns': columns, 'arenas': arenas, 'videos': videos, 'titles': titles}
+
+    def _load_state(self, state: Dict[str, Any]):
+        """Replace the contents with an export_state() capture."""
+        size = len(state['columns']['id'])
+        self._size = 0
+        self._dead = 0
+        self._columns = {}
+        self._offsets = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._allocate(max(1024, 2 * size))
+        for column in COLUMN_DTYPES:
+            self._columns[column][:size] = state['columns'][column]
+        self._alive[:size] = True
+        self._reset_tables()
+        for column in ARENA_COLUMNS:
+            data, offsets = state['arenas'][column]
+            self._arenas[column] = bytearray(data)
+            self._offsets[column][:size + 1] = offsets
+        videos = dict(state['videos'])
+        # Video tables saved before tags / runs existed
+        videos.setdefault('tags', [[] for _ in videos['video_id']])
+        if 'runs' not in videos:
+            videos['runs'] = [[[first_id, count]] if count else [] for first_id, count in zip(videos['first_id'], videos['chunk_count'])]
+        self._videos = {field: list(videos[field]) for field in VIDEO_FIELDS}
+        self._video_ords = {video_id: o for o, video_id in enumerate(self._videos['video_id'])}
+        self._titles = list(state['titles'])
+        self._title_ords = {title: o for o, title in enumerate(self._titles)}
+        self._size = size
+
+    def save(self, directory: str, state: Optional[Dict[str, Any]] = None):
+        """
+        Write the columns as .npy files (arenas as uint8 arrays) plus a JSON video table.
+
+        Args:
+            directory: Existing directory to write into
+            state: Output of export_state(); captured now if omitted
+        """
+        state = state if state is not None else self.export_state()
+        for column, values in state['columns'].items():
+            np.save(os.path.join(directory, f"meta_{column}.npy"), values)
+        for column, (data, offsets) in state['arenas'].items():
+            np.save(os.path.join(directory, f"meta_{column}.offsets.npy"), offsets)
+            np.save(os.path.join(directory, f"meta_{column}.bytes.npy"), np.frombuffer(data, dtype='uint8'))
+        with open(os.path.join(directory, VIDEOS_FILE), 'w') as f:
+            json.dump({'titles': state['titles'], 'videos': state['videos']}, f)
+
+    def load(self, directory: str):
+        """Load columns written by save()."""
+        with open(os.path.join(directory, VIDEOS_FILE), 'r') as f:
+            tables = json.load(f)
+        columns = {
+            column: np.load(os.path.join(directory, f"meta_{column}.npy"))
+            for column in COLUMN_DTYPES
+        }
+        arenas = {}
+        for column in ARENA_COLUMNS:
+            offsets_path = os.path.join(directory, f"meta_{column}.offsets.npy")
+            if not os.path.exists(offsets_path):
+                # Snapshots written before the column existed: every value empty
+                arenas[column] = (b'', np.zeros(len(columns['id']) + 1, dtype='int64'))
+                continue
+            arenas[column] = (
+                np.load(os.path.join(directory, f"meta_{column}.bytes.npy")).tobytes(),
+                np.load(offsets_path)
+            )
+        state = {
+            'columns': columns,
+            'arenas': arenas,
+            'videos': tables['videos'],
+            'titles': tables['titles']
+        }
+        self._load_state(state)
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the columns and arenas."""
+        return (
+            sum(values.nbytes for values in self._columns.values())
+            + sum(offsets.nbytes for offsets in self._offsets.values())
+            + sum(len(arena) for arena in self._arenas.values())
+            + self._alive.nbytes
+            + sum(len(title) for title in self._titles)
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'chunks': len(self),
+            'videos': self.num_videos,
+            'titles': len(self._titles),
+            'removed_rows': self._dead,
+            'memory_bytes': self.memory_bytes()
+        }
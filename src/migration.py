@@ -0,0 +1,371 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import logging
+from .models import VideoTranscript, SearchQuery, SearchResponse
+from .search_engine import VideoSearchEngine
+from .embedding_cache import PersistentEmbeddingCache
+from .search_batcher import Histogram
+from .reindex import ReindexPool, ReindexCancelled
+
+logger = logging.getLogger(__name__)
+
+# Chunks embedded per step when the shadow is built in this process
+BUILD_BATCH_CHUNKS = 2048
+# Sampled shadow comparisons allowed to wait; more are dropped rather than queued
+MAX_PENDING_COMPARISONS = 8
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 1000]
+OVERLAP_BUCKETS = [0.0, 0.2, 0.4, 0.6, 0.8, 0.9, 0.99]
+
+
+class ModelMigration:
+    def __init__(
+        self,
+        live: VideoSearchEngine,
+        model_name: str,
+        embedding_params: Optional[Dict[str, Any]] = None,
+        num_workers: int = 0,
+        shadow_sample_rate: float = 0.0,
+        checkpoint_dir: str = 'data/reindex'
+    ):
+        """
+        Build an index for another embedding model next to the live one, then swap it in.
+
+        A shadow VideoSearchEngine with the new model and the live index
+        settings is filled in a background thread while the live engine keeps
+        serving. Mutations made meanwhile are queued by the live engine and
+        replayed on the shadow in order, so it is complete when cutover()
+        swaps it in under the live engine's lock. Once the shadow has caught
+        up, a sample of live searches is also run against it to compare
+        latency and result overlap before deciding to cut over.
+
+        Args:
+            live: Engine currently serving
+            model_name: sentence-transformers model to migrate to
+            embedding_params: EmbeddingManager options for the new model (backend, onnx_dir, quantize, ...)
+            num_workers: Embed in this many worker processes (src/reindex.py); 0 embeds in this process
+            shadow_sample_rate: Fraction of searches also run against the shadow once it is ready
+            checkpoint_dir: Checkpoint directory for the worker processes
+        """
+        self.live = live
+        self.from_model = live.embedding_manager.model_id
+        self.model_name = model_name
+        self.embedding_params = dict(embedding_params or {})
+        self.num_workers = num_workers
+        self.shadow_sample_rate = shadow_sample_rate
+        self.checkpoint_dir = checkpoint_dir
+
+        store = live.vector_store
+        cache = live.embedding_cache
+        embedding_cache = live.chunk_embedding_cache
+        segment_cache = live.segment_embedding_cache
+        # Same index and cache settings as the live engine; only the model differs
+        self.shadow = VideoSearchEngine(
+            model_name=model_name,
+            index_type=store.index_type,
+            metric=store.metric,
+            index_params={
+                'nlist': store.nlist,
+                'pq_m': store.pq_m,
+                'hnsw_m': store.hnsw_m,
+                'nprobe': store.nprobe,
+                'ef_search': store.ef_search,
+                'train_size': store.train_size,
+                'storage': store.storage,
+                'refine_factor': store.refine_factor,
+                # The live index keeps its file until cutover, so the shadow writes its own
+                'refine_path': os.path.join(
+                    os.path.dirname(store.refine_path), f"vectors-{int(time.time())}.f32"
+                ) if store.refine_path is not None else None
+            },
+            cache_params={'max_entries': cache.max_entries, 'max_bytes': cache.max_bytes, 'ttl_seconds': cache.ttl_seconds},
+            embedding_params=self.embedding_params,
+            lexical_params={'k1': live.lexical.k1, 'b': live.lexical.b} if live.lexical is not None else None
+        )
+        # The on-disk embedding caches are attached afterwards: the shadow's model ID is only
+        # known once its EmbeddingManager exists, and a second instance over the same files
+        # would hand out slots the live engine already uses
+        self.shadow.chunk_embedding_cache = self._shadow_cache(embedding_cache)
+        self.shadow.segment_embedding_cache = self._shadow_cache(segment_cache)
+        # Re-ranking does not depend on the embedding model; share the loaded cross-encoder
+        self.shadow.reranker = live.reranker
+
+        self.state = 'building'
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.progress: Dict[str, Any] = {}
+        self._pool: Optional[ReindexPool] = None
+        self._cancelled = threading.Event()
+
+        # Mutations made on the live engine since the build started, applied to the shadow in order
+        self._ops: deque = deque()
+        self._ops_ready = threading.Event()
+        self._apply_lock = threading.Lock()
+        self.mirrored_ops = 0
+
+        self._comparisons = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-search")
+        self._pending_comparisons = 0
+        self._stats_lock = threading.Lock()
+        self.shadow_samples = 0
+        self.shadow_dropped = 0
+        self.shadow_errors = 0
+        self.top1_agreements = 0
+        self.live_latency = Histogram(LATENCY_BUCKETS_MS)
+        self.shadow_latency = Histogram(LATENCY_BUCKETS_MS)
+        self.overlap = Histogram(OVERLAP_BUCKETS)
+
+        self._thread: Optional[threading.Thread] = None
+        # Index replaced at cutover; its exact-vector file goes once the new index is snapshotted
+        self._replaced_store = None
+
+    def _shadow_cache(self, cache: Optional[PersistentEmbeddingCache]) -> Optional[PersistentEmbeddingCache]:
+        """Share a live embedding cache with the shadow when both models key it the same way, else open the new model's."""
+        if cache is None:
+            return None
+        live_manager, shadow_manager = self.live.embedding_manager, self.shadow.embedding_manager
+        if shadow_manager.model_id == live_manager.model_id and shadow_manager.normalize == live_manager.normalize:
+            # Same slug, e.g. a backend-only migration: the cached vectors are still valid
+            return cache
+        return PersistentEmbeddingCache(
+            directory=os.path.dirname(cache.directory),
+            model_name=shadow_manager.model_id,
+            dimension=shadow_manager.get_embedding_dimension(),
+            normalize=shadow_manager.normalize,
+            max_entries=cache.max_entries,
+            dtype=cache.dtype
+        )
+
+    def start(self):
+        """Capture the live corpus, attach to the live engine and start building in the background."""
+        with self.live._lock:
+            if self.live.migration is not None:
+                raise RuntimeError("A model migration is already running")
+            videos = [self.live.metadata.get_video(summary.video_id) for summary in self.live.metadata.list_videos()]
+            # From here on every live mutation is also recorded for the shadow
+            self.live.migration = self
+        self._thread = threading.Thread(target=self._run, args=(videos,), name="model-migration", daemon=True)
+        self._thread.start()
+        logger.info(f"Started migration of {len(videos)} videos to {self.shadow.embedding_manager.model_id}")
+
+    def record(self, op: str, value: Any):
+        """Queue a mutation the live engine just applied. Called with the live engine's lock held."""
+        self._ops.append((op, value))
+        self._ops_ready.set()
+
+    def _apply_ops(self):
+        """Apply queued live mutations to the shadow, oldest first. Call with _apply_lock held."""
+        while self._ops:
+            op, value = self._ops.popleft()
+            if op == 'index':
+                self.shadow.index_video(value)
+            elif op == 'append':
+                self.shadow.append_video_chunks(value)
+            elif op == 'delete':
+                self.shadow.delete_video(value)
+            elif op == 'clear':
+                self.shadow.clear_index()
+            self.mirrored_ops += 1
+
+    def _build(self, videos: List[VideoTranscript]):
+        """Embed and index the captured corpus into the shadow."""
+        total_chunks = sum(len(video.chunks) for video in videos)
+        if self.num_workers > 0:
+            self._pool = ReindexPool(
+                self.shadow.embedding_manager,
+                embedding_params=self.embedding_params,
+                num_workers=self.num_workers,
+                checkpoint_dir=self.checkpoint_dir
+            )
+            self._pool.run(
+                videos,
+                on_video=lambda video, embeddings: self.shadow.index_video(video, embeddings),
+                progress_callback=self.progress.update
+            )
+            self._pool.remove_checkpoint()
+            return
+
+        self.progress.update({'total_videos': len(videos), 'indexed_videos': 0, 'total_chunks': total_chunks, 'embedded_chunks': 0})
+        batch: List[VideoTranscript] = []
+        for position, video in enumerate(videos):
+            batch.append(video)
+            if sum(len(v.chunks) for v in batch) < BUILD_BATCH_CHUNKS and position < len(videos) - 1:
+                continue
+            if self._cancelled.is_set():
+                raise ReindexCancelled("Migration cancelled")
+            self.shadow.index_videos(batch)
+            self.progress['indexed_videos'] += len(batch)
+            self.progress['embedded_chunks'] += sum(len(v.chunks) for v in batch)
+            self.progress['percent'] = round(100.0 * self.progress['embedded_chunks'] / max(total_chunks, 1), 1)
+            batch = []
+
+    def _run(self, videos: List[VideoTranscript]):
+        try:
+            self._build(videos)
+            with self._apply_lock:
+                if self._cancelled.is_set():
+                    return
+                self.state = 'catching_up'
+                self._apply_ops()
+                self.state = 'ready'
+            logger.info(f"Shadow index for {self.shadow.embedding_manager.model_id} is ready "
+                        f"({self.shadow.vector_store.ntotal} chunks, {self.mirrored_ops} mirrored changes)")
+            # Keep up with live writes until cutover or cancel
+            while not self._cancelled.is_set() and self.state == 'ready':
+                if self._ops_ready.wait(timeout=1.0):
+                    self._ops_ready.clear()
+                    with self._apply_lock:
+                        if self.state == 'ready':
+                            self._apply_ops()
+        except ReindexCancelled:
+            pass
+        except Exception as e:
+            logger.error(f"Model migration to {self.model_name} failed: {e}")
+            self.error = str(e)
+            self.state = 'failed'
+            self._detach()
+        finally:
+            # Only this thread writes to the shadow, so its files can go once it stops
+            if self._cancelled.is_set() or self.state == 'failed':
+                self._remove_shadow_files()
+
+    def _remove_shadow_files(self):
+        try:
+            self.shadow.vector_store.remove_refine_file()
+        except OSError as e:
+            logger.warning(f"Could not remove the shadow index files: {e}")
+
+    def _detach(self):
+        with self.live._lock:
+            if self.live.migration is self:
+                self.live.migration = None
+        self._comparisons.shutdown(wait=False)
+        self.finished_at = time.time()
+
+    def cutover(self):
+        """
+        Make the shadow the live index.
+
+        Under the live engine's lock, the remaining queued mutations are
+        applied to the shadow and the live engine adopts its model, index and
+        metadata, so no search or write ever sees a half-switched engine.
+        """
+        if self.state != 'ready':
+            raise RuntimeError(f"Migration is {self.state}, not ready for cutover")
+        with self.live._lock:
+            with self._apply_lock:
+                self._apply_ops()
+                self.live.migration = None
+                replaced_store = self.live.vector_store
+                self.live.adopt(self.shadow)
+                if replaced_store.refine_path != self.shadow.vector_store.refine_path:
+                    self._replaced_store = replaced_store
+                self.state = 'completed'
+        self._ops_ready.set()
+        self._comparisons.shutdown(wait=False)
+        self.finished_at = time.time()
+        logger.info(f"Cut over to {self.shadow.embedding_manager.model_id} "
+                    f"after {self.finished_at - self.started_at:.1f}s")
+
+    def remove_replaced_files(self):
+        """
+        Delete the exact-vector file of the index replaced at cutover.
+
+        Call only after a snapshot of the new index is on disk: until then the
+        last snapshot still points at the old file.
+        """
+        if self._replaced_store is None:
+            return
+        try:
+            self._replaced_store.remove_refine_file()
+        except OSError as e:
+            logger.warning(f"Could not remove the replaced index files: {e}")
+        self._replaced_store = None
+
+    def cancel(self):
+        """Abandon the migration; the live engine is untouched."""
+        if self.state in ('completed', 'cancelled', 'failed'):
+            return
+        self._cancelled.set()
+        if self._pool is not None:
+            self._pool.cancel()
+        self.state = 'cancelled'
+        self._detach()
+        logger.info(f"Cancelled migration to {self.model_name}")
+
+    def observe(self, queries: List[SearchQuery], responses: List[SearchResponse]):
+        """Maybe run a sample of just-served live searches against the shadow (in the background)."""
+        if self.state != 'ready' or self.shadow_sample_rate <= 0:
+            return
+        sampled = [position for position in range(len(queries)) if random.random() < self.shadow_sample_rate]
+        if not sampled:
+            return
+        with self._stats_lock:
+            if self._pending_comparisons >= MAX_PENDING_COMPARISONS:
+                self.shadow_dropped += len(sampled)
+                return
+            self._pending_comparisons += 1
+        try:
+            self._comparisons.submit(self._compare, [queries[p] for p in sampled], [responses[p] for p in sampled])
+        except RuntimeError:
+            # Executor shut down by a cutover or cancel
+            with self._stats_lock:
+                self._pending_comparisons -= 1
+
+    @staticmethod
+    def _result_keys(response: SearchResponse) -> List[tuple]:
+        return [(result.video_id, result.timestamp) for result in response.results]
+
+    def _compare(self, queries: List[SearchQuery], live_responses: List[SearchResponse]):
+        try:
+            shadow_responses = self.shadow.search_many(queries)
+        except Exception as e:
+            logger.warning(f"Shadow search failed: {e}")
+            with self._stats_lock:
+                self._pending_comparisons -= 1
+                self.shadow_errors += len(queries)
+            return
+        with self._stats_lock:
+            self._pending_comparisons -= 1
+            for live_response, shadow_response in zip(live_responses, shadow_responses):
+                live_keys = self._result_keys(live_response)
+                shadow_keys = self._result_keys(shadow_response)
+                if live_keys or shadow_keys:
+                    self.overlap.observe(len(set(live_keys) & set(shadow_keys)) / max(len(live_keys), len(shadow_keys)))
+                if live_keys[:1] == shadow_keys[:1]:
+                    self.top1_agreements += 1
+                self.live_latency.observe(live_response.processing_time_ms)
+                self.shadow_latency.observe(shadow_response.processing_time_ms)
+                self.shadow_samples += 1
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            shadow = {
+                'sample_rate': self.shadow_sample_rate,
+                'samples': self.shadow_samples,
+                'dropped': self.shadow_dropped,
+                'errors': self.shadow_errors,
+                'overlap_at_k': self.overlap.snapshot(),
+                'top1_agreement': round(self.top1_agreements / self.shadow_samples, 4) if self.shadow_samples else None,
+                'live_latency_ms': self.live_latency.snapshot(),
+                'shadow_latency_ms': self.shadow_latency.snapshot()
+            }
+        return {
+            'state': self.state,
+            'from_model': self.from_model,
+            'to_model': self.shadow.embedding_manager.model_id,
+            'workers': self.num_workers,
+            'progress': dict(self.progress),
+            'mirrored_changes': self.mirrored_ops,
+            'queued_changes': len(self._ops),
+            'shadow_videos': self.shadow.metadata.num_videos,
+            'shadow_chunks': self.shadow.vector_store.ntotal,
+            'error': self.error,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'shadow': shadow
+        }
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 
 
@@ -8,6 +8,9 @@ class TranscriptChunk(BaseModel):
     start_time: float  # in seconds
     end_time: float
     chunk_id: str
+    # Whisper segments merged into the chunk: start time and character offset into text of each
+    segment_starts: Optional[List[float]] = None
+    segment_offsets: Optional[List[int]] = None
     
 
 class VideoTranscript(BaseModel):
@@ -16,11 +19,41 @@ class VideoTranscript(BaseModel):
     duration: float  # total duration in seconds
     chunks: List[TranscriptChunk]
     created_at: Optional[datetime] = None
+    tags: List[str] = []
+
+
+class VideoSummary(BaseModel):
+    video_id: str
+    title: str
+    duration: float
+    chunk_count: int
+    created_at: Optional[datetime] = None
+    tags: List[str] = []
+
+
+class SearchFilter(BaseModel):
+    video_ids: Optional[List[str]] = None  # only chunks of these videos
+    title_prefix: Optional[str] = None  # only videos whose title starts with this
+    start_time: Optional[float] = None  # only chunks ending after this (seconds)
+    end_time: Optional[float] = None  # only chunks starting before this (seconds)
+    tags: Optional[List[str]] = None  # only videos carrying all of these tags
 
 
 class SearchQuery(BaseModel):
     query: str
     top_k: Optional[int] = 5
+    nprobe: Optional[int] = None  # IVF lists to visit (ivf_flat / ivf_pq indexes)
+    ef_search: Optional[int] = None  # HNSW search queue size (hnsw index)
+    min_score: Optional[float] = None  # drop results with relevance_score below this
+    filters: Optional[SearchFilter] = None  # restrict the search to matching chunks
+    mode: Literal['dense', 'lexical', 'hybrid'] = 'dense'  # embedding similarity, BM25, or both fused by rank
+    rerank: bool = False  # re-score the first-stage candidates with the cross-encoder
+    rerank_candidates: Optional[int] = None  # first-stage results to re-score (server default if unset)
+    rerank_budget_ms: Optional[float] = None  # keep the first-stage order if re-scoring takes longer
+    group_by_video: bool = False  # at most one result per video (same as max_per_video=1)
+    max_per_video: Optional[int] = None  # at most this many results from any one video
+    mmr_lambda: Optional[float] = None  # diversify with MMR: 1 ranks by relevance only, 0 by novelty only
+    merge_adjacent: bool = False  # merge touching or overlapping hits of a video into one result
 
 
 class SearchResult(BaseModel):
@@ -30,9 +63,30 @@ class SearchResult(BaseModel):
     end_time: float
     matched_text: str
     relevance_score: float
+    chunk_start_time: Optional[float] = None  # start of the matched chunk(s) when timestamp points inside them
+    merged_chunks: int = 1  # chunks covered by this result (merge_adjacent)
     
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
     query: str
-    processing_time_ms: float
\ No newline at end of file
+    processing_time_ms: float
+    stage_timings_ms: Optional[Dict[str, float]] = None  # cache lookup, encode, retrieve, rerank
+    reranked: bool = False  # False when re-ranking was not requested or ran out of budget
+
+
+class BatchSearchQuery(BaseModel):
+    queries: List[SearchQuery]
+
+
+class BatchSearchResponse(BaseModel):
+    responses: List[SearchResponse]
+    processing_time_ms: float
+
+
+class MigrationRequest(BaseModel):
+    model: str  # sentence-transformers model to migrate to
+    backend: Optional[str] = None  # embedding backend for the new model (default: the server's)
+    quantize: Optional[bool] = None  # INT8 model with the onnx backend (default: the server's)
+    workers: int = 0  # embedding processes for the build; 0 embeds in the server process
+    shadow_sample_rate: float = 0.0  # fraction of searches also run on the new index once it is built
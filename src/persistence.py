@@ -0,0 +1,302 @@
+import os
+import json
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+import logging
+from .models import VideoTranscript
+from .metadata_store import ChunkMetadataStore
+from .index_wal import WriteAheadLog, read_log, fsync_dir
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 2
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+
+
+class IncompatibleSnapshotError(RuntimeError):
+    """The latest snapshot was built for another engine configuration; it is left untouched."""
+
+
+def current_snapshot_dir(data_dir: str) -> Optional[str]:
+    """Directory of the snapshot CURRENT points at, or None."""
+    pointer = os.path.join(data_dir, CURRENT_FILE)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, 'r') as f:
+        name = f.read().strip()
+    path = os.path.join(data_dir, name)
+    return path if os.path.isdir(path) else None
+
+
+def _fsync_tree(path: str):
+    """fsync every file under a directory, then the directories themselves."""
+    for root, _, files in os.walk(path, topdown=False):
+        for name in files:
+            with open(os.path.join(root, name), 'rb') as f:
+                os.fsync(f.fileno())
+        fsync_dir(root)
+
+
+def snapshot_signature(data_dir: str) -> Optional[dict]:
+    """Engine signature (model, dimension, metric, index) the latest snapshot was built with, or None."""
+    snapshot_dir = current_snapshot_dir(data_dir)
+    if snapshot_dir is None:
+        return None
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE), 'r') as f:
+        return json.load(f).get('signature')
+
+
+def load_videos(data_dir: str, wal_path: Optional[str] = None) -> List[VideoTranscript]:
+    """
+    Transcripts of every video in a persisted index, without loading its model or FAISS index.
+
+    Reads the latest snapshot's metadata and folds the write-ahead log on
+    top, so the result matches what the server would restore. Safe to run
+    while the server is writing to the same directory.
+
+    Args:
+        data_dir: Snapshot directory (INDEX_DATA_DIR)
+        wal_path: Write-ahead log to fold in, if any
+
+    Returns:
+        Videos in indexing order
+    """
+    videos = {}
+    wal_seq = 0
+    snapshot_dir = current_snapshot_dir(data_dir)
+    if snapshot_dir is not None:
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE), 'r') as f:
+            wal_seq = json.load(f).get('wal_seq', 0)
+        metadata = ChunkMetadataStore()
+        metadata.load(snapshot_dir)
+        videos = {summary.video_id: metadata.get_video(summary.video_id) for summary in metadata.list_videos()}
+
+    if wal_path is not None:
+        for _, op, payload, _ in read_log(wal_path, after_seq=wal_seq):
+            if op in ('index', 'append'):
+                video = VideoTranscript.model_validate(payload['video'])
+                if op == 'append' and video.video_id in videos:
+                    videos[video.video_id].chunks.extend(video.chunks)
+                else:
+                    videos.pop(video.video_id, None)
+                    videos[video.video_id] = video
+            elif op == 'delete':
+                videos.pop(payload['video_id'], None)
+            elif op == 'clear':
+                videos.clear()
+    return list(videos.values())
+
+
+class IndexSnapshotter:
+    def __init__(
+        self,
+        search_engine,
+        data_dir: str,
+        interval_seconds: float = 30.0,
+        mmap: bool = False,
+        wal: Optional[WriteAheadLog] = None,
+        compact_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        Periodically snapshot the search engine's index, metadata and videos to disk.
+
+        Each snapshot is written to its own snapshot-<generation> directory and
+        published by atomically replacing the CURRENT pointer file, so a crash
+        mid-write never leaves a half-written snapshot as the latest one.
+        With a write-ahead log, each snapshot is a checkpoint: records it covers
+        are compacted out of the log, and the rest are replayed on load.
+
+        Args:
+            search_engine: VideoSearchEngine to persist
+            data_dir: Directory holding snapshots
+            interval_seconds: How often to check for changes and snapshot
+            mmap: Memory-map the FAISS index on load (shared across worker processes)
+            wal: Write-ahead log replayed on load and compacted after each checkpoint
+            compact_bytes: Checkpoint early once the log grows past this size
+        """
+        self.search_engine = search_engine
+        self.data_dir = data_dir
+        self.interval_seconds = interval_seconds
+        self.mmap = mmap
+        self.wal = wal
+        self.compact_bytes = compact_bytes
+        self.saved_generation: Optional[int] = None
+        # Snapshot this engine was restored from or last wrote; the only one it may replace
+        self.base_snapshot: Optional[str] = None
+        self.last_snapshot_at: Optional[float] = None
+        self.last_snapshot_seconds: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._write_lock = threading.Lock()
+        os.makedirs(data_dir, exist_ok=True)
+
+    def _current_snapshot_dir(self) -> Optional[str]:
+        return current_snapshot_dir(self.data_dir)
+
+    def load_latest(self) -> bool:
+        """
+        Restore the engine from the latest snapshot, then replay the write-ahead log on top.
+
+        Returns:
+            True if a snapshot was loaded
+
+        Raises:
+            IncompatibleSnapshotError: The snapshot was built with other settings
+        """
+        snapshot_dir = self._current_snapshot_dir()
+        if snapshot_dir is None:
+            logger.info(f"No snapshot found in {self.data_dir}; starting with an empty index")
+            loaded = False
+        else:
+            loaded = self._load_snapshot(snapshot_dir)
+
+        if self.wal is not None:
+            # Only reached with a matching checkpoint (or none), so every logged record belongs to this index
+            self.search_engine.replay_wal(self.wal)
+        return loaded
+
+    def _load_snapshot(self, snapshot_dir: str) -> bool:
+        """Load a snapshot, converting one with another index layout and refusing one built for another model or metric."""
+
+        start_time = time.time()
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE), 'r') as f:
+            manifest = json.load(f)
+
+        expected = self.search_engine.get_index_signature()
+        saved = manifest.get('signature') or {}
+        # Snapshots from before model_id was recorded were built with the full-precision model
+        saved = {'model_id': saved.get('model_name'), **saved}
+        # Same vectors, other index layout or storage type (e.g. float32 -> int8): convert instead of refusing
+        convert = saved != expected and {**saved, 'index': None} == {**expected, 'index': None}
+        if manifest.get('version') != SNAPSHOT_FORMAT_VERSION or (saved != expected and not convert):
+            # Starting empty would snapshot over (and then delete) the only copy of the corpus
+            raise IncompatibleSnapshotError(
+                f"Snapshot {snapshot_dir} was built with {manifest.get('signature')} "
+                f"(format {manifest.get('version')}), but the engine is configured for {expected}. "
+                f"Restore the previous model and metric, or re-embed the corpus into a new INDEX_DATA_DIR "
+                f"with scripts/reindex.py (it reads this snapshot and its write-ahead log)"
+            )
+
+        if convert:
+            logger.info(f"Converting snapshot {snapshot_dir} from index {saved.get('index')} to {expected['index']}")
+        self.search_engine.restore(snapshot_dir, mmap=self.mmap, wal_seq=manifest.get('wal_seq', 0), convert=convert)
+        self.base_snapshot = os.path.basename(snapshot_dir)
+        # Replayed log records bump the generation past this, so they get checkpointed;
+        # a converted index is written out at the next check so it is converted only once
+        self.saved_generation = None if convert else self.search_engine.generation
+
+        elapsed = time.time() - start_time
+        logger.info(f"Loaded snapshot {snapshot_dir} ({manifest.get('total_videos')} videos) in {elapsed:.2f}s")
+        return True
+
+    def snapshot(self, force: bool = False) -> bool:
+        """
+        Write a snapshot if the index changed since the last one.
+
+        Args:
+            force: Write even when nothing changed
+
+        Returns:
+            True if a snapshot was written
+        """
+        with self._write_lock:
+            if not force and self.search_engine.generation == self.saved_generation:
+                return False
+
+            current = self._current_snapshot_dir()
+            if current is not None and os.path.basename(current) != self.base_snapshot:
+                raise IncompatibleSnapshotError(
+                    f"Snapshot {current} was not loaded into this engine; refusing to replace it"
+                )
+
+            start_time = time.time()
+            generation, wal_seq, index_state, metadata_state = self.search_engine.export_state()
+            name = f"snapshot-{int(time.time() * 1000)}-{generation}"
+            snapshot_dir = os.path.join(self.data_dir, name)
+            tmp_dir = snapshot_dir + '.tmp'
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+
+            self.search_engine.save(tmp_dir, index_state, metadata_state)
+            with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+                json.dump({
+                    'version': SNAPSHOT_FORMAT_VERSION,
+                    'signature': self.search_engine.get_index_signature(),
+                    'generation': generation,
+                    'wal_seq': wal_seq,
+                    'total_videos': len(metadata_state['videos']['video_id']),
+                    'total_chunks': index_state['ntotal'],
+                    'created_at': datetime.now(timezone.utc).isoformat()
+                }, f)
+            # The data must be on disk before anything points at it
+            _fsync_tree(tmp_dir)
+            os.rename(tmp_dir, snapshot_dir)
+            fsync_dir(self.data_dir)
+
+            # Publish atomically, then drop older snapshots
+            pointer_tmp = os.path.join(self.data_dir, CURRENT_FILE + '.tmp')
+            with open(pointer_tmp, 'w') as f:
+                f.write(name)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(pointer_tmp, os.path.join(self.data_dir, CURRENT_FILE))
+            fsync_dir(self.data_dir)
+            self._remove_old_snapshots(keep=name)
+            if self.wal is not None:
+                # Everything up to wal_seq is now in a durable checkpoint
+                self.wal.truncate(wal_seq)
+
+            self.saved_generation = generation
+            self.base_snapshot = name
+            self.last_snapshot_at = time.time()
+            self.last_snapshot_seconds = self.last_snapshot_at - start_time
+            logger.info(f"Wrote snapshot {name} ({index_state['ntotal']} chunks) in {self.last_snapshot_seconds:.2f}s")
+            return True
+
+    def _remove_old_snapshots(self, keep: str):
+        for entry in os.listdir(self.data_dir):
+            if entry.startswith('snapshot-') and entry != keep:
+                shutil.rmtree(os.path.join(self.data_dir, entry), ignore_errors=True)
+
+    def _run(self):
+        last_check = time.time()
+        # Wake up every second so an oversized log is compacted promptly
+        while not self._stop.wait(min(1.0, self.interval_seconds)):
+            wal_full = self.wal is not None and self.wal.size_bytes() >= self.compact_bytes
+            if not wal_full and time.time() - last_check < self.interval_seconds:
+                continue
+            last_check = time.time()
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error(f"Snapshot failed: {e}")
+
+    def start(self):
+        """Start the background snapshot thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-snapshotter", daemon=True)
+            self._thread.start()
+
+    def stop(self, final_snapshot: bool = True):
+        """Stop the background thread, optionally writing a last snapshot."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if final_snapshot:
+            self.snapshot()
+
+    def get_stats(self) -> dict:
+        return {
+            'data_dir': self.data_dir,
+            'wal': self.wal.get_stats() if self.wal is not None else None,
+            'interval_seconds': self.interval_seconds,
+            'mmap': self.mmap,
+            'saved_generation': self.saved_generation,
+            'last_snapshot_at': self.last_snapshot_at,
+            'last_snapshot_seconds': self.last_snapshot_seconds
+        }
@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import queue
+import shutil
+import hashlib
+import threading
+import multiprocessing
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import numpy as np
+from .models import VideoTranscript
+from .embedding_manager import EmbeddingManager
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = 'checkpoint.json'
+EMBEDDINGS_FILE = 'embeddings.npy'
+DONE_FILE = 'done.npy'
+# Seconds between progress log lines
+PROGRESS_INTERVAL = 5.0
+
+
+class ReindexCancelled(Exception):
+    """Raised by ReindexPool.run when cancel() was called; the checkpoint is kept."""
+
+
+def _embed_worker(
+    worker_id: int,
+    model_name: str,
+    normalize: bool,
+    embedding_params: Dict[str, Any],
+    num_threads: int,
+    embeddings_path: str,
+    tasks,
+    results
+):
+    """
+    Worker process: load a model, then embed shards into the shared embeddings file until told to stop.
+
+    Reports ('ready', worker_id, None), ('done', worker_id, shard) per shard, or
+    ('error', worker_id, message) on results.
+    """
+    # Size the BLAS / OpenMP pools before the model's libraries are imported
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[variable] = str(num_threads)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        manager = EmbeddingManager(model_name, normalize=normalize, **dict(embedding_params, num_threads=num_threads))
+        # Rows written here are seen by the parent through the shared page cache
+        embeddings = np.load(embeddings_path, mmap_mode='r+')
+        results.put(('ready', worker_id, None))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            shard, start, texts = task
+            embeddings[start:start + len(texts)] = manager.encode_bulk(texts)
+            embeddings.flush()
+            results.put(('done', worker_id, shard))
+    except Exception as e:
+        results.put(('error', worker_id, f"{type(e).__name__}: {e}"))
+
+
+class ReindexPool:
+    def __init__(
+        self,
+        embedding_manager: EmbeddingManager,
+        embedding_params: Optional[Dict[str, Any]] = None,
+        num_workers: int = 2,
+        threads_per_worker: Optional[int] = None,
+        shard_size: int = 1024,
+        checkpoint_dir: str = 'data/reindex'
+    ):
+        """
+        Re-embed a whole corpus with several worker processes, each holding its own copy of the model.
+
+        The corpus's chunks are cut into contiguous shards handed out to the
+        workers, which write their embeddings straight into a memory-mapped
+        (n_chunks, dimension) file shared with this process, so only text goes
+        through the task queue. A video is passed on for indexing as soon as
+        all of its chunks are embedded. The file and a per-shard done mask
+        are the checkpoint: re-running an interrupted job over the same corpus
+        and model only embeds the shards that were not finished.
+
+        Args:
+            embedding_manager: Manager of the target model (its settings are reproduced in each worker)
+            embedding_params: Extra EmbeddingManager options for the workers (backend, onnx_dir, quantize, token_budget, max_batch_size)
+            num_workers: Worker processes
+            threads_per_worker: Inference threads per worker; defaults to the CPUs divided among the workers
+            shard_size: Chunks per task
+            checkpoint_dir: Where the shared embeddings file and progress are kept
+        """
+        self.model_name = embedding_manager.model_name
+        self.model_id = embedding_manager.model_id
+        self.normalize = embedding_manager.normalize
+        self.dimension = embedding_manager.get_embedding_dimension()
+        self.embedding_params = {key: value for key, value in (embedding_params or {}).items() if key != 'num_threads'}
+        self.num_workers = max(1, num_workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.shard_size = shard_size
+        self.checkpoint_dir = checkpoint_dir
+        self.progress: Dict[str, Any] = {'state': 'idle'}
+        self._progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._cancelled = threading.Event()
+
+    @staticmethod
+    def _corpus_digest(videos: List[VideoTranscript]) -> str:
+        """Identifies the corpus a checkpoint belongs to (video IDs and chunk texts, in order)."""
+        digest = hashlib.blake2b(digest_size=16)
+        for video in videos:
+            digest.update(video.video_id.encode('utf-8') + b'\0')
+            for chunk in video.chunks:
+                digest.update(chunk.text.encode('utf-8') + b'\0')
+        return digest.hexdigest()
+
+    def _open_checkpoint(self, total_chunks: int, corpus: str):
+        """Open the checkpoint for this corpus and model, or start a new one. Returns (embeddings, done)."""
+        meta = {
+            'model_id': self.model_id,
+            'normalize': self.normalize,
+            'dimension': self.dimension,
+            'corpus': corpus,
+            'total_chunks': total_chunks,
+            'shard_size': self.shard_size
+        }
+        meta_path = os.path.join(self.checkpoint_dir, CHECKPOINT_FILE)
+        embeddings_path = os.path.join(self.checkpoint_dir, EMBEDDINGS_FILE)
+        done_path = os.path.join(self.checkpoint_dir, DONE_FILE)
+        try:
+            with open(meta_path) as f:
+                if json.load(f) == meta:
+                    return np.load(embeddings_path, mmap_mode='r'), np.load(done_path, mmap_mode='r+')
+            logger.info(f"Re-index checkpoint in {self.checkpoint_dir} is for another corpus or model; starting over")
+        except (OSError, ValueError):
+            pass
+
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        os.makedirs(self.checkpoint_dir)
+        open_memmap = np.lib.format.open_memmap
+        open_memmap(embeddings_path, mode='w+', dtype='float32', shape=(total_chunks, self.dimension)).flush()
+        n_shards = -(-total_chunks // self.shard_size)
+        open_memmap(done_path, mode='w+', dtype=bool, shape=(n_shards,)).flush()
+        # Written last: a checkpoint without it is never resumed
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+        return np.load(embeddings_path, mmap_mode='r'), np.load(done_path, mmap_mode='r+')
+
+    def cancel(self):
+        """Stop a run() in progress (from another thread); finished shards stay in the checkpoint."""
+        self._cancelled.set()
+
+    def remove_checkpoint(self):
+        """Delete the checkpoint once its results are safely persisted elsewhere."""
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+    def _update_progress(self, **changes):
+        self.progress.update(changes)
+        elapsed = time.time() - self.progress['started_at']
+        embedded = self.progress['embedded_chunks'] - self.progress['resumed_chunks']
+        remaining = self.progress['total_chunks'] - self.progress['embedded_chunks']
+        rate = embedded / elapsed if elapsed > 0 else 0.0
+        self.progress.update({
+            'elapsed_seconds': round(elapsed, 1),
+            'chunks_per_second': round(rate, 1),
+            'eta_seconds': round(remaining / rate, 1) if rate else None,
+            'percent': round(100.0 * self.progress['embedded_chunks'] / max(self.progress['total_chunks'], 1), 1)
+        })
+        if self._progress_callback is not None:
+            self._progress_callback(dict(self.progress))
+
+    def run(
+        self,
+        videos: List[VideoTranscript],
+        on_video: Callable[[VideoTranscript, np.ndarray], None],
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Embed every chunk of videos, handing each finished video to on_video.
+
+        Videos already complete in the checkpoint are handed over first,
+        without embedding. If a worker fails or the job is interrupted, the
+        workers are stopped and the checkpoint is kept for the next run.
+
+        Args:
+            videos: Corpus to embed
+            on_video: Called with (video, chunk embeddings) once per video, in completion order
+            progress_callback: Called with a progress dict after every shard
+
+        Returns:
+            Final progress dict
+        """
+        self._progress_callback = progress_callback
+        texts = [chunk.text for video in videos for chunk in video.chunks]
+        starts = np.concatenate([[0], np.cumsum([len(video.chunks) for video in videos])]).astype('int64')
+        n_shards = -(-len(texts) // self.shard_size)
+        if not texts:
+            for video in videos:
+                on_video(video, np.zeros((0, self.dimension), dtype='float32'))
+            self.progress = {'state': 'completed', 'total_videos': len(videos), 'indexed_videos': len(videos), 'total_chunks': 0}
+            return self.progress
+
+        embeddings, done = self._open_checkpoint(len(texts), self._corpus_digest(videos))
+        shard_lengths = [min(self.shard_size, len(texts) - shard * self.shard_size) for shard in range(n_shards)]
+        resumed = sum(length for shard, length in enumerate(shard_lengths) if done[shard])
+        self.progress = {
+            'state': 'running',
+            'model': self.model_id,
+            'workers': self.num_workers,
+            'threads_per_worker': self.threads_per_worker,
+            'total_videos': len(videos),
+            'indexed_videos': 0,
+            'total_chunks': len(texts),
+            'embedded_chunks': resumed,
+            'resumed_chunks': resumed,
+            'started_at': time.time()
+        }
+        if resumed:
+            logger.info(f"Resuming re-index from {self.checkpoint_dir}: {resumed}/{len(texts)} chunks already embedded")
+
+        # Shards each video spans, and the videos waiting on each shard
+        remaining = []
+        waiting: Dict[int, List[int]] = {}
+        for position in range(len(videos)):
+            first, last = starts[position] // self.shard_size, (starts[position + 1] - 1) // self.shard_size
+            shards = [shard for shard in range(first, last + 1) if not done[shard]] if starts[position + 1] > starts[position] else []
+            remaining.append(len(shards))
+            for shard in shards:
+                waiting.setdefault(shard, []).append(position)
+
+        def publish(position: int):
+            video = videos[position]
+            on_video(video, np.array(embeddings[starts[position]:starts[position + 1]]))
+            self.progress['indexed_videos'] += 1
+
+        for position, count in enumerate(remaining):
+            if count == 0:
+                publish(position)
+
+        pending = [shard for shard in range(n_shards) if not done[shard]]
+        if not pending:
+            self._update_progress(state='completed')
+            return self.progress
+
+        context = multiprocessing.get_context('spawn')
+        tasks = context.Queue()
+        results = context.Queue()
+        for shard in pending:
+            start = shard * self.shard_size
+            tasks.put((shard, start, texts[start:start + shard_lengths[shard]]))
+        workers = []
+        for worker_id in range(min(self.num_workers, len(pending))):
+            tasks.put(None)
+            process = context.Process(
+                target=_embed_worker,
+                args=(worker_id, self.model_name, self.normalize, self.embedding_params, self.threads_per_worker,
+                      os.path.abspath(os.path.join(self.checkpoint_dir, EMBEDDINGS_FILE)), tasks, results),
+                name=f"reindex-worker-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            workers.append(process)
+        logger.info(f"Re-indexing {len(texts)} chunks of {len(videos)} videos in {len(pending)} shards "
+                    f"with {len(workers)} workers x {self.threads_per_worker} threads")
+
+        self._update_progress()
+        last_log = time.time()
+        try:
+            while pending:
+                if self._cancelled.is_set():
+                    raise ReindexCancelled(f"Re-index cancelled with {len(pending)} shards left")
+                try:
+                    kind, worker_id, value = results.get(timeout=1.0)
+                except queue.Empty:
+                    dead = [process.name for process in workers if process.exitcode not in (None, 0)]
+                    if dead:
+                        raise RuntimeError(f"Re-index worker(s) {', '.join(dead)} died")
+                    continue
+                if kind == 'error':
+                    raise RuntimeError(f"Re-index worker {worker_id} failed: {value}")
+                if kind == 'ready':
+                    continue
+
+                shard = value
+                done[shard] = True
+                done.flush()
+                pending.remove(shard)
+                for position in waiting.get(shard, []):
+                    remaining[position] -= 1
+                    if remaining[position] == 0:
+                        publish(position)
+                self._update_progress(embedded_chunks=self.progress['embedded_chunks'] + shard_lengths[shard])
+                if time.time() - last_log >= PROGRESS_INTERVAL:
+                    last_log = time.time()
+                    logger.info(f"Re-index {self.progress['percent']}%: {self.progress['embedded_chunks']}/{len(texts)} chunks, "
+                                f"{self.progress['chunks_per_second']} chunks/s, ETA {self.progress['eta_seconds']}s")
+        except BaseException:
+            self._update_progress(state='interrupted')
+            for process in workers:
+                process.terminate()
+            raise
+        finally:
+            for process in workers:
+                process.join()
+
+        self._update_progress(state='completed')
+        logger.info(f"Re-indexed {len(texts)} chunks of {len(videos)} videos in {self.progress['elapsed_seconds']}s "
+                    f"({self.progress['chunks_per_second']} chunks/s)")
+        return self.progress
@@ -0,0 +1,111 @@
+import time
+import threading
+from typing import List, Optional, Dict, Any
+import logging
+import numpy as np
+from .search_batcher import Histogram
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000]
+# Weight of the newest batch in the running per-pair cost estimate
+COST_SMOOTHING = 0.2
+
+
+class CrossEncoderReranker:
+    def __init__(
+        self,
+        model_name: str = 'cross-encoder/ms-marco-MiniLM-L-6-v2',
+        candidates: int = 50,
+        budget_ms: float = 100.0,
+        batch_size: int = 16,
+        max_length: int = 256
+    ):
+        """
+        Second search stage: re-score (query, chunk text) pairs with a cross-encoder on CPU.
+
+        Pairs are scored in batches of batch_size. Before each batch the
+        running per-pair cost is used to check that it can finish inside the
+        budget, and the clock is checked again after it; if the budget would
+        be or was exceeded the stage gives up and the caller keeps the
+        first-stage order.
+
+        Args:
+            model_name: sentence-transformers CrossEncoder model
+            candidates: First-stage results re-scored per query (unless the query sets its own)
+            budget_ms: Default time allowed for re-scoring one query
+            batch_size: Pairs per forward pass
+            max_length: Token limit of a (query, chunk) pair
+        """
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.candidates = candidates
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name, max_length=max_length, device='cpu')
+        # Seconds per pair, learned from completed batches
+        self._pair_seconds: Optional[float] = None
+
+        self._stats_lock = threading.Lock()
+        self.reranked = 0
+        self.aborted = 0
+        self.latency = Histogram(LATENCY_BUCKETS_MS)
+        logger.info(f"Loaded cross-encoder {model_name}")
+
+    def score(self, query: str, texts: List[str], budget_ms: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Cross-encoder scores of a query against chunk texts.
+
+        Args:
+            query: Query text
+            texts: Candidate chunk texts
+            budget_ms: Time allowed (default: the reranker's budget_ms)
+
+        Returns:
+            One score per text (higher is more relevant), or None if the budget ran out
+        """
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        start_time = time.perf_counter()
+        deadline = start_time + budget_ms / 1000
+        scores = []
+        for offset in range(0, len(texts), self.batch_size):
+            batch = texts[offset:offset + self.batch_size]
+            if self._pair_seconds is not None and time.perf_counter() + self._pair_seconds * len(batch) > deadline:
+                return self._abort(query, start_time, offset, len(texts))
+            batch_start = time.perf_counter()
+            scores.extend(self.model.predict([(query, text) for text in batch], batch_size=len(batch), show_progress_bar=False))
+            pair_seconds = (time.perf_counter() - batch_start) / len(batch)
+            self._pair_seconds = pair_seconds if self._pair_seconds is None else \
+                (1 - COST_SMOOTHING) * self._pair_seconds + COST_SMOOTHING * pair_seconds
+            if time.perf_counter() > deadline and offset + len(batch) < len(texts):
+                return self._abort(query, start_time, offset + len(batch), len(texts))
+
+        with self._stats_lock:
+            self.reranked += 1
+            self.latency.observe((time.perf_counter() - start_time) * 1000)
+        return np.asarray(scores, dtype='float32')
+
+    def _abort(self, query: str, start_time: float, scored: int, total: int) -> None:
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        with self._stats_lock:
+            self.aborted += 1
+            self.latency.observe(elapsed_ms)
+        logger.info(f"Re-ranking '{query[:50]}' stopped after {scored}/{total} pairs ({elapsed_ms:.1f}ms); "
+                    f"keeping first-stage order")
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            attempts = self.reranked + self.aborted
+            return {
+                'model': self.model_name,
+                'candidates': self.candidates,
+                'budget_ms': self.budget_ms,
+                'batch_size': self.batch_size,
+                'ms_per_pair': round(self._pair_seconds * 1000, 3) if self._pair_seconds is not None else None,
+                'reranked': self.reranked,
+                'aborted': self.aborted,
+                'abort_rate': round(self.aborted / attempts, 4) if attempts else 0.0,
+                'latency_ms': self.latency.snapshot()
+            }
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple
+import logging
+from .models import SearchQuery, SearchResponse
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    def __init__(self, buckets: List[float]):
+        """
+        Fixed-bucket histogram (Prometheus style, cumulative "le" buckets).
+
+        Args:
+            buckets: Sorted upper bounds of the buckets
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        """Record a single observation."""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return cumulative bucket counts plus count, sum and mean."""
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets + [float('inf')], self.counts):
+            running += count
+            cumulative['+Inf' if bound == float('inf') else str(bound)] = running
+        return {
+            'buckets': cumulative,
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.total / self.count if self.count else 0.0
+        }
+
+
+class SearchBatcher:
+    def __init__(self, search_engine, window_ms: float = 3.0, max_batch_size: int = 32):
+        """
+        Coalesce concurrent searches into micro-batches.
+
+        Queries arriving within window_ms of the first queued query (or until
+        max_batch_size is reached) are encoded and searched together through
+        VideoSearchEngine.search_many on a worker thread, so the event loop is
+        never blocked by the model forward pass.
+
+        Args:
+            search_engine: VideoSearchEngine to run batches against
+            window_ms: How long to wait for more queries after the first arrives
+            max_batch_size: Flush as soon as this many queries are queued
+        """
+        self.search_engine = search_engine
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # A single thread keeps batches ordered and lets the next batch fill up meanwhile
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-batch")
+
+        self.batch_size_histogram = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.queue_wait_histogram = Histogram([0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000])
+        self.total_batches = 0
+        self.total_queries = 0
+        logger.info(f"Initialized SearchBatcher (window={window_ms}ms, max_batch_size={max_batch_size})")
+
+    async def submit(self, query: SearchQuery) -> SearchResponse:
+        """
+        Queue a query for the next batch and wait for its response.
+
+        Args:
+            query: SearchQuery to run
+
+        Returns:
+            SearchResponse for this query only
+
+        Raises:
+            ValueError: The query is invalid; checked here so it never fails a whole batch
+        """
+        self.search_engine.validate_query(query)
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future, time.perf_counter()))
+        return await future
+
+    def _ensure_worker(self):
+        """Start the batching loop on the running event loop the first time it is needed."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            # Queues and tasks are bound to one loop; start fresh if the loop changed
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(self._queue))
+
+    async def _collect_batch(self, queue: asyncio.Queue) -> List[Tuple[SearchQuery, asyncio.Future, float]]:
+        """Wait for a first query, then gather more until the window closes or the batch is full."""
+        batch = [await queue.get()]
+        deadline = time.perf_counter() + self.window_ms / 1000
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self, queue: asyncio.Queue):
+        """Batching loop: collect, search on the worker thread, hand each caller its response."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch(queue)
+            dispatch_time = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.queue_wait_histogram.observe((dispatch_time - enqueued_at) * 1000)
+            self.batch_size_histogram.observe(len(batch))
+            self.total_batches += 1
+            self.total_queries += len(batch)
+
+            queries = [query for query, _, _ in batch]
+            try:
+                responses = await loop.run_in_executor(self._executor, self.search_engine.search_many, queries)
+            except Exception as e:
+                logger.error(f"Batched search failed for {len(batch)} queries: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), response in zip(batch, responses):
+                # The caller may have gone away (client disconnect cancels the future)
+                if not future.done():
+                    future.set_result(response)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Batching configuration plus batch-size and queue-wait (ms) histograms."""
+        return {
+            'window_ms': self.window_ms,
+            'max_batch_size': self.max_batch_size,
+            'total_batches': self.total_batches,
+            'total_queries': self.total_queries,
+            'batch_size': self.batch_size_histogram.snapshot(),
+            'queue_wait_ms': self.queue_wait_histogram.snapshot()
+        }
+
+    async def close(self):
+        """Stop the batching loop and release the worker thread."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
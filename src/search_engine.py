@@ -1,61 +1,345 @@
+import math
 import time
-from typing import List, Optional
+import threading
+from typing import List, Optional, Dict, Any
 import logging
-from .models import VideoTranscript, SearchResult, SearchResponse, SearchQuery
+import numpy as np
+from .models import VideoTranscript, TranscriptChunk, VideoSummary, SearchResult, SearchResponse, SearchQuery
 from .embedding_manager import EmbeddingManager
+from .embedding_cache import PersistentEmbeddingCache
 from .vector_store import VectorStore
+from .metadata_store import ChunkMetadataStore
+from .query_cache import LRUCache
+from .index_wal import WriteAheadLog
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from .reranker import CrossEncoderReranker
 
 logger = logging.getLogger(__name__)
 
+# Candidates taken from each of the dense and lexical rankings before fusing them
+HYBRID_CANDIDATES = 100
+# Reciprocal rank fusion damping constant
+RRF_K = 60
+# Candidates per wanted result fetched up front for MMR, which needs alternatives to choose from
+MMR_CANDIDATES_PER_RESULT = 4
+# Most candidates a diversified query fetches while trying to fill top_k distinct results
+MAX_DIVERSITY_CANDIDATES = 1000
+# Hits of a video this close in time (seconds) count as adjacent for merge_adjacent
+ADJACENT_GAP_SECONDS = 0.5
+
+
+def _segment_texts(text: str, offsets) -> List[str]:
+    """Split a chunk's text at its segment character offsets."""
+    bounds = list(offsets) + [len(text)]
+    return [text[bounds[i]:bounds[i + 1]].strip() for i in range(len(offsets))]
+
 
 class VideoSearchEngine:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
-        """Initialize the search engine with embedding manager and vector store."""
-        self.embedding_manager = EmbeddingManager(model_name)
-        self.vector_store = VectorStore(self.embedding_manager.get_embedding_dimension())
-        self.videos: dict[str, VideoTranscript] = {}
+    def __init__(
+        self,
+        model_name: str = 'all-MiniLM-L6-v2',
+        index_type: str = 'flat',
+        metric: str = 'cosine',
+        index_params: Optional[Dict[str, Any]] = None,
+        cache_params: Optional[Dict[str, Any]] = None,
+        embedding_cache_params: Optional[Dict[str, Any]] = None,
+        embedding_params: Optional[Dict[str, Any]] = None,
+        lexical_params: Optional[Dict[str, Any]] = None,
+        rerank_params: Optional[Dict[str, Any]] = None,
+        segment_cache_params: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Initialize the search engine with embedding manager and vector store.
+
+        Args:
+            model_name: Sentence transformer model used for embeddings
+            index_type: FAISS index backend ('flat', 'hnsw', 'ivf_flat', 'ivf_pq')
+            metric: 'cosine' (normalized embeddings, inner-product index) or 'l2'
+            index_params: Extra VectorStore options (nlist, pq_m, hnsw_m, nprobe, ef_search, train_size)
+            cache_params: LRUCache options (max_entries, max_bytes, ttl_seconds) for the query caches
+            embedding_cache_params: PersistentEmbeddingCache options (directory, max_entries, dtype)
+                for chunk embeddings kept across restarts; None disables it
+            embedding_params: Extra EmbeddingManager options (backend, onnx_dir, quantize, num_threads)
+            lexical_params: LexicalIndex options (k1, b) for the BM25 index behind the lexical
+                and hybrid search modes; None disables it
+            rerank_params: CrossEncoderReranker options (model_name, candidates, budget_ms, batch_size)
+                for queries with rerank=True; None disables re-ranking
+            segment_cache_params: PersistentEmbeddingCache options (directory, max_entries, dtype) for
+                transcript segment embeddings used to refine hit timestamps; None refines by
+                query term overlap only
+        """
+        self.embedding_manager = EmbeddingManager(model_name, normalize=(metric == 'cosine'), **(embedding_params or {}))
+        self.vector_store = VectorStore(
+            self.embedding_manager.get_embedding_dimension(),
+            index_type=index_type,
+            metric=metric,
+            **(index_params or {})
+        )
+        # Chunk and video metadata keyed by vector store chunk ID; transcripts are
+        # kept only here, in columnar form, and rebuilt on demand by get_video
+        self.metadata = ChunkMetadataStore()
+        # FAISS indexes are not safe for concurrent add/search, and searches run
+        # on the batcher's worker thread while indexing runs on request threads.
+        self._lock = threading.RLock()
+
+        # Optional write-ahead log (attached by replay_wal) and the last record applied
+        self.wal: Optional[WriteAheadLog] = None
+        self.wal_seq = 0
+
+        # Model migration building a shadow engine in the background (see src/migration.py);
+        # it is sent every mutation and a sample of searches
+        self.migration = None
+
+        # Two-layer query cache: normalized text -> embedding, and
+        # (text, search options, index generation) -> results. The generation is
+        # bumped on every index mutation so cached results never outlive the index.
+        self.generation = 0
+        self.embedding_cache = LRUCache(sizeof=lambda embedding: embedding.nbytes + 100, **(cache_params or {}))
+        self.result_cache = LRUCache(sizeof=self._results_size, **(cache_params or {}))
+
+        # Chunk embeddings on disk, so re-indexing known text skips the model
+        self.chunk_embedding_cache: Optional[PersistentEmbeddingCache] = None
+        if embedding_cache_params is not None:
+            self.chunk_embedding_cache = PersistentEmbeddingCache(
+                model_name=self.embedding_manager.model_id,
+                dimension=self.embedding_manager.get_embedding_dimension(),
+                normalize=self.embedding_manager.normalize,
+                **embedding_cache_params
+            )
+        # Embeddings of the Whisper segments inside chunks, so a hit's timestamp can point at
+        # the best matching segment without running the model at query time
+        self.segment_embedding_cache: Optional[PersistentEmbeddingCache] = None
+        if segment_cache_params is not None:
+            self.segment_embedding_cache = PersistentEmbeddingCache(
+                model_name=self.embedding_manager.model_id,
+                dimension=self.embedding_manager.get_embedding_dimension(),
+                normalize=self.embedding_manager.normalize,
+                **segment_cache_params
+            )
+
+        # BM25 inverted index over the same chunk IDs, kept in step with every mutation
+        self.lexical: Optional[LexicalIndex] = LexicalIndex(**lexical_params) if lexical_params is not None else None
+
+        # Optional cross-encoder second stage; independent of the index, so a migration's cutover keeps it
+        self.reranker: Optional[CrossEncoderReranker] = CrossEncoderReranker(**rerank_params) if rerank_params is not None else None
         logger.info("Initialized VideoSearchEngine")
+
+    @staticmethod
+    def _normalize_query(text: str) -> str:
+        """Canonical form of query text used for cache keys."""
+        return " ".join(text.split())
+
+    @staticmethod
+    def _results_size(results: List[SearchResult]) -> int:
+        """Approximate memory held by a cached result list."""
+        return sum(200 + len(r.matched_text) + len(r.video_title) + len(r.video_id) for r in results) + 100
+
+    @staticmethod
+    def _filter_key(query: SearchQuery) -> Optional[str]:
+        """Hashable form of a query's filters (None when unfiltered)."""
+        if query.filters is None:
+            return None
+        key = query.filters.model_dump_json(exclude_none=True)
+        return key if key != '{}' else None
+
+    def _result_key(self, query: SearchQuery, generation: int) -> tuple:
+        return (
+            self._normalize_query(query.query),
+            query.top_k or 5,
+            query.nprobe,
+            query.ef_search,
+            query.min_score,
+            self._filter_key(query),
+            query.mode,
+            self._first_stage_k(query) if query.rerank else None,
+            self._max_per_video(query),
+            query.mmr_lambda,
+            query.merge_adjacent,
+            generation
+        )
+
+    def _first_stage_k(self, query: SearchQuery) -> int:
+        """Results retrieved before re-ranking: the query's top_k, or the re-rank candidate count if larger."""
+        top_k = query.top_k or 5
+        if not query.rerank:
+            return top_k
+        return max(top_k, query.rerank_candidates or self.reranker.candidates)
+
+    @staticmethod
+    def _max_per_video(query: SearchQuery) -> Optional[int]:
+        """Per-video result cap of a query (group_by_video means 1), or None."""
+        if query.max_per_video is not None:
+            return query.max_per_video
+        return 1 if query.group_by_video else None
+
+    def _diversified(self, query: SearchQuery) -> bool:
+        return self._max_per_video(query) is not None or query.mmr_lambda is not None or query.merge_adjacent
+
+    def _candidate_k(self, query: SearchQuery) -> int:
+        """Hits fetched first for a query; diversified queries fetch more later only if they need to."""
+        k = self._first_stage_k(query)
+        if query.mmr_lambda is not None:
+            return min(k * MMR_CANDIDATES_PER_RESULT, max(k, MAX_DIVERSITY_CANDIDATES))
+        return k
+
+    def _bump_generation(self):
+        """Invalidate cached results after the index changed. Call with the lock held."""
+        self.generation += 1
+        self.result_cache.clear()
     
-    def index_video(self, video: VideoTranscript):
+    def index_video(self, video: VideoTranscript, embeddings: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Index a video transcript by creating embeddings for each chunk.
+
+        Indexing is an upsert: re-posting a video_id replaces its previous chunks.
         
         Args:
             video: VideoTranscript object containing chunks
+            embeddings: Chunk embeddings computed earlier by the same model (skips encoding)
+
+        Returns:
+            The chunk embeddings, in chunk order
         """
         start_time = time.time()
-        
-        # Store video metadata
-        self.videos[video.video_id] = video
-        
-        # Extract texts and create metadata
-        texts = []
-        metadata_list = []
-        
-        for chunk in video.chunks:
-            texts.append(chunk.text)
-            metadata_list.append({
-                'video_id': video.video_id,
-                'video_title': video.title,
-                'chunk_id': chunk.chunk_id,
-                'start_time': chunk.start_time,
-                'end_time': chunk.end_time,
-                'text': chunk.text
-            })
+        model_id = self.embedding_manager.model_id
         
         # Generate embeddings
-        embeddings = self.embedding_manager.encode(texts)
+        if embeddings is None:
+            embeddings = self._encode_chunks([chunk.text for chunk in video.chunks])
+        elif len(embeddings) != len(video.chunks):
+            raise ValueError("Number of embeddings must match number of chunks")
+        self._embed_segments(video.chunks)
         
-        # Add to vector store
-        self.vector_store.add_embeddings(embeddings, metadata_list)
+        # Log the mutation before applying it so a crash can replay it without re-embedding
+        with self._lock:
+            embeddings = self._current_embeddings(model_id, video, embeddings)
+            if self.wal is not None:
+                self.wal_seq = self.wal.append('index', {'video': video.model_dump(mode='json')}, embeddings)
+            self._apply_index(video, embeddings)
+            self._mirror('index', video)
         
         elapsed = time.time() - start_time
         logger.info(f"Indexed video {video.video_id} with {len(video.chunks)} chunks in {elapsed:.2f}s")
+        return embeddings
+
+    def _apply_index(self, video: VideoTranscript, embeddings: np.ndarray):
+        """Add (or replace) a video's precomputed chunk embeddings. Call with the lock held."""
+        if video.video_id in self.metadata:
+            self._remove_video_chunks(video.video_id)
+
+        # Add to vector store and store chunk metadata under the assigned IDs
+        ids = self.vector_store.add_embeddings(embeddings)
+        self.metadata.add_video(video, ids)
+        if self.lexical is not None:
+            self.lexical.add(ids, [chunk.text for chunk in video.chunks])
+        self._bump_generation()
+
+    def append_video_chunks(self, video: VideoTranscript) -> np.ndarray:
+        """
+        Add chunks to a video, creating it if it is not indexed yet.
+
+        Used to make a long transcription searchable while it is still running;
+        unlike index_video, the video's existing chunks are kept.
+
+        Args:
+            video: VideoTranscript carrying only the new chunks
+
+        Returns:
+            Embeddings of the new chunks
+        """
+        if not video.chunks:
+            return np.zeros((0, self.embedding_manager.get_embedding_dimension()), dtype='float32')
+        model_id = self.embedding_manager.model_id
+        embeddings = self._encode_chunks([chunk.text for chunk in video.chunks])
+        self._embed_segments(video.chunks)
+        with self._lock:
+            embeddings = self._current_embeddings(model_id, video, embeddings)
+            if self.wal is not None:
+                self.wal_seq = self.wal.append('append', {'video': video.model_dump(mode='json')}, embeddings)
+            self._apply_append(video, embeddings)
+            self._mirror('append', video)
+        logger.info(f"Appended {len(video.chunks)} chunks to video {video.video_id}")
+        return embeddings
+
+    def _apply_append(self, video: VideoTranscript, embeddings: np.ndarray):
+        ids = self.vector_store.add_embeddings(embeddings)
+        if video.video_id in self.metadata:
+            self.metadata.append_chunks(video, ids)
+        else:
+            self.metadata.add_video(video, ids)
+        if self.lexical is not None:
+            self.lexical.add(ids, [chunk.text for chunk in video.chunks])
+        self._bump_generation()
+
+    def _current_embeddings(self, model_id: str, video: VideoTranscript, embeddings: np.ndarray) -> np.ndarray:
+        """Re-encode a video's chunks if a migration swapped the model since they were encoded. Call with the lock held."""
+        if self.embedding_manager.model_id == model_id:
+            return embeddings
+        logger.info(f"Model changed while indexing {video.video_id}; re-encoding with {self.embedding_manager.model_id}")
+        return self._encode_chunks([chunk.text for chunk in video.chunks])
+
+    def _mirror(self, op: str, value: Any):
+        """Forward an applied mutation to a running model migration. Call with the lock held."""
+        if self.migration is not None:
+            self.migration.record(op, value)
+
+    def _remove_video_chunks(self, video_id: str):
+        if self.lexical is not None:
+            chunk_ids = self.metadata.video_chunk_ids(video_id)
+            self.lexical.remove(chunk_ids, self.metadata.gather(chunk_ids)['text'])
+        chunk_ids = self.metadata.remove_video(video_id)
+        if len(chunk_ids):
+            self.vector_store.remove_ids(chunk_ids)
+
+    def delete_video(self, video_id: str) -> bool:
+        """
+        Remove a video and its chunks from the index.
+
+        Args:
+            video_id: ID of the video to remove
+
+        Returns:
+            False if the video was not indexed
+        """
+        with self._lock:
+            if video_id not in self.metadata:
+                return False
+            if self.wal is not None:
+                self.wal_seq = self.wal.append('delete', {'video_id': video_id})
+            self._apply_delete(video_id)
+            self._mirror('delete', video_id)
+        logger.info(f"Deleted video {video_id}")
+        return True
+
+    def _apply_delete(self, video_id: str):
+        self._remove_video_chunks(video_id)
+        self._bump_generation()
     
     def index_videos(self, videos: List[VideoTranscript]):
-        """Index multiple videos."""
+        """
+        Index multiple videos, embedding all their chunks together.
+
+        Pooling the chunks lets encode_bulk fill its token-budget batches
+        across videos instead of running each small video as its own batch.
+        """
+        start_time = time.time()
+        model_id = self.embedding_manager.model_id
+        embeddings = self._encode_chunks([chunk.text for video in videos for chunk in video.chunks])
+        self._embed_segments([chunk for video in videos for chunk in video.chunks])
+
+        offset = 0
         for video in videos:
-            self.index_video(video)
+            video_embeddings = embeddings[offset:offset + len(video.chunks)]
+            offset += len(video.chunks)
+            with self._lock:
+                video_embeddings = self._current_embeddings(model_id, video, video_embeddings)
+                if self.wal is not None:
+                    self.wal_seq = self.wal.append('index', {'video': video.model_dump(mode='json')}, video_embeddings)
+                self._apply_index(video, video_embeddings)
+                self._mirror('index', video)
+
+        elapsed = time.time() - start_time
+        logger.info(f"Indexed {len(videos)} videos with {offset} chunks in {elapsed:.2f}s")
     
     def search(self, query: SearchQuery) -> SearchResponse:
         """
@@ -67,48 +351,672 @@ class VideoSearchEngine:
         Returns:
             SearchResponse with ranked results
         """
+        return self.search_many([query])[0]
+
+    def validate_query(self, query: SearchQuery):
+        """
+        Reject options this engine cannot serve or that are out of range.
+
+        Raises:
+            ValueError: With a message fit for the client
+        """
+        if self.reranker is None and query.rerank:
+            raise ValueError("Re-ranking needs a cross-encoder (RERANK=true)")
+        max_per_video = self._max_per_video(query)
+        if max_per_video is not None and max_per_video < 1:
+            raise ValueError("max_per_video must be at least 1")
+        if query.mmr_lambda is not None and not 0 <= query.mmr_lambda <= 1:
+            raise ValueError("mmr_lambda must be between 0 and 1")
+
+    def search_many(self, queries: List[SearchQuery]) -> List[SearchResponse]:
+        """
+        Search several queries with one embedding forward pass.
+
+        Queries sharing the same mode, search knobs (nprobe / ef_search) and
+        filters go to FAISS as a single matrix search; top_k and min_score are
+        applied per query. Filters are resolved to matching chunk IDs once per
+        group and enforced inside FAISS and the lexical index, so filtered
+        queries still get up to top_k results. Cached results are served
+        directly and only uncached dense / hybrid query texts are encoded.
+
+        Modes: 'dense' ranks by embedding similarity, 'lexical' by BM25 over
+        the chunk text, and 'hybrid' fuses the top HYBRID_CANDIDATES of both
+        with reciprocal rank fusion (relevance_score is then the fused score).
+
+        Queries with rerank=True retrieve more candidates, which are then
+        re-scored by the cross-encoder outside the lock within the query's
+        time budget (relevance_score is then the cross-encoder score); when
+        the budget runs out the first-stage order is kept and not cached.
+        Each response reports its stage timings in stage_timings_ms.
+
+        Queries with max_per_video / group_by_video, mmr_lambda or
+        merge_adjacent are diversified before re-ranking (see _diversify).
+
+        Args:
+            queries: SearchQuery objects to run
+
+        Returns:
+            One SearchResponse per query, in input order
+        """
         start_time = time.time()
-        
-        # Generate query embedding
-        query_embedding = self.embedding_manager.encode(query.query)
-        
-        # Search in vector store
-        similarities, metadata_list = self.vector_store.search(
-            query_embedding[0], 
-            k=query.top_k or 5
-        )
-        
-        # Create search results
-        results = []
-        for similarity, metadata in zip(similarities, metadata_list):
-            result = SearchResult(
-                video_id=metadata['video_id'],
-                video_title=metadata['video_title'],
-                timestamp=metadata['start_time'],
-                end_time=metadata['end_time'],
-                matched_text=metadata['text'],
-                relevance_score=float(similarity)
-            )
-            results.append(result)
-        
+        if not queries:
+            return []
+
+        for query in queries:
+            self.validate_query(query)
+        generation = self.generation
+        result_keys = [self._result_key(query, generation) for query in queries]
+        cached = [self.result_cache.get(key) for key in result_keys]
+        pending = [position for position, results in enumerate(cached) if results is None]
+        timings = [{'cache': (time.time() - start_time) * 1000} for _ in queries]
+        # Only completed re-rankings are cached
+        reranked = [query.rerank and results is not None for query, results in zip(queries, cached)]
+
+        if pending:
+            if self.lexical is None and any(queries[p].mode != 'dense' for p in pending):
+                raise ValueError("Lexical and hybrid search need the lexical index (LEXICAL_INDEX=true)")
+            model_id = self.embedding_manager.model_id
+            # Rows of query_embeddings are the pending queries that need one
+            stage_start = time.time()
+            dense = [position for position in pending if queries[position].mode != 'lexical']
+            query_embeddings = self._encode_queries([queries[p].query for p in dense]) if dense else None
+            rows = {position: row for row, position in enumerate(dense)}
+            encode_ms = (time.time() - stage_start) * 1000
+
+            # Group queries by mode, search parameters and filters so each group is one FAISS call
+            groups: Dict[tuple, List[int]] = {}
+            for position in pending:
+                query = queries[position]
+                groups.setdefault((query.mode, query.nprobe, query.ef_search, self._filter_key(query)), []).append(position)
+
+            stage_start = time.time()
+            with self._lock:
+                if dense and self.embedding_manager.model_id != model_id:
+                    # A migration cut over to another model while these were encoded
+                    query_embeddings = self._encode_queries([queries[p].query for p in dense])
+                # Key new entries by the generation actually searched
+                generation = self.generation
+                for (mode, nprobe, ef_search, filter_key), positions in groups.items():
+                    search_filter = queries[positions[0]].filters
+                    subset = self.metadata.match(search_filter) if filter_key is not None else None
+                    group_embeddings = query_embeddings[[rows[p] for p in positions]] if mode != 'lexical' else None
+                    group_hits = self._retrieve(
+                        mode,
+                        [queries[p] for p in positions],
+                        group_embeddings,
+                        [self._candidate_k(queries[p]) for p in positions],
+                        nprobe,
+                        ef_search,
+                        subset
+                    )
+                    # Gather metadata under the lock; compaction may move rows
+                    for row, (position, (scores, chunk_ids)) in enumerate(zip(positions, group_hits)):
+                        query = queries[position]
+                        query_embedding = group_embeddings[row] if group_embeddings is not None else None
+                        if self._diversified(query):
+                            cached[position] = self._diversify(
+                                query, scores, chunk_ids, mode, query_embedding, nprobe, ef_search, subset
+                            )
+                        else:
+                            cached[position] = self._build_results(scores, chunk_ids, query.query, query_embedding)
+            retrieve_ms = (time.time() - stage_start) * 1000
+
+        for position in pending:
+            query = queries[position]
+            timings[position].update({'encode': encode_ms, 'retrieve': retrieve_ms})
+            if query.rerank:
+                stage_start = time.time()
+                results = self._rerank(query, cached[position])
+                timings[position]['rerank'] = (time.time() - stage_start) * 1000
+                reranked[position] = results is not None
+                if results is None:
+                    # Budget ran out: serve the first-stage order, but let the next request try again
+                    cached[position] = cached[position][:query.top_k or 5]
+                    continue
+                cached[position] = results
+            self.result_cache.put(self._result_key(query, generation), cached[position])
+
         elapsed_ms = (time.time() - start_time) * 1000
-        
-        return SearchResponse(
-            results=results,
-            query=query.query,
-            processing_time_ms=elapsed_ms
+
+        responses = [
+            SearchResponse(
+                results=results,
+                query=query.query,
+                processing_time_ms=elapsed_ms,
+                stage_timings_ms={stage: round(ms, 3) for stage, ms in stage_timings.items()},
+                reranked=was_reranked
+            )
+            for query, results, stage_timings, was_reranked in zip(queries, cached, timings, reranked)
+        ]
+        migration = self.migration
+        if migration is not None:
+            migration.observe(queries, responses)
+        return responses
+
+    def _retrieve(
+        self,
+        mode: str,
+        queries: List[SearchQuery],
+        query_embeddings: Optional[np.ndarray],
+        ks: List[int],
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        subset: Optional[np.ndarray]
+    ) -> List[tuple]:
+        """First-stage (scores, chunk IDs) of queries sharing a mode, search knobs and filter. Call with the lock held."""
+        min_scores = [query.min_score for query in queries]
+        if mode == 'lexical':
+            return [
+                self.lexical.search(query.query, k, subset=subset, min_score=min_score)
+                for query, k, min_score in zip(queries, ks, min_scores)
+            ]
+        hits = self.vector_store.search_many(
+            query_embeddings,
+            ks if mode == 'dense' else [max(k, HYBRID_CANDIDATES) for k in ks],
+            nprobe=nprobe,
+            ef_search=ef_search,
+            min_scores=min_scores if mode == 'dense' else None,
+            subset=subset
         )
+        if mode == 'hybrid':
+            hits = [
+                self._fuse(query.query, dense_ids, k, min_score, subset)
+                for query, (_, dense_ids), k, min_score in zip(queries, hits, ks, min_scores)
+            ]
+        return hits
+
+    def _diversify(
+        self,
+        query: SearchQuery,
+        scores: np.ndarray,
+        chunk_ids: np.ndarray,
+        mode: str,
+        query_embedding: Optional[np.ndarray],
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        subset: Optional[np.ndarray]
+    ) -> List[SearchResult]:
+        """
+        Results of a query with per-video caps, MMR and/or adjacent-hit merging. Call with the lock held.
+
+        Candidates are selected from the first-stage hits (see _select_diverse).
+        When capped or merged hits leave fewer than the wanted number of
+        distinct results and the index may hold more, the query is searched
+        again with more candidates, scaled by how many hits each distinct
+        result took so far, up to MAX_DIVERSITY_CANDIDATES.
+        """
+        k = self._first_stage_k(query)
+        fetched = self._candidate_k(query)
+        while True:
+            groups = self._select_diverse(query, scores, chunk_ids, k)
+            if len(groups) >= k or len(chunk_ids) < fetched or fetched >= MAX_DIVERSITY_CANDIDATES:
+                break
+            fetched = min(MAX_DIVERSITY_CANDIDATES, fetched * max(2, math.ceil(k / max(len(groups), 1))))
+            scores, chunk_ids = self._retrieve(
+                mode,
+                [query],
+                query_embedding[None, :] if query_embedding is not None else None,
+                [fetched],
+                nprobe,
+                ef_search,
+                subset
+            )[0]
+
+        members = [i for group in groups for i in group]
+        results = self._build_results(scores[members], chunk_ids[members], query.query, query_embedding)
+        merged = []
+        position = 0
+        for group in groups:
+            group_results = results[position:position + len(group)]
+            position += len(group)
+            if len(group) == 1:
+                merged.append(group_results[0])
+            else:
+                segments = self.metadata.gather(chunk_ids[group])['segments']
+                merged.append(self._merge_results(group_results, segments))
+        return merged
+
+    def _select_diverse(self, query: SearchQuery, scores: np.ndarray, chunk_ids: np.ndarray, k: int) -> List[List[int]]:
+        """
+        Pick up to k result groups from best-first hits; each group lists hit positions, its best hit first.
+
+        Hits are taken in score order, or with mmr_lambda by maximal marginal
+        relevance: lambda * relevance - (1 - lambda) * highest cosine
+        similarity to an already taken hit, where relevance is the first-stage
+        score scaled to [0, 1] and the similarities come from the stored
+        vectors in one matrix product. With merge_adjacent a hit touching or
+        overlapping a taken hit of the same video joins that hit's group
+        instead of taking a slot (a hit bridging several groups merges them,
+        freeing their extra slots), and with a per-video cap hits of a video
+        that already has that many groups are skipped.
+        """
+        if not len(chunk_ids):
+            return []
+        spans = self.metadata.spans(chunk_ids)
+        videos, starts, ends = spans['video'], spans['start_time'], spans['end_time']
+        cap = self._max_per_video(query)
+        mmr_lambda = query.mmr_lambda
+        if mmr_lambda is not None:
+            vectors = self.vector_store.reconstruct(chunk_ids)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            similarity = vectors @ vectors.T
+            spread = float(scores.max() - scores.min())
+            relevance = (scores - scores.min()) / spread if spread > 0 else np.ones(len(scores), dtype='float32')
+            redundancy = np.zeros(len(scores), dtype='float32')
+
+        available = np.ones(len(chunk_ids), dtype=bool)
+        groups: List[List[int]] = []
+        group_spans: List[List[float]] = []
+        per_video: Dict[int, int] = {}
+        while len(groups) < k and available.any():
+            if mmr_lambda is None:
+                pick = int(np.argmax(available))
+            else:
+                marginal = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+                pick = int(np.argmax(np.where(available, marginal, -np.inf)))
+            available[pick] = False
+            video = int(videos[pick])
+
+            targets = []
+            if query.merge_adjacent:
+                targets = [
+                    g for g, (group_video, start, end) in enumerate(group_spans)
+                    if group_video == video
+                    and starts[pick] <= end + ADJACENT_GAP_SECONDS
+                    and ends[pick] >= start - ADJACENT_GAP_SECONDS
+                ]
+            if targets:
+                # The earliest group keeps its place and best hit; the others fold into it
+                target = targets[0]
+                span = group_spans[target]
+                for g in reversed(targets[1:]):
+                    groups[target].extend(groups.pop(g))
+                    _, start, end = group_spans.pop(g)
+                    span[1], span[2] = min(span[1], start), max(span[2], end)
+                per_video[video] -= len(targets) - 1
+                groups[target].append(pick)
+                span[1], span[2] = min(span[1], starts[pick]), max(span[2], ends[pick])
+            elif cap is not None and per_video.get(video, 0) >= cap:
+                continue
+            else:
+                groups.append([pick])
+                group_spans.append([video, starts[pick], ends[pick]])
+                per_video[video] = per_video.get(video, 0) + 1
+                if not query.merge_adjacent and per_video[video] == cap:
+                    # No later hit of this video can be used
+                    available &= videos != video
+            if mmr_lambda is not None:
+                redundancy = np.maximum(redundancy, similarity[pick])
+        return groups
+
+    @staticmethod
+    def _merge_results(results: List[SearchResult], segments: List[np.ndarray]) -> SearchResult:
+        """
+        One result covering adjacent hits of a video, best hit first.
+
+        It keeps the best hit's score and timestamp and spans all hits; text
+        the hits share (overlapping chunks) appears once, cut at segment starts.
+        """
+        starts = [r.chunk_start_time if r.chunk_start_time is not None else r.timestamp for r in results]
+        texts = []
+        covered = -np.inf
+        for i in sorted(range(len(results)), key=starts.__getitem__):
+            text = results[i].matched_text
+            if starts[i] < covered and len(segments[i]):
+                # Round like the chunk times so a segment starting exactly at the end counts as new
+                later = np.flatnonzero(np.round(segments[i]['start'].astype('float64'), 2) >= covered)
+                text = text[int(segments[i]['offset'][later[0]]):].strip() if len(later) else ''
+            if text:
+                texts.append(text)
+            covered = max(covered, results[i].end_time)
+        return results[0].model_copy(update={
+            'chunk_start_time': min(starts),
+            'end_time': max(r.end_time for r in results),
+            'matched_text': " ".join(texts),
+            'merged_chunks': len(results)
+        })
+
+    def _rerank(self, query: SearchQuery, results: List[SearchResult]) -> Optional[List[SearchResult]]:
+        """Top_k of first-stage results re-ordered by cross-encoder score, or None if the budget ran out."""
+        if not results:
+            return results
+        scores = self.reranker.score(query.query, [result.matched_text for result in results], query.rerank_budget_ms)
+        if scores is None:
+            return None
+        order = np.argsort(-scores, kind='stable')[:query.top_k or 5]
+        return [results[i].model_copy(update={'relevance_score': float(scores[i])}) for i in order.tolist()]
+
+    def _fuse(
+        self,
+        query: str,
+        dense_ids: np.ndarray,
+        k: int,
+        min_score: Optional[float],
+        subset: Optional[np.ndarray]
+    ) -> tuple:
+        """Reciprocal rank fusion of dense hits with the query's BM25 hits. Call with the lock held."""
+        _, lexical_ids = self.lexical.search(query, max(k, HYBRID_CANDIDATES), subset=subset)
+        scores, chunk_ids = reciprocal_rank_fusion([dense_ids, lexical_ids], k, rrf_k=RRF_K)
+        if min_score is not None:
+            keep = scores >= min_score
+            scores, chunk_ids = scores[keep], chunk_ids[keep]
+        return scores, chunk_ids
+
+    def _encode_chunks(self, texts: List[str]) -> np.ndarray:
+        """Embed chunk texts, sending only those missing from the persistent cache to the model."""
+        if self.chunk_embedding_cache is None or not texts:
+            return self.embedding_manager.encode_bulk(texts)
+        embeddings, found = self.chunk_embedding_cache.get_many(texts)
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            missing_texts = [texts[i] for i in missing]
+            encoded = self.embedding_manager.encode_bulk(missing_texts)
+            embeddings[missing] = encoded
+            self.chunk_embedding_cache.put_many(missing_texts, encoded)
+            self.chunk_embedding_cache.flush()
+        logger.info(f"Embedded {len(texts)} chunks ({len(texts) - len(missing)} from the embedding cache)")
+        return embeddings
+
+    def _embed_segments(self, chunks: List[TranscriptChunk]):
+        """Cache embeddings of the segments of multi-segment chunks, encoding only unseen text."""
+        cache, manager = self.segment_embedding_cache, self.embedding_manager
+        if cache is None:
+            return
+        texts = list({
+            text
+            for chunk in chunks if chunk.segment_offsets and len(chunk.segment_offsets) > 1
+            for text in _segment_texts(chunk.text, chunk.segment_offsets) if text
+        })
+        if not texts:
+            return
+        _, found = cache.get_many(texts)
+        missing = [text for text, hit in zip(texts, found) if not hit]
+        if missing:
+            cache.put_many(missing, manager.encode_bulk(missing))
+            cache.flush()
+        logger.info(f"Embedded {len(missing)} transcript segments ({len(texts) - len(missing)} already cached)")
+
+    def _encode_queries(self, texts: List[str]) -> np.ndarray:
+        """Embed query texts, reusing cached embeddings and encoding each distinct miss once."""
+        normalized = [self._normalize_query(text) for text in texts]
+        # Keyed by model too, so a migration's cutover never serves the old model's vectors
+        manager = self.embedding_manager
+        embeddings = {text: self.embedding_cache.get((manager.model_id, text)) for text in set(normalized)}
+
+        missing = [text for text, embedding in embeddings.items() if embedding is None]
+        if missing:
+            for text, embedding in zip(missing, manager.encode(missing)):
+                embeddings[text] = embedding
+                self.embedding_cache.put((manager.model_id, text), embedding)
+
+        return np.vstack([embeddings[text] for text in normalized])
+
+    def _build_results(
+        self,
+        similarities: np.ndarray,
+        chunk_ids: np.ndarray,
+        query: str,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> List[SearchResult]:
+        """Create SearchResult objects from vector store hits, timestamped at the best segment. Call with the lock held."""
+        columns = self.metadata.gather(chunk_ids)
+        refined = self._refine_starts(columns['text'], columns['segments'], query, query_embedding)
+        return [
+            SearchResult(
+                video_id=video_id,
+                video_title=video_title,
+                timestamp=segment_start if segment_start is not None else start,
+                end_time=end,
+                matched_text=text,
+                relevance_score=similarity,
+                chunk_start_time=start if segment_start is not None else None
+            )
+            for video_id, video_title, start, end, text, similarity, segment_start in zip(
+                columns['video_id'],
+                columns['video_title'],
+                columns['start_time'].tolist(),
+                columns['end_time'].tolist(),
+                columns['text'],
+                similarities.tolist(),
+                refined
+            )
+        ]
+
+    def _refine_starts(
+        self,
+        texts: List[str],
+        segments: List[np.ndarray],
+        query: str,
+        query_embedding: Optional[np.ndarray]
+    ) -> List[Optional[float]]:
+        """
+        Start time of the segment of each hit that best matches the query (None keeps the chunk start).
+
+        All segments of all hits are looked up in the segment embedding cache
+        at once and scored against the query embedding with one matrix
+        product. Hits without cached segment embeddings (or lexical queries,
+        which have no query embedding) fall back to the segment sharing the
+        most query terms.
+        """
+        refined: List[Optional[float]] = [None] * len(texts)
+        hits = [i for i, hit_segments in enumerate(segments) if len(hit_segments) > 1]
+        if not hits:
+            return refined
+        segment_texts = [_segment_texts(texts[i], segments[i]['offset'].tolist()) for i in hits]
+        bounds = np.cumsum([0] + [len(hit_texts) for hit_texts in segment_texts])
+
+        scores = np.full(bounds[-1], -np.inf, dtype='float32')
+        if query_embedding is not None and self.segment_embedding_cache is not None:
+            embeddings, found = self.segment_embedding_cache.get_many([text for hit_texts in segment_texts for text in hit_texts])
+            if self.vector_store.metric == 'cosine':
+                scores[found] = embeddings[found] @ query_embedding
+            else:
+                scores[found] = -((embeddings[found] - query_embedding) ** 2).sum(axis=1)
+        else:
+            found = np.zeros(bounds[-1], dtype=bool)
+
+        terms = set(tokenize(query))
+        for position, i in enumerate(hits):
+            first, last = bounds[position], bounds[position + 1]
+            if found[first:last].any():
+                best = int(np.argmax(scores[first:last]))
+            else:
+                overlap = [len(terms & set(tokenize(text))) for text in segment_texts[position]]
+                if not max(overlap):
+                    continue
+                best = int(np.argmax(overlap))
+            refined[i] = round(float(segments[i]['start'][best]), 2)
+        return refined
+
+    def get_video(self, video_id: str) -> Optional[VideoTranscript]:
+        """Full transcript of an indexed video, or None if it is not indexed."""
+        with self._lock:
+            return self.metadata.get_video(video_id)
+
+    def get_video_summary(self, video_id: str) -> Optional[VideoSummary]:
+        """Title, duration and chunk count of an indexed video, or None."""
+        with self._lock:
+            return self.metadata.get_summary(video_id)
+
+    def list_videos(self) -> List[VideoSummary]:
+        """Summaries of all indexed videos."""
+        with self._lock:
+            return self.metadata.list_videos()
     
     def clear_index(self):
         """Clear all indexed data."""
-        self.vector_store.clear()
-        self.videos.clear()
+        with self._lock:
+            if self.wal is not None:
+                self.wal_seq = self.wal.append('clear', {})
+            self._apply_clear()
+            self._mirror('clear', None)
         logger.info("Cleared all indexed data")
+
+    def _apply_clear(self):
+        self.vector_store.clear()
+        self.metadata.clear()
+        if self.lexical is not None:
+            self.lexical.clear()
+        self._bump_generation()
+
+    def replay_wal(self, wal: WriteAheadLog) -> int:
+        """
+        Re-apply logged mutations newer than the loaded checkpoint, then log new ones to wal.
+
+        Stored embeddings are reused, so the embedding model is never called.
+
+        Args:
+            wal: Write-ahead log to replay and attach
+
+        Returns:
+            Number of records replayed
+        """
+        start_time = time.time()
+        replayed = 0
+        with self._lock:
+            for seq, op, payload, embeddings in wal.replay(after_seq=self.wal_seq):
+                if op == 'model':
+                    # Records from before model_id was logged came from the full-precision model
+                    if {'model_id': payload['signature']['model_name'], **payload['signature']} != self.get_index_signature():
+                        # A migration cut over to another model and the process stopped before
+                        # its snapshot was written; later records hold that model's vectors
+                        logger.warning(f"Write-ahead log switches to {payload['signature']['model_name']} at seq {seq}; "
+                                       f"not replaying later records into {self.embedding_manager.model_name}")
+                        break
+                elif op == 'index':
+                    self._apply_index(VideoTranscript.model_validate(payload['video']), embeddings)
+                elif op == 'append':
+                    self._apply_append(VideoTranscript.model_validate(payload['video']), embeddings)
+                elif op == 'delete':
+                    self._apply_delete(payload['video_id'])
+                elif op == 'clear':
+                    self._apply_clear()
+                else:
+                    logger.warning(f"Skipping unknown write-ahead log operation '{op}' (seq {seq})")
+                self.wal_seq = seq
+                replayed += 1
+            wal.advance_to(self.wal_seq)
+            self.wal = wal
+
+        if replayed:
+            elapsed = time.time() - start_time
+            logger.info(f"Replayed {replayed} write-ahead log records in {elapsed:.2f}s")
+        return replayed
     
+    def adopt(self, other: 'VideoSearchEngine'):
+        """
+        Atomically take over another engine's model, index and metadata (a model migration's cutover).
+
+        Searches and writes that started before the swap finish against
+        whichever model they see under the lock, re-encoding if it changed.
+        The switch is logged so a crash before the next snapshot never
+        replays the new model's vectors into the old one.
+        """
+        with self._lock:
+            self.embedding_manager = other.embedding_manager
+            self.vector_store = other.vector_store
+            self.metadata = other.metadata
+            # Chunk IDs are per vector store, so the lexical index moves with it
+            self.lexical = other.lexical
+            self.chunk_embedding_cache = other.chunk_embedding_cache
+            self.segment_embedding_cache = other.segment_embedding_cache
+            self.embedding_cache.clear()
+            if self.wal is not None:
+                self.wal_seq = self.wal.append('model', {'signature': self.get_index_signature()})
+            self._bump_generation()
+        logger.info(f"Switched to embedding model {self.embedding_manager.model_id}")
+
+    def get_index_signature(self) -> Dict[str, Any]:
+        """
+        Settings a persisted index must match to be loaded into this engine.
+
+        model_id tells an INT8-quantized model's vectors from the full-precision
+        model's; model_name is what a restart without EMBEDDING_MODEL loads.
+        """
+        return {
+            'model_name': self.embedding_manager.model_name,
+            'model_id': self.embedding_manager.model_id,
+            'embedding_dimension': self.embedding_manager.get_embedding_dimension(),
+            'metric': self.vector_store.metric,
+            'index': self.vector_store._factory_string()
+        }
+
+    def export_state(self) -> tuple:
+        """
+        Capture (generation, wal_seq, vector store state, metadata state) consistently for a snapshot.
+
+        The lock is only held while copying in memory; disk writes happen afterwards.
+        """
+        with self._lock:
+            return self.generation, self.wal_seq, self.vector_store.export_state(), self.metadata.export_state()
+
+    def save(self, directory: str, index_state: Dict[str, Any], metadata_state: Dict[str, Any]):
+        """Write states captured by export_state into a snapshot directory."""
+        self.vector_store.save(directory, index_state)
+        self.metadata.save(directory, metadata_state)
+
+    def restore(self, directory: str, mmap: bool = False, wal_seq: int = 0, convert: bool = False):
+        """
+        Replace the current index and metadata with ones saved on disk.
+
+        Args:
+            directory: Snapshot directory written by save
+            mmap: Memory-map the FAISS index instead of reading it into RAM
+            wal_seq: Last write-ahead log record folded into the snapshot
+            convert: The snapshot's index has another layout or storage type; rebuild it
+                into this engine's from the saved vectors (mmap does not apply)
+        """
+        with self._lock:
+            if convert:
+                self.metadata.load(directory)
+                self.vector_store.load_converted(directory, self._live_ids())
+            else:
+                self.vector_store.load(directory, mmap=mmap)
+                self.metadata.load(directory)
+            if self.lexical is not None:
+                self._rebuild_lexical()
+            self.wal_seq = wal_seq
+            self._bump_generation()
+
+    def _rebuild_lexical(self):
+        """Re-tokenize every indexed chunk into the lexical index (it is not part of snapshots). Call with the lock held."""
+        start_time = time.time()
+        ids = self._live_ids()
+        self.lexical.rebuild(ids, self.metadata.gather(ids)['text'])
+        logger.info(f"Rebuilt lexical index over {len(ids)} chunks in {time.time() - start_time:.2f}s")
+
+    def _live_ids(self) -> np.ndarray:
+        """IDs of every indexed chunk. Call with the lock held."""
+        ids = [self.metadata.video_chunk_ids(summary.video_id) for summary in self.metadata.list_videos()]
+        return np.concatenate(ids) if ids else np.zeros(0, dtype='int64')
+
+    def measure_recall(self, k: int = 10) -> Optional[Dict[str, Any]]:
+        """
+        Measure recall@k of the index against exact float32 search (see VectorStore.measure_recall).
+
+        Holds the lock for a full scan of the exact vectors, so indexing waits meanwhile.
+
+        Returns:
+            Recall report (also shown in get_stats), or None if the index keeps no exact vectors
+        """
+        with self._lock:
+            return self.vector_store.measure_recall(self._live_ids(), k=k)
+
     def get_stats(self) -> dict:
         """Get statistics about the indexed data."""
         return {
-            'total_videos': len(self.videos),
-            'total_chunks': self.vector_store.index.ntotal,
-            'embedding_dimension': self.embedding_manager.get_embedding_dimension()
+            'total_videos': self.metadata.num_videos,
+            'total_chunks': self.vector_store.ntotal,
+            'embedding_dimension': self.embedding_manager.get_embedding_dimension(),
+            'index': self.vector_store.get_config(),
+            'metadata': self.metadata.get_stats(),
+            'lexical': self.lexical.get_stats() if self.lexical is not None else None,
+            'rerank': self.reranker.get_stats() if self.reranker is not None else None,
+            'cache': {
+                'generation': self.generation,
+                'embeddings': self.embedding_cache.get_stats(),
+                'results': self.result_cache.get_stats(),
+                'chunk_embeddings': self.chunk_embedding_cache.get_stats() if self.chunk_embedding_cache is not None else None,
+                'segment_embeddings': self.segment_embedding_cache.get_stats() if self.segment_embedding_cache is not None else None
+            }
         }
\ No newline at end of file
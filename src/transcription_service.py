@@ -1,19 +1,71 @@
 import whisper
 import ffmpeg
 import os
-from typing import Dict, List
+import wave
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import logging
+import numpy as np
 from .models import TranscriptChunk
+from .voice_activity import SpeechAudio, detect_speech, frame_energy_db
+from .content_cache import audio_fingerprint
+from .chunking import SegmentChunker
 
 logger = logging.getLogger(__name__)
 
+# Whisper consumes 16 kHz mono float32 audio
+SAMPLE_RATE = 16000
+# Frame length used to find quiet cut points between windows (30 ms)
+SILENCE_FRAME = 480
+
+# Whisper model of a decode pool process (see _init_decoder)
+_decoder_model = None
+
+
+def _init_decoder(model_size: str):
+    """Load a Whisper model once per decode pool process."""
+    global _decoder_model
+    _decoder_model = whisper.load_model(model_size)
+
+
+def _segments(result: Dict) -> List[Dict]:
+    """Keep only the segment fields chunking needs (cheap to send between processes)."""
+    return [{'start': s['start'], 'end': s['end'], 'text': s['text']} for s in result['segments']]
+
+
+def _decode_window(audio: np.ndarray) -> List[Dict]:
+    """Transcribe one audio window in a decode pool process."""
+    return _segments(_decoder_model.transcribe(audio, language="en", task="transcribe", verbose=False))
+
+
 class TranscriptionService:
-    def __init__(self, model_size: str = "base"):
+    def __init__(self, model_size: str = "base", vad: bool = True, chunking: Optional[Dict] = None):
         """
         Initialize with Whisper model.
         Model sizes: tiny (39MB), base (74MB), small (244MB), medium (769MB), large (1550MB)
         Base model provides good balance between speed and accuracy for POC.
+
+        With vad, silent stretches are cut out before Whisper sees the audio
+        (see voice_activity.detect_speech); timestamps still refer to the
+        original video. vad_report holds the audio and skipped seconds of the
+        last transcription, vad_totals the running sums.
+
+        The last transcription's Whisper segments (original timestamps) and
+        audio fingerprint are kept in last_segments / last_fingerprint for the
+        upload content cache.
+
+        chunking holds SegmentChunker options (strategy, chunk_duration,
+        target_tokens, max_tokens, overlap); the default is 30 s chunks.
         """
+        self.model_size = model_size
+        self.vad = vad
+        self.chunking = dict(chunking or {})
+        self.vad_report = self._empty_vad_report()
+        self.vad_totals = self._empty_vad_report()
+        self.last_segments: List[Dict] = []
+        self.last_fingerprint: Optional[str] = None
         logger.info(f"Loading Whisper {model_size} model...")
         try:
             self.model = whisper.load_model(model_size)
@@ -36,19 +88,32 @@ class TranscriptionService:
         try:
             # Extract audio from video
             audio_path = self._extract_audio(video_path)
-            
+            self.vad_report = self._empty_vad_report()
+            self.last_fingerprint = None
+
             # Transcribe audio
             logger.info(f"Starting transcription of {video_path}")
-            result = self.model.transcribe(
-                audio_path, 
-                language="en",
-                task="transcribe",
-                verbose=False
-            )
+            if self.vad:
+                audio = self._load_wav(audio_path)
+                self.last_fingerprint = audio_fingerprint(frame_energy_db(audio, SAMPLE_RATE))
+                speech = detect_speech(audio)
+                self._record_vad(speech.total_seconds, speech.speech_seconds)
+                segments = self._transcribe_speech(speech)
+            else:
+                result = self.model.transcribe(
+                    audio_path, 
+                    language="en",
+                    task="transcribe",
+                    verbose=False
+                )
+                segments = result['segments']
+            self.last_segments = [{'start': s['start'], 'end': s['end'], 'text': s['text']} for s in segments]
             
             # Convert to chunks
-            chunks = self._create_chunks(result['segments'])
+            chunks = self._create_chunks(segments)
             logger.info(f"Transcription completed: {len(chunks)} chunks created")
+            if self.vad:
+                logger.info(f"VAD skipped {self.vad_report['skipped_seconds']:.1f}s of {self.vad_report['audio_seconds']:.1f}s of audio")
             
             return chunks
             
@@ -94,59 +159,233 @@ class TranscriptionService:
             logger.error(f"Audio extraction failed: {e}")
             raise
     
-    def _create_chunks(self, segments: List[Dict], chunk_duration: int = 30) -> List[Dict]:
+    @staticmethod
+    def _load_wav(audio_path: str) -> np.ndarray:
+        """Read a 16-bit mono WAV written by _extract_audio as float32 samples."""
+        with wave.open(audio_path, 'rb') as wav:
+            data = wav.readframes(wav.getnframes())
+        return np.frombuffer(data, dtype='<i2').astype('float32') / 32768.0
+
+    @staticmethod
+    def _empty_vad_report() -> Dict[str, float]:
+        return {'audio_seconds': 0.0, 'speech_seconds': 0.0, 'skipped_seconds': 0.0}
+
+    def _record_vad(self, audio_seconds: float, speech_seconds: float):
+        for report in (self.vad_report, self.vad_totals):
+            report['audio_seconds'] += audio_seconds
+            report['speech_seconds'] += speech_seconds
+            report['skipped_seconds'] += audio_seconds - speech_seconds
+
+    def _transcribe_speech(self, speech: SpeechAudio) -> List[Dict]:
+        """Transcribe the speech-only audio and return segments on the original timeline."""
+        if not len(speech.audio):
+            return []
+        result = self.model.transcribe(speech.audio, language="en", task="transcribe", verbose=False)
+        return speech.restore_segments(_segments(result))
+
+    def _create_chunks(self, segments: List[Dict]) -> List[Dict]:
         """
         Group transcript segments into chunks of specified duration.
         
         Args:
             segments: List of transcript segments from Whisper
-            chunk_duration: Target chunk duration in seconds (default: 30)
             
         Returns:
             List of chunks with text and timestamps
         """
-        if not segments:
-            return []
-        
-        chunks = []
-        current_text = []
-        current_start = 0
-        chunk_id = 0
-        
-        for segment in segments:
-            # Check if adding this segment would exceed chunk duration
-            if segment['end'] - current_start > chunk_duration and current_text:
-                # Create chunk from accumulated text
-                chunk_text = " ".join(current_text).strip()
-                if chunk_text:  # Only add non-empty chunks
-                    chunks.append({
-                        "chunk_id": f"chunk_{chunk_id}",
-                        "text": chunk_text,
-                        "start_time": round(current_start, 2),
-                        "end_time": round(segment['start'], 2)
-                    })
-                    chunk_id += 1
-                
-                # Start new chunk
-                current_text = [segment['text'].strip()]
-                current_start = segment['start']
-            else:
-                # Add segment to current chunk
-                current_text.append(segment['text'].strip())
-        
-        # Create final chunk with remaining text
-        if current_text:
-            chunk_text = " ".join(current_text).strip()
-            if chunk_text:
-                chunks.append({
-                    "chunk_id": f"chunk_{chunk_id}",
-                    "text": chunk_text,
-                    "start_time": round(current_start, 2),
-                    "end_time": round(segments[-1]['end'], 2)
-                })
-        
+        chunker = SegmentChunker(**self.chunking)
+        chunks = [chunk for segment in segments for chunk in chunker.add(segment)]
+        return chunks + chunker.finish()
+
+    def stream_audio(self, video_path: str, block_seconds: float = 1.0) -> Iterator[np.ndarray]:
+        """
+        Decode a video's audio track with ffmpeg straight into float32 blocks (16 kHz mono).
+
+        ffmpeg writes raw PCM to a pipe, so no WAV file is written and memory
+        stays bounded by the block size.
+
+        Args:
+            video_path: Path to video file
+            block_seconds: Audio per yielded block
+
+        Yields:
+            float32 arrays in [-1, 1]
+        """
+        process = (
+            ffmpeg.input(video_path)
+            .output('pipe:', format='s16le', acodec='pcm_s16le', ac=1, ar=str(SAMPLE_RATE))
+            .global_args('-nostdin', '-loglevel', 'error')
+            .run_async(pipe_stdout=True, cmd='ffmpeg')
+        )
+        block_bytes = int(block_seconds * SAMPLE_RATE) * 2
+        try:
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+                yield np.frombuffer(data[:len(data) // 2 * 2], dtype='<i2').astype('float32') / 32768.0
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+        if returncode != 0:
+            raise Exception(f"Failed to extract audio: ffmpeg exited with code {returncode}")
+
+    @staticmethod
+    def _find_quiet_point(audio: np.ndarray, lo: int, hi: int) -> int:
+        """Sample index in audio[lo:hi] at the centre of the lowest-energy 30 ms frame."""
+        if hi - lo < SILENCE_FRAME:
+            return hi
+        energy = frame_energy_db(audio[lo:hi], SILENCE_FRAME)
+        return lo + int(np.argmin(energy)) * SILENCE_FRAME + SILENCE_FRAME // 2
+
+    def _split_windows(
+        self,
+        blocks: Iterator[np.ndarray],
+        window_seconds: float,
+        overlap_seconds: float,
+        search_seconds: float
+    ) -> Iterator[Tuple[np.ndarray, float, float, Optional[float]]]:
+        """
+        Cut streamed audio into overlapping windows at quiet points.
+
+        Each window owns the span between two cut points, chosen at the
+        quietest frame in the last search_seconds before window_seconds, and
+        is padded by overlap_seconds of audio on both sides so words at the
+        cut are heard whole by at least one window.
+
+        Yields:
+            (audio, audio_start, own_start, own_end) with times in seconds;
+            own_end is None for the last window
+        """
+        window = int(window_seconds * SAMPLE_RATE)
+        overlap = int(overlap_seconds * SAMPLE_RATE)
+        search = min(int(search_seconds * SAMPLE_RATE), window // 2)
+
+        buffer = np.zeros(0, dtype='float32')
+        buffer_start = 0  # absolute sample index of buffer[0]
+        own_start = 0
+        for block in blocks:
+            buffer = np.concatenate([buffer, block])
+            while buffer_start + len(buffer) >= own_start + window + overlap:
+                target = own_start + window
+                cut = buffer_start + self._find_quiet_point(buffer, target - search - buffer_start, target - buffer_start)
+                audio_start = max(own_start - overlap, buffer_start)
+                audio = buffer[audio_start - buffer_start:cut + overlap - buffer_start].copy()
+                yield audio, audio_start / SAMPLE_RATE, own_start / SAMPLE_RATE, cut / SAMPLE_RATE
+
+                # Keep only what the next window needs (from its leading overlap on)
+                drop = cut - overlap - buffer_start
+                buffer = buffer[drop:]
+                buffer_start += drop
+                own_start = cut
+
+        audio_start = max(own_start - overlap, buffer_start)
+        if buffer_start + len(buffer) > own_start:
+            yield buffer[audio_start - buffer_start:].copy(), audio_start / SAMPLE_RATE, own_start / SAMPLE_RATE, None
+
+    def transcribe_video_streaming(
+        self,
+        video_path: str,
+        on_chunks: Optional[Callable[[List[Dict], float], None]] = None,
+        window_seconds: float = 60.0,
+        overlap_seconds: float = 2.0,
+        search_seconds: float = 10.0,
+        decode_workers: int = 1
+    ) -> List[Dict]:
+        """
+        Transcribe a video window by window while ffmpeg is still decoding it.
+
+        Windows are transcribed in parallel (decode_workers processes, each
+        with its own Whisper model) and stitched back in order: every window
+        keeps the segments whose midpoint falls in the span it owns, shifted
+        by the window's offset in the video. Chunks are handed to on_chunks as
+        soon as no later window can change them, so they can be indexed early.
+        With vad, each window's silence is cut out before decoding and windows
+        without speech are not decoded at all.
+
+        Args:
+            video_path: Path to video file
+            on_chunks: Called with (new chunks, seconds of audio transcribed so far)
+            window_seconds: Target audio per window
+            overlap_seconds: Audio shared by neighbouring windows
+            search_seconds: How far back from window_seconds to look for a quiet cut point
+            decode_workers: Parallel decode processes (1 decodes in this process)
+
+        Returns:
+            All transcript chunks, same format as transcribe_video
+        """
+        energies: List[float] = []
+
+        def fingerprint_blocks(blocks: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+            # Blocks are one second long, so each contributes one envelope value
+            for block in blocks:
+                energies.extend(frame_energy_db(block, SAMPLE_RATE))
+                yield block
+
+        windows = self._split_windows(fingerprint_blocks(self.stream_audio(video_path)), window_seconds, overlap_seconds, search_seconds)
+        builder = SegmentChunker(**self.chunking)
+        chunks: List[Dict] = []
+        self.vad_report = self._empty_vad_report()
+        self.last_segments = []
+
+        def prepare(audio: np.ndarray, audio_start: float, own_start: float, own_end: Optional[float]):
+            """Audio to decode for a window (None to skip it) and its speech map."""
+            if not self.vad:
+                return audio, None
+            speech = detect_speech(audio)
+            # Count only the span the window owns, so overlaps are not counted twice
+            own_stop = own_end if own_end is not None else audio_start + len(audio) / SAMPLE_RATE
+            self._record_vad(own_stop - own_start,
+                             speech.speech_seconds_between(own_start - audio_start, own_stop - audio_start))
+            return (speech.audio if len(speech.audio) else None), speech
+
+        def restore(segments: List[Dict], speech: Optional[SpeechAudio]) -> List[Dict]:
+            return speech.restore_segments(segments) if speech is not None else segments
+
+        def stitch(segments: List[Dict], audio_start: float, own_start: float, own_end: Optional[float]):
+            ready = []
+            for segment in segments:
+                start, end = segment['start'] + audio_start, segment['end'] + audio_start
+                midpoint = (start + end) / 2
+                if midpoint < own_start or (own_end is not None and midpoint >= own_end):
+                    continue  # Transcribed by the neighbouring window
+                self.last_segments.append({'start': start, 'end': end, 'text': segment['text']})
+                ready.extend(builder.add(self.last_segments[-1]))
+            if own_end is None:
+                ready.extend(builder.finish())
+            chunks.extend(ready)
+            if on_chunks is not None and ready:
+                on_chunks(ready, own_end if own_end is not None else ready[-1]['end_time'])
+
+        logger.info(f"Starting streaming transcription of {video_path} ({decode_workers} decode workers)")
+        if decode_workers <= 1:
+            for audio, *span in windows:
+                decode, speech = prepare(audio, *span)
+                segments = [] if decode is None else _segments(self.model.transcribe(decode, language="en", task="transcribe", verbose=False))
+                stitch(restore(segments, speech), *span)
+        else:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(decode_workers, mp_context=context, initializer=_init_decoder, initargs=(self.model_size,)) as pool:
+                # Bound windows in flight so memory does not grow with video length
+                pending = deque()
+                for audio, *span in windows:
+                    decode, speech = prepare(audio, *span)
+                    future = pool.submit(_decode_window, decode) if decode is not None else None
+                    pending.append((future, speech, span))
+                    while len(pending) >= 2 * decode_workers:
+                        future, speech, span = pending.popleft()
+                        stitch(restore(future.result() if future else [], speech), *span)
+                while pending:
+                    future, speech, span = pending.popleft()
+                    stitch(restore(future.result() if future else [], speech), *span)
+
+        self.last_fingerprint = audio_fingerprint(np.array(energies))
+        logger.info(f"Streaming transcription completed: {len(chunks)} chunks created")
+        if self.vad:
+            logger.info(f"VAD skipped {self.vad_report['skipped_seconds']:.1f}s of {self.vad_report['audio_seconds']:.1f}s of audio")
         return chunks
     
-    def get_supported_formats(self) -> List[str]:
+    @staticmethod
+    def get_supported_formats() -> List[str]:
         """Return list of supported video formats."""
         return ['.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv', '.wmv', '.m4v']
\ No newline at end of file
@@ -0,0 +1,478 @@
+import os
+import sys
+import signal
+import socket
+import argparse
+import subprocess
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import logging
+import numpy as np
+from .job_queue import JobQueue, TERMINAL_STATES
+from .content_cache import ContentCache
+from .chunking import STRATEGIES
+from .models import VideoTranscript
+
+logger = logging.getLogger(__name__)
+
+# Workers run as `python -m src.transcription_worker` from the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _remove_upload(video_path: Optional[str]):
+    """Delete an uploaded video once its job can no longer need it."""
+    if video_path and os.path.exists(video_path):
+        try:
+            os.remove(video_path)
+            logger.info(f"Cleaned up temporary file: {video_path}")
+        except OSError as e:
+            logger.warning(f"Failed to clean up temporary file: {e}")
+
+
+class _JobAbandoned(Exception):
+    """Raised from a streaming callback when the job was cancelled or taken from this worker."""
+
+
+def process_job(queue: JobQueue, service, job: Dict[str, Any], worker_id: str, streaming: Optional[Dict[str, Any]] = None):
+    """
+    Transcribe one claimed job and hand the transcript to the indexer.
+
+    The lease is renewed on a background thread for as long as Whisper runs.
+    Without streaming, cancellation is checked once transcription returns (a
+    Whisper pass cannot be interrupted part way). With streaming, every
+    finished window's chunks are published to the queue for the indexer and
+    cancellation is checked between windows.
+
+    Args:
+        queue: Job queue the job was claimed from
+        service: TranscriptionService with a loaded Whisper model
+        job: Claimed job
+        worker_id: ID the job was claimed under
+        streaming: Keyword arguments for TranscriptionService.transcribe_video_streaming,
+            or None to transcribe the whole file in one pass
+    """
+    job_id = job['job_id']
+    video_path = job['payload']['video_path']
+    stop = threading.Event()
+
+    def publish(chunks: List[Dict[str, Any]], transcribed_seconds: float):
+        if queue.is_cancel_requested(job_id):
+            raise _JobAbandoned("Cancellation requested")
+        if queue.append_chunks(job_id, worker_id, chunks, transcribed_seconds) is None:
+            raise _JobAbandoned("Job no longer held by this worker")
+        queue.update_progress(job_id, 20, f"Transcribing... {transcribed_seconds:.0f}s done, chunks searchable as they finish")
+
+    def renew_lease():
+        while not stop.wait(queue.lease_seconds / 3):
+            queue.heartbeat(job_id, worker_id)
+
+    heartbeat = threading.Thread(target=renew_lease, name=f"lease-{job_id}", daemon=True)
+    heartbeat.start()
+    try:
+        queue.update_progress(job_id, 10, "Extracting audio and transcribing...")
+        logger.info(f"Starting transcription for video {job_id} (attempt {job['attempts']})")
+        if streaming is not None:
+            chunks = service.transcribe_video_streaming(video_path, on_chunks=publish, **streaming)
+        else:
+            chunks = service.transcribe_video(video_path)
+
+        if queue.is_cancel_requested(job_id):
+            queue.mark_cancelled(job_id)
+            _remove_upload(video_path)
+            logger.info(f"Discarded transcript of cancelled job {job_id}")
+            return
+
+        duration = chunks[-1]['end_time'] if chunks else 0
+        if streaming is not None:
+            # The chunks are already in the queue as batches
+            result = {'streamed': True, 'chunk_count': len(chunks), 'duration': duration}
+        else:
+            result = {'chunks': chunks, 'duration': duration}
+        if job['payload'].get('content_hash'):
+            # Kept until indexing, for the upload content cache
+            result['cache'] = {
+                'chunks': chunks,
+                'segments': service.last_segments,
+                'audio_fingerprint': service.last_fingerprint
+            }
+        if service.vad:
+            result['audio_seconds'] = round(service.vad_report['audio_seconds'], 2)
+            result['skipped_seconds'] = round(service.vad_report['skipped_seconds'], 2)
+        queue.mark_transcribed(job_id, result)
+        logger.info(f"Transcribed video {job_id}: {len(chunks)} chunks")
+    except _JobAbandoned as e:
+        if queue.is_cancel_requested(job_id):
+            queue.mark_cancelled(job_id)
+            _remove_upload(video_path)
+        logger.info(f"Stopped transcribing job {job_id}: {e}")
+    except Exception as e:
+        logger.error(f"Failed to process video {job_id}: {str(e)}")
+        if queue.fail(job_id, str(e)) in TERMINAL_STATES:
+            _remove_upload(video_path)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+
+def run_worker(
+    db_path: str,
+    model_size: str = "base",
+    worker_id: Optional[str] = None,
+    poll_interval: float = 1.0,
+    lease_seconds: float = 60.0,
+    streaming: Optional[Dict[str, Any]] = None,
+    vad: bool = True,
+    chunking: Optional[Dict[str, Any]] = None
+):
+    """
+    Worker process loop: load Whisper once, then claim and transcribe jobs until terminated.
+
+    On SIGTERM the job in progress is put back in the queue without using up an attempt.
+
+    Args:
+        db_path: Job queue database shared with the API
+        model_size: Whisper model size to load
+        worker_id: Name recorded on claimed jobs (defaults to host-pid)
+        poll_interval: Seconds to wait when the queue is empty
+        lease_seconds: Claim lease, renewed while a job runs
+        streaming: Streaming transcription options (see process_job), or None
+        vad: Skip silence before Whisper (see TranscriptionService)
+        chunking: SegmentChunker options for cutting transcripts into chunks
+    """
+    # Imported here so the API process never loads Whisper
+    from .transcription_service import TranscriptionService
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = JobQueue(db_path, lease_seconds=lease_seconds)
+    service = TranscriptionService(model_size=model_size, vad=vad, chunking=chunking)
+
+    def terminate(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, terminate)
+
+    logger.info(f"Transcription worker {worker_id} ready")
+    job = None
+    try:
+        while True:
+            job = queue.claim(worker_id)
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            process_job(queue, service, job, worker_id, streaming)
+            job = None
+    except (KeyboardInterrupt, SystemExit):
+        if job is not None:
+            queue.release(job['job_id'])
+            logger.info(f"Worker {worker_id} stopping; returned job {job['job_id']} to the queue")
+
+
+class TranscriptionWorkerPool:
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        search_engine,
+        num_workers: int = 1,
+        model_size: str = "base",
+        poll_interval: float = 1.0,
+        streaming: Optional[Dict[str, Any]] = None,
+        vad: bool = True,
+        content_cache: Optional[ContentCache] = None,
+        chunking: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Supervise transcription worker processes and index the transcripts they produce.
+
+        Each worker is a separate `python -m src.transcription_worker` process
+        with its own Whisper model, so transcription never runs on the API's
+        event loop or competes for the GIL with searches. The supervisor thread
+        restarts workers that exit, re-queues jobs whose worker stopped
+        renewing its lease, and indexes finished transcripts into the engine.
+        More workers (e.g. on other machines sharing the database) can be
+        started by hand with the same command.
+
+        With streaming, workers publish chunks window by window and the
+        supervisor appends them to the index as they arrive, so a long video
+        becomes searchable while it is still being transcribed. Chunks of an
+        attempt that fails are removed again.
+
+        Args:
+            job_queue: Durable queue shared with the workers
+            search_engine: VideoSearchEngine that finished transcripts are indexed into
+            num_workers: Worker processes to keep running (0 to rely on external workers)
+            model_size: Whisper model size each worker loads
+            poll_interval: Supervisor loop period in seconds
+            streaming: Streaming transcription options passed to the workers
+                (window_seconds, overlap_seconds, decode_workers), or None
+            vad: Have workers skip silence before Whisper
+            content_cache: Where the results of uploads with a content_hash
+                are cached once indexed, so identical re-uploads skip processing
+            chunking: SegmentChunker options passed to the workers (strategy,
+                chunk_duration, target_tokens, max_tokens, overlap), or None for 30 s chunks
+        """
+        self.job_queue = job_queue
+        self.search_engine = search_engine
+        self.num_workers = num_workers
+        self.model_size = model_size
+        self.poll_interval = poll_interval
+        self.streaming = streaming
+        self.vad = vad
+        self.content_cache = content_cache
+        self.chunking = dict(chunking or {})
+        # Embeddings of streamed batches per job, so cached entries need no re-encoding
+        self._streamed_embeddings: Dict[str, List[Any]] = {}
+        self.indexer_id = f"{socket.gethostname()}-{os.getpid()}-indexer"
+        self._workers: List[Optional[subprocess.Popen]] = [None] * num_workers
+        # Earliest restart time per slot, so a worker crashing on startup is not respawned in a tight loop
+        self._next_start: List[float] = [0.0] * num_workers
+        self.restarts = 0
+        self.indexed_jobs = 0
+        self.streamed_chunks = 0
+        # Audio of completed jobs, and how much of it VAD kept away from Whisper
+        self.audio_seconds = 0.0
+        self.skipped_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _spawn(self, slot: int) -> subprocess.Popen:
+        command = [
+            sys.executable, '-m', 'src.transcription_worker',
+            '--db', self.job_queue.db_path,
+            '--model-size', self.model_size,
+            '--worker-id', f"{socket.gethostname()}-{os.getpid()}-worker{slot}",
+            '--lease-seconds', str(self.job_queue.lease_seconds)
+        ]
+        if not self.vad:
+            command.append('--no-vad')
+        for option, value in self.chunking.items():
+            command += [f"--chunk-{option.replace('_', '-')}", str(value)]
+        if self.streaming is not None:
+            command += [
+                '--stream',
+                '--window-seconds', str(self.streaming.get('window_seconds', 60.0)),
+                '--overlap-seconds', str(self.streaming.get('overlap_seconds', 2.0)),
+                '--decode-workers', str(self.streaming.get('decode_workers', 1))
+            ]
+        process = subprocess.Popen(command, cwd=REPO_ROOT)
+        logger.info(f"Started transcription worker {slot} (pid {process.pid})")
+        return process
+
+    def _supervise_workers(self):
+        now = time.time()
+        for slot, process in enumerate(self._workers):
+            if process is not None and process.poll() is None:
+                continue
+            if process is not None:
+                logger.warning(f"Transcription worker {slot} exited with code {process.returncode}")
+                self._workers[slot] = None
+                self._next_start[slot] = now + 10
+                self.restarts += 1
+            if now >= self._next_start[slot]:
+                self._workers[slot] = self._spawn(slot)
+
+    def _index_streamed(self, job: Dict[str, Any], batches: List[Dict[str, Any]]):
+        """Append a job's new chunk batches to the index, first dropping chunks of an earlier attempt."""
+        job_id = job['job_id']
+        for batch in batches:
+            if job['indexed_attempt'] and job['indexed_attempt'] != batch['attempt']:
+                self.search_engine.delete_video(job_id)
+                self._streamed_embeddings.pop(job_id, None)
+                logger.info(f"Removed chunks of attempt {job['indexed_attempt']} of video {job_id}")
+            job['indexed_attempt'], job['indexed_seq'] = batch['attempt'], batch['seq']
+            embeddings = self.search_engine.append_video_chunks(VideoTranscript(
+                video_id=job_id,
+                title=job['payload']['title'],
+                duration=batch['duration'],
+                chunks=batch['chunks']
+            ))
+            if self.content_cache is not None and job['payload'].get('content_hash'):
+                self._streamed_embeddings.setdefault(job_id, []).append(embeddings)
+            self.job_queue.mark_chunks_indexed(job_id, batch['attempt'], batch['seq'])
+            self.streamed_chunks += len(batch['chunks'])
+
+    def _index_pending_chunks(self):
+        """Index chunks streamed by running workers and remove those of failed or cancelled jobs."""
+        for job, batches in self.job_queue.pending_chunks():
+            if self._stop.is_set():
+                return
+            self._index_streamed(job, batches)
+        for job_id in self.job_queue.partially_indexed():
+            self.search_engine.delete_video(job_id)
+            self._streamed_embeddings.pop(job_id, None)
+            self.job_queue.clear_chunks(job_id)
+            logger.info(f"Removed streamed chunks of unfinished video {job_id}")
+
+    def _cache_result(self, job: Dict[str, Any], duration: float, embeddings: Optional[Any]):
+        """Store a finished upload's transcript (and embeddings) under its content hash."""
+        content_hash = job['payload'].get('content_hash')
+        cached = job['result'].get('cache')
+        if self.content_cache is None or not content_hash or not cached:
+            return
+        if embeddings is not None and len(embeddings) != len(cached['chunks']):
+            embeddings = None  # Some batches were indexed before a restart
+        try:
+            self.content_cache.put(content_hash, {
+                'video_id': job['job_id'],
+                'title': job['payload']['title'],
+                'duration': duration,
+                **cached
+            }, embeddings, self.search_engine.embedding_manager.model_id)
+        except OSError as e:
+            logger.warning(f"Failed to cache results of video {job['job_id']}: {e}")
+
+    @staticmethod
+    def _vad_result(result: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: result[key] for key in ('audio_seconds', 'skipped_seconds') if key in result}
+
+    def _index_transcribed(self):
+        """Index every transcript the workers have finished."""
+        while not self._stop.is_set():
+            job = self.job_queue.claim(self.indexer_id, state='transcribed', next_state='indexing', message="Indexing transcript chunks...")
+            if job is None:
+                return
+            job_id = job['job_id']
+            try:
+                result = job['result']
+                if self.job_queue.is_cancel_requested(job_id):
+                    self.job_queue.mark_cancelled(job_id)
+                elif result.get('streamed'):
+                    if job['indexed_attempt'] and job['indexed_attempt'] != job['attempts']:
+                        # An earlier attempt's chunks are indexed and this attempt may have published none
+                        self.search_engine.delete_video(job_id)
+                        self._streamed_embeddings.pop(job_id, None)
+                        self.job_queue.mark_chunks_indexed(job_id, job['attempts'], 0)
+                    # Most chunks are already indexed; add the batches published since the last pass
+                    for pending_job, batches in self.job_queue.pending_chunks():
+                        if pending_job['job_id'] == job_id:
+                            self._index_streamed(pending_job, batches)
+                    streamed = self._streamed_embeddings.pop(job_id, None)
+                    self._cache_result(job, result['duration'], np.concatenate(streamed) if streamed else None)
+                    self.job_queue.complete(job_id, "Video processed successfully", {
+                        'chunks_created': result['chunk_count'],
+                        'duration': result['duration'],
+                        **self._vad_result(result)
+                    })
+                    self.indexed_jobs += 1
+                    logger.info(f"Successfully processed video {job_id}: {result['chunk_count']} chunks streamed")
+                else:
+                    video = VideoTranscript(
+                        video_id=job_id,
+                        title=job['payload']['title'],
+                        duration=result['duration'],
+                        chunks=result['chunks']
+                    )
+                    embeddings = self.search_engine.index_video(video)
+                    self._cache_result(job, video.duration, embeddings)
+                    self.job_queue.complete(job_id, "Video processed successfully", {
+                        'chunks_created': len(video.chunks),
+                        'duration': video.duration,
+                        **self._vad_result(result)
+                    })
+                    self.indexed_jobs += 1
+                    logger.info(f"Successfully processed video {job_id}: {len(video.chunks)} chunks created")
+                _remove_upload(job['payload']['video_path'])
+                self.audio_seconds += result.get('audio_seconds', 0.0)
+                self.skipped_seconds += result.get('skipped_seconds', 0.0)
+            except Exception as e:
+                logger.error(f"Failed to index video {job_id}: {str(e)}")
+                if self.job_queue.fail(job_id, str(e)) in TERMINAL_STATES:
+                    _remove_upload(job['payload']['video_path'])
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._supervise_workers()
+                self.job_queue.requeue_expired()
+                self._index_pending_chunks()
+                self._index_transcribed()
+            except Exception as e:
+                logger.error(f"Transcription supervisor error: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Start the worker processes and the supervisor thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="transcription-supervisor", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop supervising and terminate the workers; their in-flight jobs go back to the queue."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for process in self._workers:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for slot, process in enumerate(self._workers):
+            if process is None:
+                continue
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            self._workers[slot] = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'workers': [
+                {'slot': slot, 'pid': process.pid if process else None, 'alive': process is not None and process.poll() is None}
+                for slot, process in enumerate(self._workers)
+            ],
+            'model_size': self.model_size,
+            'restarts': self.restarts,
+            'indexed_jobs': self.indexed_jobs,
+            'streaming': self.streaming,
+            'chunking': self.chunking,
+            'streamed_chunks': self.streamed_chunks,
+            'vad': {
+                'enabled': self.vad,
+                'audio_seconds': round(self.audio_seconds, 2),
+                'skipped_seconds': round(self.skipped_seconds, 2),
+                'skipped_fraction': round(self.skipped_seconds / self.audio_seconds, 4) if self.audio_seconds else 0.0
+            },
+            'queue': self.job_queue.get_stats()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a transcription worker against the shared job queue")
+    parser.add_argument('--db', default=os.getenv("JOB_DB_PATH", "data/jobs.db"), help="Job queue database")
+    parser.add_argument('--model-size', default=os.getenv("WHISPER_MODEL_SIZE", "base"), help="Whisper model size")
+    parser.add_argument('--worker-id', default=None, help="Name recorded on claimed jobs")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls of an empty queue")
+    parser.add_argument('--lease-seconds', type=float, default=60.0, help="Claim lease, renewed while a job runs")
+    parser.add_argument('--stream', action='store_true', help="Transcribe in windows and publish chunks as they finish")
+    parser.add_argument('--window-seconds', type=float, default=60.0, help="Audio per streaming window")
+    parser.add_argument('--overlap-seconds', type=float, default=2.0, help="Audio shared by neighbouring windows")
+    parser.add_argument('--no-vad', action='store_true', help="Send silence to Whisper too")
+    parser.add_argument('--decode-workers', type=int, default=1, help="Processes decoding windows in parallel")
+    parser.add_argument('--chunk-strategy', default='duration', choices=STRATEGIES, help="How transcripts are cut into chunks")
+    parser.add_argument('--chunk-duration', type=float, default=30.0, help="Seconds per chunk (duration strategy)")
+    parser.add_argument('--chunk-target-tokens', type=int, default=200, help="Tokens per chunk (tokens / sentences strategies)")
+    parser.add_argument('--chunk-max-tokens', type=int, default=256, help="Hard token limit per chunk (the embedding model's window)")
+    parser.add_argument('--chunk-overlap', type=float, default=0.0, help="Context repeated from the previous chunk (seconds, or tokens)")
+    args = parser.parse_args()
+
+    streaming = None
+    if args.stream:
+        streaming = {
+            'window_seconds': args.window_seconds,
+            'overlap_seconds': args.overlap_seconds,
+            'decode_workers': args.decode_workers
+        }
+
+    logging.basicConfig(level=logging.INFO)
+    chunking = {
+        'strategy': args.chunk_strategy,
+        'chunk_duration': args.chunk_duration,
+        'target_tokens': args.chunk_target_tokens,
+        'max_tokens': args.chunk_max_tokens,
+        'overlap': args.chunk_overlap
+    }
+    run_worker(args.db, args.model_size, args.worker_id, args.poll_interval, args.lease_seconds, streaming, not args.no_vad, chunking)
+
+
+if __name__ == "__main__":
+    main()
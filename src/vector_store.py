@@ -1,87 +1,827 @@
 import faiss
 import numpy as np
-from typing import List, Tuple, Dict, Any
-import pickle
+from typing import List, Tuple, Dict, Any, Optional
+import os
+import json
+import math
+import time
 import logging
 from .models import VideoTranscript, TranscriptChunk
 
 logger = logging.getLogger(__name__)
 
+# Supported index backends. "flat" is exact brute force; the others are
+# approximate and trade recall for latency via nprobe / efSearch.
+INDEX_TYPES = ('flat', 'hnsw', 'ivf_flat', 'ivf_pq')
+
+# How vectors are kept in the index: full float32, float16, 8-bit scalar
+# quantization (per-dimension ranges trained on a sample) or PQ codes of pq_m
+# bytes. ivf_pq always stores PQ codes.
+STORAGE_TYPES = ('float32', 'float16', 'int8', 'pq')
+STORAGE_CODES = {'float32': 'Flat', 'float16': 'SQfp16', 'int8': 'SQ8'}
+
+# Similarity metrics. "cosine" expects L2-normalized vectors and ranks by
+# inner product, so scores are true cosine similarities in [-1, 1] that can be
+# compared across queries and thresholded. "l2" keeps the legacy 1 / (1 + d) score.
+METRICS = ('l2', 'cosine')
+
+# On-disk layout written by save()
+INDEX_FILE = 'index.faiss'
+STATE_FILE = 'store.json'
+TOMBSTONES_FILE = 'tombstones.npy'
+
+# Filtered HNSW searches selecting at most this many IDs are scored exactly on
+# the reconstructed vectors; a graph walk finds too few matches for tiny subsets.
+EXACT_SUBSET_MAX = 4096
+
+# The exact-vector file (refine_path) grows by at least this many rows at a time
+REFINE_GROWTH_ROWS = 4096
+# Vectors moved per step when a snapshot is converted to another index layout
+CONVERT_BATCH_ROWS = 65536
+# Stored vectors used as queries, and file rows scored per step, when measuring recall
+RECALL_SAMPLE_QUERIES = 100
+RECALL_SCAN_ROWS = 65536
+
 
 class VectorStore:
-    def __init__(self, embedding_dim: int):
+    def __init__(
+        self,
+        embedding_dim: int,
+        index_type: str = 'flat',
+        metric: str = 'l2',
+        nlist: int = 256,
+        pq_m: int = 48,
+        hnsw_m: int = 32,
+        nprobe: int = 8,
+        ef_search: int = 64,
+        train_size: Optional[int] = None,
+        storage: str = 'float32',
+        refine_factor: int = 0,
+        refine_path: Optional[str] = None
+    ):
         """
         Initialize FAISS vector store.
-        
+
+        With a compressed storage type, refine_path keeps every vector's exact
+        float32 copy in a memory-mapped file (row = chunk ID), which only
+        touches RAM through the page cache for the rows that are read. With
+        refine_factor, searches fetch refine_factor times more candidates from
+        the compressed index and re-score them exactly from that file.
+
         Args:
             embedding_dim: Dimension of the embeddings
+            index_type: One of 'flat', 'hnsw', 'ivf_flat', 'ivf_pq'
+            metric: 'l2' or 'cosine' (inner product over normalized vectors)
+            nlist: Number of inverted lists (IVF indexes only)
+            pq_m: Number of PQ sub-quantizers, must divide embedding_dim (ivf_pq only)
+            hnsw_m: Number of graph neighbours per node (hnsw only)
+            nprobe: Default number of inverted lists visited per query (IVF indexes)
+            ef_search: Default search queue size (hnsw only)
+            train_size: Vectors to collect before training (IVF indexes, int8 and pq storage);
+                defaults to 39 * nlist for IVF indexes, else 39 * 256
+            storage: 'float32', 'float16', 'int8' or 'pq' (ivf_pq always uses pq)
+            refine_factor: Candidates re-scored exactly per result (0 disables); needs refine_path
+            refine_path: File holding the exact float32 vectors
         """
+        if index_type == 'ivf_pq':
+            storage = 'pq'
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Supported: {', '.join(INDEX_TYPES)}")
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}'. Supported: {', '.join(METRICS)}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage '{storage}'. Supported: {', '.join(STORAGE_TYPES)}")
+        if storage == 'pq' and embedding_dim % pq_m != 0:
+            raise ValueError(f"pq_m ({pq_m}) must divide the embedding dimension ({embedding_dim})")
+        if refine_factor > 0 and refine_path is None:
+            raise ValueError("refine_factor needs a refine_path for the exact vectors")
+
         self.embedding_dim = embedding_dim
-        self.index = faiss.IndexFlatL2(embedding_dim)
-        self.metadata: List[Dict[str, Any]] = []
-        logger.info(f"Initialized FAISS index with dimension {embedding_dim}")
-    
-    def add_embeddings(self, embeddings: np.ndarray, metadata: List[Dict[str, Any]]):
-        """
-        Add embeddings to the index with associated metadata.
-        
+        self.index_type = index_type
+        self.metric = metric
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.storage = storage
+        self.refine_factor = refine_factor
+        self.refine_path = refine_path
+        # FAISS recommends at least 39 training points per centroid, and
+        # cannot train with fewer points than centroids (256 for 8-bit PQ codebooks)
+        ivf = index_type in ('ivf_flat', 'ivf_pq')
+        self.train_size = max(
+            train_size or 39 * (nlist if ivf else 256),
+            nlist if ivf else 1,
+            256 if storage == 'pq' else 1
+        )
+
+        self.index = self._build_index()
+        # Untrained indexes stage vectors in an exact flat index until
+        # enough have arrived to train on; search uses the staging index meanwhile.
+        self._staging: Optional[faiss.Index] = None
+        if not self.index.is_trained:
+            self._staging = self._build_staging()
+        # Vectors carry stable int64 chunk IDs (allocated from next_id), so
+        # callers key their metadata by ID and single chunks can be removed in place.
+        self.next_id = 0
+        # Sorted IDs still in a graph index that cannot remove vectors (HNSW); filtered out of results
+        self._tombstones = np.zeros(0, dtype='int64')
+        # Set when the index was loaded read-only via mmap (see load())
+        self._mmap_path: Optional[str] = None
+        # Exact float32 copies of the vectors by chunk ID, opened on first add (see _open_refine)
+        self._refine: Optional[np.memmap] = None
+        # Last measure_recall() result
+        self.recall: Optional[Dict[str, Any]] = None
+        logger.info(f"Initialized FAISS {index_type} index ({metric}, {storage}) with dimension {embedding_dim}")
+
+    @property
+    def faiss_metric(self) -> int:
+        return faiss.METRIC_INNER_PRODUCT if self.metric == 'cosine' else faiss.METRIC_L2
+
+    def _factory_string(self) -> str:
+        """
+        Translate the index spec into a FAISS index_factory description.
+
+        IVF indexes store external IDs natively; flat and HNSW are wrapped in
+        IDMap2 (IndexIDMap's compaction on removal is only valid for those).
+        The storage type picks the vector codes.
+        """
+        codes = f"PQ{self.pq_m}" if self.storage == 'pq' else STORAGE_CODES[self.storage]
+        if self.index_type == 'hnsw':
+            return f"IDMap2,HNSW{self.hnsw_m}" + (f",{codes}" if self.storage != 'float32' else "")
+        if self.index_type in ('ivf_flat', 'ivf_pq'):
+            return f"IVF{self.nlist},{codes}"
+        return f"IDMap2,{codes}"
+
+    def _build_index(self) -> faiss.Index:
+        """Create an empty index for the configured spec with default search knobs applied."""
+        index = faiss.index_factory(self.embedding_dim, self._factory_string(), self.faiss_metric)
+        self._apply_defaults(index)
+        return index
+
+    def _apply_defaults(self, index: faiss.Index):
+        """Set the default nprobe / efSearch on a freshly built or loaded index."""
+        if self.index_type in ('ivf_flat', 'ivf_pq'):
+            faiss.extract_index_ivf(index).nprobe = self.nprobe
+        elif self.index_type == 'hnsw':
+            faiss.downcast_index(index.index).hnsw.efSearch = self.ef_search
+
+    def _build_staging(self) -> faiss.Index:
+        """Exact index used to hold vectors until the ANN index can be trained."""
+        return faiss.index_factory(self.embedding_dim, "IDMap2,Flat", self.faiss_metric)
+
+    def to_scores(self, distances: np.ndarray) -> np.ndarray:
+        """
+        Convert raw FAISS distances into relevance scores (higher is better).
+
+        This is the single similarity contract shared by every search path:
+        cosine similarity for the 'cosine' metric, 1 / (1 + d) for 'l2'.
+        """
+        if self.metric == 'cosine':
+            return distances
+        return 1 / (1 + distances)
+
+    @property
+    def is_trained(self) -> bool:
+        return self._staging is None
+
+    @property
+    def ntotal(self) -> int:
+        """Number of live vectors, including any staged for training."""
+        return self._active_index.ntotal - len(self._tombstones)
+
+    @property
+    def _active_index(self) -> faiss.Index:
+        return self._staging if self._staging is not None else self.index
+
+    @property
+    def _lossy(self) -> bool:
+        """Whether searched vectors are approximations (compressed codes of a trained index)."""
+        return self._staging is None and self.storage != 'float32'
+
+    def _open_refine(self, path: str, rows: int = 0):
+        """Memory-map the exact-vector file, growing it to hold at least rows vectors."""
+        row_bytes = self.embedding_dim * 4
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if self._refine is not None and size >= rows * row_bytes:
+            return
+        if size < rows * row_bytes or size == 0:
+            if self._refine is not None:
+                self._refine.flush()
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            size = max(rows, size // row_bytes * 2, REFINE_GROWTH_ROWS) * row_bytes
+            with open(path, 'ab') as f:
+                f.truncate(size)
+        self._refine = np.memmap(path, dtype='float32', mode='r+', shape=(size // row_bytes, self.embedding_dim))
+        self.refine_path = path
+
+    def remove_refine_file(self):
+        """
+        Delete the exact-vector file of an index that is being thrown away.
+
+        Searches still running against this store keep reading the mapped pages
+        until they finish; the disk space is freed when the mapping goes.
+        """
+        if self.refine_path is not None and os.path.exists(self.refine_path):
+            os.remove(self.refine_path)
+            logger.info(f"Removed exact-vector file {self.refine_path}")
+
+    def _rescore_exact(self, query_embeddings: np.ndarray, indices: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-rank candidate IDs by exact distance to the float32 vectors in the refine file, keeping k."""
+        ids = np.unique(indices[indices >= 0])
+        if not len(ids):
+            return np.full(indices[:, :k].shape, np.nan, dtype='float32'), indices[:, :k]
+        # Fancy indexing the memmap reads just these rows
+        vectors = np.asarray(self._refine[ids])
+        products = query_embeddings @ vectors.T
+        if self.metric == 'cosine':
+            exact, worst = products, -np.inf
+        else:
+            exact = np.maximum(
+                (query_embeddings ** 2).sum(axis=1)[:, None] - 2 * products + (vectors ** 2).sum(axis=1)[None, :],
+                0
+            )
+            worst = np.inf
+        positions = np.minimum(np.searchsorted(ids, indices), len(ids) - 1)
+        distances = np.where(indices >= 0, np.take_along_axis(exact, positions, axis=1), worst).astype('float32')
+        order = np.argsort(-distances if self.metric == 'cosine' else distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def _maybe_train(self):
+        """Train the ANN index once enough vectors are staged, then move them over."""
+        if self._staging is None or self._staging.ntotal < self.train_size:
+            return
+
+        start_time = time.time()
+        ids = faiss.vector_to_array(self._staging.id_map)
+        vectors = faiss.downcast_index(self._staging.index).reconstruct_n(0, self._staging.ntotal)
+        self.index.train(vectors)
+        self.index.add_with_ids(vectors, ids)
+        self._staging = None
+
+        elapsed = time.time() - start_time
+        logger.info(f"Trained {self.index_type} index on {len(vectors)} vectors in {elapsed:.2f}s")
+
+    def add_embeddings(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Add embeddings to the index.
+
         Args:
             embeddings: Numpy array of embeddings (n_samples, embedding_dim)
-            metadata: List of metadata dictionaries for each embedding
+
+        Returns:
+            The int64 chunk IDs assigned to the embeddings, ascending
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        ids = np.arange(self.next_id, self.next_id + len(embeddings), dtype='int64')
+        self._ensure_writable()
+        self._add_with_ids(embeddings, ids)
+        self.next_id += len(embeddings)
+        logger.info(f"Added {len(embeddings)} embeddings to index. Total: {self.ntotal}")
+        return ids
+
+    def _add_with_ids(self, embeddings: np.ndarray, ids: np.ndarray):
+        """Store vectors under already allocated IDs (ascending), in the exact-vector file too."""
+        if self.refine_path is not None and len(ids):
+            self._open_refine(self.refine_path, rows=int(ids[-1]) + 1)
+            self._refine[ids] = embeddings
+        if self._staging is not None:
+            self._staging.add_with_ids(embeddings, ids)
+            self._maybe_train()
+        else:
+            self.index.add_with_ids(embeddings, ids)
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        """
+        Remove vectors by chunk ID without rebuilding the index.
+
+        HNSW graphs cannot drop nodes, so their vectors are tombstoned instead
+        and searches skip the IDs.
+
+        Args:
+            ids: Live chunk IDs to remove
+
+        Returns:
+            Number of vectors removed
         """
-        if len(embeddings) != len(metadata):
-            raise ValueError("Number of embeddings must match number of metadata entries")
-        
-        self.index.add(embeddings.astype('float32'))
-        self.metadata.extend(metadata)
-        logger.info(f"Added {len(embeddings)} embeddings to index. Total: {self.index.ntotal}")
-    
-    def search(self, query_embedding: np.ndarray, k: int = 5) -> Tuple[List[float], List[Dict[str, Any]]]:
+        ids = np.unique(np.asarray(ids, dtype='int64'))
+        if not len(ids):
+            return 0
+
+        self._ensure_writable()
+        if self._staging is None and self.index_type == 'hnsw':
+            removed = len(ids) - len(np.intersect1d(ids, self._tombstones))
+            self._tombstones = np.union1d(self._tombstones, ids)
+        else:
+            removed = self._active_index.remove_ids(ids)
+        logger.info(f"Removed {removed} embeddings from index. Total: {self.ntotal}")
+        return removed
+
+    def _search_params(
+        self,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        selector: Optional[faiss.IDSelector] = None
+    ) -> Optional[faiss.SearchParameters]:
+        """Build per-query FAISS search parameters, or None to use the index defaults."""
+        trained = self._staging is None
+        if trained and self.index_type in ('ivf_flat', 'ivf_pq') and (nprobe or selector is not None):
+            params = faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe)
+        elif trained and self.index_type == 'hnsw' and (ef_search or selector is not None):
+            params = faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search)
+        elif selector is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+        if selector is not None:
+            params.sel = selector
+        return params
+
+    def _widen_for_subset(self, n_selected: int, nprobe: Optional[int], ef_search: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Scale nprobe / efSearch by 1 / selectivity for a filtered search.
+
+        Only selected vectors can fill result slots, so visiting proportionally
+        more lists (IVF) or graph candidates (HNSW) keeps the expected number of
+        selected candidates, and so recall, close to an unfiltered search.
+        """
+        if self._staging is not None:
+            return nprobe, ef_search
+        selectivity = n_selected / max(self.ntotal, 1)
+        if self.index_type in ('ivf_flat', 'ivf_pq'):
+            nprobe = min(self.nlist, math.ceil((nprobe or self.nprobe) / selectivity))
+        elif self.index_type == 'hnsw':
+            ef_search = min(max(self.ntotal, 1), math.ceil((ef_search or self.ef_search) / selectivity))
+        return nprobe, ef_search
+
+    def _search_subset_exact(self, query_embeddings: np.ndarray, k: int, subset: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force search over a small set of IDs using vectors reconstructed from the index."""
+        candidates = faiss.IndexFlat(self.embedding_dim, self.faiss_metric)
+        candidates.add(self._active_index.reconstruct_batch(subset))
+        distances, positions = candidates.search(query_embeddings, min(k, len(subset)))
+        return distances, np.where(positions >= 0, subset[positions], -1)
+
+    def search_raw(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        subset: Optional[np.ndarray] = None,
+        refine: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run a FAISS search and return the raw (distances, indices) matrices.
+
+        Missing results (possible with IVF when few lists are probed) have index -1.
+        With subset, only those chunk IDs can be returned: FAISS checks a bitmap
+        over the ID space while scanning, instead of results being filtered afterwards.
+        Compressed indexes with a refine_factor fetch refine_factor * k
+        candidates and return the k closest by exact distance (refine=False skips that).
+        """
+        if query_embeddings.ndim == 1:
+            query_embeddings = query_embeddings.reshape(1, -1)
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+
+        index = self._active_index
+        # Tombstoned HNSW vectors may occupy result slots; over-fetch to cover them
+        k = min(k + len(self._tombstones), index.ntotal)
+        refining = refine and self.refine_factor > 0 and self._refine is not None and self._lossy
+        fetch = min(k * self.refine_factor, index.ntotal) if refining else k
+
+        selector = None
+        if subset is not None:
+            subset = np.asarray(subset, dtype='int64')
+            # Flat PQ codes cannot be searched with an ID selector
+            flat_pq = self.index_type == 'flat' and self.storage == 'pq'
+            if self._staging is None and (flat_pq or (self.index_type == 'hnsw' and len(subset) <= EXACT_SUBSET_MAX)):
+                distances, indices = self._search_subset_exact(query_embeddings, fetch, subset)
+                return self._rescore_exact(query_embeddings, indices, k) if refining else (distances, indices)
+            # One bit per chunk ID; bitmap must stay referenced until the search returns
+            mask = np.zeros(self.next_id, dtype=bool)
+            mask[subset] = True
+            bitmap = np.packbits(mask, bitorder='little')
+            selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+            nprobe, ef_search = self._widen_for_subset(len(subset), nprobe, ef_search)
+
+        params = self._search_params(nprobe, ef_search, selector)
+        if params is not None:
+            distances, indices = index.search(query_embeddings, fetch, params=params)
+        else:
+            distances, indices = index.search(query_embeddings, fetch)
+        if refining:
+            return self._rescore_exact(query_embeddings, indices, k)
+        return distances, indices
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        min_score: Optional[float] = None,
+        subset: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
         Search for similar embeddings.
-        
+
         Args:
             query_embedding: Query embedding vector
             k: Number of results to return
-            
+            nprobe: Inverted lists to visit for this query (IVF indexes)
+            ef_search: Search queue size for this query (hnsw)
+            min_score: Drop results scoring below this relevance
+            subset: Only return these chunk IDs (a metadata filter's matches)
+
         Returns:
-            Tuple of (distances, metadata) for top k results
-        """
-        if self.index.ntotal == 0:
-            return [], []
-        
-        # Ensure query embedding is 2D
-        if query_embedding.ndim == 1:
-            query_embedding = query_embedding.reshape(1, -1)
-        
-        # Search
-        distances, indices = self.index.search(query_embedding.astype('float32'), min(k, self.index.ntotal))
-        
-        # Get metadata for results
-        results_metadata = [self.metadata[idx] for idx in indices[0]]
-        
-        # Convert distances to similarity scores (1 - normalized_distance)
-        # L2 distance to similarity score
-        similarities = 1 / (1 + distances[0])
-        
-        return similarities.tolist(), results_metadata
-    
-    def save(self, index_path: str, metadata_path: str):
-        """Save index and metadata to disk."""
-        faiss.write_index(self.index, index_path)
-        with open(metadata_path, 'wb') as f:
-            pickle.dump(self.metadata, f)
-        logger.info(f"Saved index to {index_path} and metadata to {metadata_path}")
-    
-    def load(self, index_path: str, metadata_path: str):
-        """Load index and metadata from disk."""
-        self.index = faiss.read_index(index_path)
-        with open(metadata_path, 'rb') as f:
-            self.metadata = pickle.load(f)
-        logger.info(f"Loaded index from {index_path} with {self.index.ntotal} vectors")
-    
+            Tuple of (similarities, chunk IDs) for top k results, best first
+        """
+        return self.search_many(
+            query_embedding.reshape(1, -1),
+            [k],
+            nprobe=nprobe,
+            ef_search=ef_search,
+            min_scores=[min_score],
+            subset=subset
+        )[0]
+
+    def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        ks: List[int],
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        min_scores: Optional[List[Optional[float]]] = None,
+        subset: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Search a batch of queries with a single FAISS call.
+
+        Args:
+            query_embeddings: Query matrix (n_queries, embedding_dim)
+            ks: Number of results to return for each query
+            nprobe: Inverted lists to visit (IVF indexes)
+            ef_search: Search queue size (hnsw)
+            min_scores: Optional per-query relevance cutoff
+            subset: Only return these chunk IDs (shared by all queries)
+
+        Returns:
+            One (similarities, chunk IDs) tuple of arrays per query, best first
+        """
+        if self.ntotal == 0 or (subset is not None and len(subset) == 0):
+            return [(np.zeros(0, dtype='float32'), np.zeros(0, dtype='int64')) for _ in ks]
+
+        distances, indices = self.search_raw(query_embeddings, max(ks), nprobe=nprobe, ef_search=ef_search, subset=subset)
+        similarities = self.to_scores(distances)
+
+        results = []
+        for row, k in enumerate(ks):
+            row_scores = similarities[row]
+            row_indices = indices[row]
+            valid = row_indices >= 0
+            if len(self._tombstones):
+                valid &= ~np.isin(row_indices, self._tombstones)
+            min_score = min_scores[row] if min_scores else None
+            if min_score is not None:
+                # Results are sorted, so this only trims the tail
+                valid &= row_scores >= min_score
+            keep = np.flatnonzero(valid)[:k]
+            results.append((row_scores[keep], row_indices[keep]))
+        return results
+
+    def reconstruct(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Stored vectors of chunk IDs (decoded approximations for ivf_pq).
+
+        IVF indexes only look vectors up by ID through a direct map, so a
+        hash-table map is built on first use; FAISS keeps it up to date on
+        add and remove afterwards.
+
+        Args:
+            ids: Live chunk IDs
+
+        Returns:
+            Float32 matrix (len(ids), embedding_dim) in input order
+        """
+        ids = np.asarray(ids, dtype='int64')
+        if not len(ids):
+            return np.zeros((0, self.embedding_dim), dtype='float32')
+        index = self._active_index
+        if index is self.index and self.index_type in ('ivf_flat', 'ivf_pq'):
+            ivf = faiss.extract_index_ivf(index)
+            if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+                ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index.reconstruct_batch(ids)
+
+    def recall_at_k(
+        self,
+        baseline: 'VectorStore',
+        query_embeddings: np.ndarray,
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> Dict[str, float]:
+        """
+        Measure recall@k of this index against an exact baseline holding the same vectors.
+
+        Args:
+            baseline: A flat VectorStore populated with the same embeddings in the same order
+            query_embeddings: Query matrix (n_queries, embedding_dim)
+            k: Cut-off for recall
+            nprobe: IVF lists to probe during the measurement
+            ef_search: HNSW search queue size during the measurement
+
+        Returns:
+            Dictionary with recall and mean per-query latency of both indexes
+        """
+        n_queries = len(query_embeddings)
+
+        start_time = time.time()
+        _, truth = baseline.search_raw(query_embeddings, k)
+        baseline_ms = (time.time() - start_time) * 1000 / n_queries
+
+        start_time = time.time()
+        _, found = self.search_raw(query_embeddings, k, nprobe=nprobe, ef_search=ef_search)
+        index_ms = (time.time() - start_time) * 1000 / n_queries
+
+        hits = sum(
+            len(np.intersect1d(truth[i], found[i][found[i] >= 0]))
+            for i in range(n_queries)
+        )
+
+        return {
+            'recall_at_k': hits / float(truth.size) if truth.size else 1.0,
+            'k': k,
+            'latency_ms': index_ms,
+            'baseline_latency_ms': baseline_ms
+        }
+
+    def measure_recall(
+        self,
+        ids: np.ndarray,
+        k: int = 10,
+        sample: int = RECALL_SAMPLE_QUERIES,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Measure recall@k of searches on the stored codes against exact float32 search.
+
+        A random sample of stored vectors is used as queries. The ground truth
+        is a brute-force scan of the exact-vector file over the live IDs, in
+        blocks of RECALL_SCAN_ROWS rows. Recall is reported as searches are
+        served (with exact re-ranking if configured) and, when re-ranking is
+        on, without it. The result is kept for get_config().
+
+        Args:
+            ids: Live chunk IDs
+            k: Cut-off for recall
+            sample: Number of query vectors
+            nprobe: IVF lists to probe during the measurement
+            ef_search: HNSW search queue size during the measurement
+
+        Returns:
+            Recall report, or None without an exact-vector file or vectors
+        """
+        ids = np.sort(np.asarray(ids, dtype='int64'))
+        if self._refine is None or not len(ids):
+            return None
+        k = min(k, len(ids))
+        rng = np.random.default_rng()
+        queries = np.asarray(self._refine[np.sort(rng.choice(ids, size=min(sample, len(ids)), replace=False))])
+
+        start_time = time.time()
+        best_scores = np.full((len(queries), 0), -np.inf, dtype='float32')
+        best_ids = np.zeros((len(queries), 0), dtype='int64')
+        for offset in range(0, len(ids), RECALL_SCAN_ROWS):
+            block_ids = ids[offset:offset + RECALL_SCAN_ROWS]
+            vectors = np.asarray(self._refine[block_ids])
+            if self.metric == 'cosine':
+                scores = queries @ vectors.T
+            else:
+                scores = -((queries ** 2).sum(axis=1)[:, None] - 2 * queries @ vectors.T + (vectors ** 2).sum(axis=1)[None, :])
+            scores = np.hstack([best_scores, scores])
+            candidates = np.hstack([best_ids, np.broadcast_to(block_ids, (len(queries), len(block_ids)))])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_ids = np.take_along_axis(candidates, top, axis=1)
+        exact_seconds = time.time() - start_time
+
+        def recall(refine: bool) -> Tuple[float, float]:
+            search_start = time.time()
+            _, found = self.search_raw(queries, k, nprobe=nprobe, ef_search=ef_search, refine=refine)
+            latency_ms = (time.time() - search_start) * 1000 / len(queries)
+            hits = 0
+            for truth, row in zip(best_ids, found):
+                row = row[(row >= 0) & np.isin(row, ids)][:k]
+                hits += len(np.intersect1d(truth, row))
+            return hits / best_ids.size, latency_ms
+
+        served, latency_ms = recall(refine=True)
+        self.recall = {
+            'k': k,
+            'queries': len(queries),
+            'recall_at_k': round(served, 4),
+            'latency_ms': round(latency_ms, 3),
+            'exact_scan_seconds': round(exact_seconds, 3),
+            'measured_at': time.time()
+        }
+        if self.refine_factor > 0 and self._lossy:
+            unrefined, latency_ms = recall(refine=False)
+            self.recall.update({'recall_at_k_unrefined': round(unrefined, 4), 'latency_ms_unrefined': round(latency_ms, 3)})
+        return self.recall
+
+    def _bytes_per_vector(self) -> int:
+        """Approximate resident bytes per stored vector: its code, its ID and (HNSW) its level-0 links."""
+        index = self._active_index
+        if self._staging is not None:
+            return self.embedding_dim * 4 + 8
+        if self.index_type in ('ivf_flat', 'ivf_pq'):
+            return faiss.extract_index_ivf(index).code_size + 8
+        inner = faiss.downcast_index(index.index)
+        if self.index_type == 'hnsw':
+            return faiss.downcast_index(inner.storage).code_size + 8 + 2 * self.hnsw_m * 4
+        return inner.code_size + 8
+
+    def get_config(self) -> Dict[str, Any]:
+        """Describe the index spec, its training state, memory use and last measured recall."""
+        config = {
+            'index_type': self.index_type,
+            'metric': self.metric,
+            'storage': self.storage,
+            'is_trained': self.is_trained,
+        }
+        if self.index_type in ('ivf_flat', 'ivf_pq') or self.storage in ('int8', 'pq'):
+            config['train_size'] = self.train_size
+        if self.index_type in ('ivf_flat', 'ivf_pq'):
+            config.update({'nlist': self.nlist, 'nprobe': self.nprobe})
+        if self.storage == 'pq':
+            config['pq_m'] = self.pq_m
+        if self.index_type == 'hnsw':
+            config.update({'hnsw_m': self.hnsw_m, 'ef_search': self.ef_search, 'tombstones': len(self._tombstones)})
+
+        stored = self._active_index.ntotal
+        bytes_per_vector = self._bytes_per_vector()
+        config['memory'] = {
+            'bytes_per_vector': bytes_per_vector,
+            'index_bytes': bytes_per_vector * stored,
+            'float32_bytes': (self.embedding_dim * 4 + 8) * stored,
+            'compression': round((self.embedding_dim * 4 + 8) / bytes_per_vector, 2)
+        }
+        if self.refine_path is not None:
+            config['refine'] = {
+                'path': self.refine_path,
+                'factor': self.refine_factor,
+                'active': self.refine_factor > 0 and self._lossy,
+                'disk_bytes': self._refine.nbytes if self._refine is not None else 0
+            }
+        config['recall'] = self.recall
+        return config
+
+    def export_state(self) -> Dict[str, Any]:
+        """
+        Capture a consistent copy of the index for saving.
+
+        Serializing to memory is a memcpy, so callers can hold their lock only
+        for this and do the slow disk writes afterwards.
+        """
+        return {
+            'index': faiss.serialize_index(self._active_index),
+            'next_id': self.next_id,
+            'trained': self.is_trained,
+            'tombstones': self._tombstones.copy(),
+            'ntotal': self.ntotal,
+            'refine_path': self.refine_path
+        }
+
+    def save(self, directory: str, state: Optional[Dict[str, Any]] = None):
+        """
+        Save the index and its ID bookkeeping to a directory.
+
+        Args:
+            directory: Existing directory to write into
+            state: Output of export_state(); captured now if omitted
+        """
+        state = state if state is not None else self.export_state()
+        state['index'].tofile(os.path.join(directory, INDEX_FILE))
+
+        np.save(os.path.join(directory, TOMBSTONES_FILE), state['tombstones'])
+        if self._refine is not None:
+            # Rows of every ID in this snapshot were written before it was captured
+            self._refine.flush()
+        with open(os.path.join(directory, STATE_FILE), 'w') as f:
+            json.dump({key: state[key] for key in ('next_id', 'trained', 'refine_path')}, f)
+
+        logger.info(f"Saved index with {state['ntotal']} vectors to {directory}")
+
+    def load(self, directory: str, mmap: bool = False):
+        """
+        Load an index saved by save().
+
+        Args:
+            directory: Directory written by save()
+            mmap: Memory-map the index instead of reading it into RAM. FAISS maps
+                IVF inverted lists this way, so several processes share one copy
+                through the page cache; the index is read into memory on first mutation.
+        """
+        with open(os.path.join(directory, STATE_FILE), 'r') as f:
+            store_state = json.load(f)
+
+        index_path = os.path.join(directory, INDEX_FILE)
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        index = faiss.read_index(index_path, flags)
+        if store_state['trained']:
+            self._apply_defaults(index)
+            self.index = index
+            self._staging = None
+        else:
+            # Saved before training finished: keep staging until train_size is reached
+            self.index = self._build_index()
+            self._staging = index
+        self._mmap_path = index_path if mmap else None
+        self.next_id = store_state['next_id']
+        self._tombstones = np.load(os.path.join(directory, TOMBSTONES_FILE))
+        self._load_refine(store_state.get('refine_path'))
+        logger.info(f"Loaded index from {directory} with {self.ntotal} vectors (mmap={mmap})")
+
+    def load_converted(self, directory: str, ids: np.ndarray):
+        """
+        Load a snapshot saved with another index layout or storage type into this one.
+
+        The live vectors are re-added under their chunk IDs, read from the
+        snapshot's exact-vector file when it has one and otherwise
+        reconstructed from its index (approximations if it stored compressed
+        codes). Compressed layouts are trained on the way, like new vectors.
+
+        Args:
+            directory: Directory written by save() for a different index spec
+            ids: Live chunk IDs to carry over
+        """
+        start_time = time.time()
+        with open(os.path.join(directory, STATE_FILE), 'r') as f:
+            store_state = json.load(f)
+        source = faiss.read_index(os.path.join(directory, INDEX_FILE))
+        next_id = store_state['next_id']
+
+        exact = None
+        path = store_state.get('refine_path')
+        if path is not None and os.path.exists(path) and os.path.getsize(path) >= next_id * self.embedding_dim * 4:
+            exact = np.memmap(path, dtype='float32', mode='r', shape=(os.path.getsize(path) // (self.embedding_dim * 4), self.embedding_dim))
+        elif store_state['trained'] and not isinstance(source, faiss.IndexIDMap2):
+            # IVF indexes look vectors up by ID through a direct map
+            faiss.extract_index_ivf(source).set_direct_map_type(faiss.DirectMap.Hashtable)
+
+        self.clear()
+        ids = np.sort(np.asarray(ids, dtype='int64'))
+        for start in range(0, len(ids), CONVERT_BATCH_ROWS):
+            batch = ids[start:start + CONVERT_BATCH_ROWS]
+            vectors = np.asarray(exact[batch]) if exact is not None else source.reconstruct_batch(batch)
+            self._add_with_ids(np.ascontiguousarray(vectors, dtype='float32'), batch)
+        self.next_id = next_id
+
+        elapsed = time.time() - start_time
+        logger.info(f"Converted index from {directory} with {len(ids)} vectors "
+                    f"({'exact vectors file' if exact is not None else 'stored codes'}) in {elapsed:.2f}s")
+
+    def _load_refine(self, path: Optional[str]):
+        """
+        Reopen the exact-vector file a loaded snapshot was saved with.
+
+        Only the file recorded in the snapshot is trusted (a migration's index
+        writes its own file); exact vectors are turned off for this index if
+        there is none or it is missing rows.
+        """
+        if self.refine_path is None:
+            return
+        self._refine = None
+        exists = path is not None and os.path.exists(path)
+        if path is not None and (self.next_id == 0 or (exists and os.path.getsize(path) >= self.next_id * self.embedding_dim * 4)):
+            self.refine_path = path
+            if exists:
+                self._open_refine(path)
+            return
+        logger.warning(f"Snapshot has no exact vectors file (recorded: {path}); exact re-ranking and recall checks are off for this index")
+        self.refine_path = None
+
+    def _ensure_writable(self):
+        """Swap a memory-mapped, read-only index for an in-memory copy before mutating it."""
+        if self._mmap_path is None:
+            return
+        index = faiss.read_index(self._mmap_path)
+        if self._staging is not None:
+            self._staging = index
+        else:
+            self._apply_defaults(index)
+            self.index = index
+        self._mmap_path = None
+        logger.info("Loaded memory-mapped index into memory for writing")
+
     def clear(self):
-        """Clear the index and metadata."""
-        self.index.reset()
-        self.metadata = []
-        logger.info("Cleared vector store")
\ No newline at end of file
+        """Clear the index."""
+        self.index = self._build_index()
+        self._staging = self._build_staging() if not self.index.is_trained else None
+        self._mmap_path = None
+        # next_id keeps counting so chunk IDs are never reused
+        self._tombstones = np.zeros(0, dtype='int64')
+        logger.info("Cleared vector store")
@@ -0,0 +1,136 @@
+import numpy as np
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+# 30 ms analysis frames
+FRAME = 480
+
+
+def frame_energy_db(audio: np.ndarray, frame: int = FRAME) -> np.ndarray:
+    """Mean power of consecutive frames in dBFS (a trailing partial frame is dropped)."""
+    frames = len(audio) // frame
+    power = np.square(audio[:frames * frame], dtype='float32').reshape(frames, frame).mean(axis=1)
+    return 10 * np.log10(power + 1e-10)
+
+
+class SpeechAudio:
+    def __init__(self, audio: np.ndarray, regions: np.ndarray, total_samples: int):
+        """
+        Speech-only audio cut out of a longer recording, with the map back to the original timeline.
+
+        Args:
+            audio: Speech regions concatenated in order
+            regions: (n, 2) int64 [start, end) sample bounds of each region in the original audio
+            total_samples: Length of the original audio
+        """
+        self.audio = audio
+        self.regions = regions
+        self.total_samples = total_samples
+        lengths = regions[:, 1] - regions[:, 0]
+        # Where each region starts in the concatenated audio
+        self._starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype('int64') if len(regions) else np.zeros(0, dtype='int64')
+
+    @property
+    def total_seconds(self) -> float:
+        return self.total_samples / SAMPLE_RATE
+
+    @property
+    def speech_seconds(self) -> float:
+        return len(self.audio) / SAMPLE_RATE
+
+    @property
+    def skipped_seconds(self) -> float:
+        return self.total_seconds - self.speech_seconds
+
+    def speech_seconds_between(self, start: float, end: float) -> float:
+        """Seconds of kept audio inside [start, end) of the original timeline."""
+        lo, hi = start * SAMPLE_RATE, end * SAMPLE_RATE
+        overlap = np.minimum(self.regions[:, 1], hi) - np.maximum(self.regions[:, 0], lo)
+        return float(np.clip(overlap, 0, None).sum()) / SAMPLE_RATE
+
+    def to_original(self, seconds: float, is_end: bool = False) -> float:
+        """
+        Map a time in the speech-only audio back to the original recording.
+
+        A time exactly at the junction of two regions maps to the end of the
+        earlier region when is_end is set (segment ends), else to the start of
+        the later one.
+        """
+        if not len(self.regions):
+            return seconds
+        sample = seconds * SAMPLE_RATE
+        region = int(np.searchsorted(self._starts, sample, side='left' if is_end else 'right')) - 1
+        region = min(max(region, 0), len(self.regions) - 1)
+        return (self.regions[region, 0] + sample - self._starts[region]) / SAMPLE_RATE
+
+    def restore_segments(self, segments: List[Dict]) -> List[Dict]:
+        """Shift Whisper segments of the speech-only audio back to original timestamps."""
+        return [
+            {**segment,
+             'start': self.to_original(segment['start']),
+             'end': self.to_original(segment['end'], is_end=True)}
+            for segment in segments
+        ]
+
+
+def detect_speech(
+    audio: np.ndarray,
+    margin_db: float = 10.0,
+    min_threshold_db: float = -50.0,
+    padding_seconds: float = 0.2,
+    min_silence_seconds: float = 0.8
+) -> SpeechAudio:
+    """
+    Energy-based voice activity detection on 16 kHz mono audio.
+
+    A 30 ms frame counts as speech when its energy is margin_db above the
+    recording's noise floor (its 10th percentile frame), never requiring more
+    than 20 dB below its loud frames and never counting frames under
+    min_threshold_db. Speech is padded on both sides, and only pauses of at
+    least min_silence_seconds are cut, so short gaps between words stay in.
+    Loud non-speech (music) is kept; Whisper handles it as before.
+
+    Args:
+        audio: float32 samples in [-1, 1]
+        margin_db: Required energy above the noise floor
+        min_threshold_db: Frames quieter than this are always silence
+        padding_seconds: Audio kept around each speech region
+        min_silence_seconds: Shortest pause that is skipped
+
+    Returns:
+        SpeechAudio with the kept audio and its map to the original timeline
+    """
+    energy = frame_energy_db(audio)
+    if not len(energy):
+        return SpeechAudio(audio, np.array([[0, len(audio)]], dtype='int64'), len(audio))
+
+    floor, loud = np.percentile(energy, [10, 95])
+    threshold = max(min_threshold_db, min(floor + margin_db, loud - 20.0))
+    speech = energy > threshold
+
+    # Pad speech frames, which also bridges pauses shorter than the padding
+    pad = int(round(padding_seconds * SAMPLE_RATE / FRAME))
+    if pad:
+        speech = np.convolve(speech, np.ones(2 * pad + 1), mode='same') > 0
+
+    # Runs of speech frames as [start, end) frame indices
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], speech.astype('int8'), [0]])))
+    runs = edges.reshape(-1, 2)
+
+    # Keep pauses shorter than min_silence_seconds
+    min_gap = int(round(min_silence_seconds * SAMPLE_RATE / FRAME))
+    merged = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] < min_gap:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    regions = np.array(merged, dtype='int64').reshape(-1, 2) * FRAME
+    if len(regions) and regions[-1, 1] == len(energy) * FRAME:
+        regions[-1, 1] = len(audio)  # Keep the trailing partial frame with speech that reaches the end
+    kept = np.concatenate([audio[start:end] for start, end in regions]) if len(regions) else np.zeros(0, dtype=audio.dtype)
+    return SpeechAudio(kept, regions, len(audio))